@@ -1,11 +1,11 @@
 # Accueil.py
 import streamlit as st
-import base64
 import os
 import plotly.graph_objects as go
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from backend.plot import create_carbon_intensity_map, create_lightbulb_chart, create_numeric_activity, create_adoption_chart, create_camenbert
+from backend.static_figures import carbon_intensity_map, load_figure
+from app.theme import apply_theme
 
 st.set_page_config(
     page_title="Accueil",
@@ -13,35 +13,8 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Fonction pour charger l'image en base64
-def get_base64_image(image_path):
-    with open(image_path, "rb") as img_file:
-        return base64.b64encode(img_file.read()).decode()
-
-# Charger l'image de fond
-img_path = "app/assets/fond6.png"
-if os.path.exists(img_path):
-    img_base64 = get_base64_image(img_path)
-    
-    # Charger le CSS externe
-    css_path = "app/accueil_styles.css"
-    with open(css_path) as f:
-        css_content = f.read()
-    
-    # Appliquer le CSS avec l'image de fond
-    st.markdown(f"""
-        <style>
-            {css_content}
-            
-            .stApp {{
-                background-image: url("data:image/png;base64,{img_base64}");
-                background-size: cover;
-                background-position: center;
-                background-repeat: no-repeat;
-                background-attachment: fixed;
-            }}
-        </style>
-    """, unsafe_allow_html=True)
+# Feuille de style commune (minifiée une fois par process) et image de fond servie par app/static
+apply_theme(background="fond.png")
 
 # Barre de navigation en haut
 st.markdown("""
@@ -220,7 +193,7 @@ st.markdown("---")
 # 1. Graphique d'Adoption (Pleine largeur pour bien lire les dates)
 st.markdown("### 📈 Une croissance sans précédent")
 st.markdown("<p style='color: #666; margin-bottom: 1rem;'>La demande explose, entraînant une augmentation mécanique de la consommation.</p>", unsafe_allow_html=True)
-fig_adoption = create_adoption_chart()
+fig_adoption = load_figure("adoption")
 st.plotly_chart(fig_adoption, use_container_width=True)
 
 st.markdown("---")
@@ -229,7 +202,7 @@ st.markdown("---")
 st.markdown("### ⚡ Le coût énergétique de l'entraînement")
 st.markdown("<p style='color: #666; margin-bottom: 1rem;'>Créer ces modèles demande une quantité d'énergie colossale, bien avant leur première utilisation.</p>", unsafe_allow_html=True)
 
-fig_lightbulb = create_lightbulb_chart()
+fig_lightbulb = load_figure("lightbulb")
 st.plotly_chart(fig_lightbulb, use_container_width=True)
 
 # --- LIGNE 3 : La Politesse (Section dédiée) ---
@@ -280,28 +253,29 @@ with comp3:
 st.markdown("---")
 
 # --- LIGNE 4 : GRAPHIQUES CÔTE À CÔTE ---
-col_graph1, col_graph2 = st.columns([1, 1]) # 50% / 50%
+# Sous la ligne de flottaison : les graphiques ne sont envoyés qu'à l'ouverture de la section
+# (on_change="rerun" : l'expander garde son état et .open permet de sauter le rendu quand il est fermé)
+with st.expander("📉 Activités courantes et usages des ChatBots", key="home_activities", on_change="rerun") as activities:
+    if activities.open:
+        col_graph1, col_graph2 = st.columns([1, 1]) # 50% / 50%
 
-with col_graph1:
-    st.markdown("### 📉 Activités courantes")
-    fig_bar = create_numeric_activity()
-    st.plotly_chart(fig_bar, use_container_width=True)
+        with col_graph1:
+            st.markdown("### 📉 Activités courantes")
+            st.plotly_chart(load_figure("numeric_activity"), use_container_width=True)
 
-with col_graph2:
-    st.markdown("### 📊 Parts d'utilisations des ChatBots")
-    fig_pie = create_camenbert()
-    st.plotly_chart(fig_pie, use_container_width=True)
+        with col_graph2:
+            st.markdown("### 📊 Parts d'utilisations des ChatBots")
+            st.plotly_chart(load_figure("camenbert"), use_container_width=True)
 
 # --- LIGNE 3 : LA CARTE ---
 st.markdown("<div style='height: 3rem;'></div>", unsafe_allow_html=True)
 st.markdown("### Intensité Carbone du Mix Électrique")
 st.markdown("<p style='font-size: 0.9rem; color: #666;'>L'impact de votre code dépend de l'endroit où il s'exécute.</p>", unsafe_allow_html=True)
 
-# Ta carte existante
-fig_map = create_carbon_intensity_map()
-# On s'assure que la carte a un fond transparent pour s'intégrer
-fig_map.update_layout(paper_bgcolor='rgba(0,0,0,0)', geo=dict(bgcolor='rgba(0,0,0,0)'))
-st.plotly_chart(fig_map, use_container_width=True)
+# Carte précalculée (fond transparent déjà réglé dans create_carbon_intensity_map), ou carte de l'heure en cours
+with st.expander("🗺️ Voir la carte", key="home_map", on_change="rerun") as map_section:
+    if map_section.open:
+        st.plotly_chart(carbon_intensity_map(), use_container_width=True)
 
 # --- FOOTER (Ton code existant) ---
 # ci-dessous
@@ -1,11 +1,25 @@
 import streamlit as st
-from backend.compute_LLM_footprint import compute_carbon
+from datetime import datetime
+from backend.compute_LLM_footprint import (
+    compute_carbon,
+    billable_seconds,
+    call_tokens,
+    flops_footprint,
+    batching_share,
+    embodied_bill_of_materials,
+    embodied_g_per_second,
+    ATTRIBUTION_MODES,
+)
+from backend.grid_intensity import intensity_info
 from backend.config import (
     HARDWARE_PROFILES,
     PUE,
     CARBON_INTENSITY,
-    TOTAL_HARDWARE_CO2,
+    FABRICATION_CO2,
+    HOST_FABRICATION_CO2,
     LIFETIME_HOURS,
+    CHIP_SPECS,
+    DEFAULT_CHIP,
 )
 
 def show_calculation():
@@ -34,6 +48,11 @@ def show_calculation():
     
     # Données d'exécution
     tdev = st.session_state.get("last_tdev", 0.73) # Valeur par défaut pour l'exemple
+    timings = st.session_state.get("last_timings") # Décomposition de la latence (backend.timing)
+
+    if st.session_state.get("last_cache_hit", False):
+        st.info("Cette réponse a été servie par le cache local : aucun serveur n'a été sollicité, l'empreinte est nulle. "
+                "Le détail ci-dessous correspond à un nouvel appel de même durée.")
     region_used = profile.get("country", "default")
     
     # --- 2. Pré-calculs pour l'affichage ---
@@ -45,34 +64,59 @@ def show_calculation():
     total_power_kw = device_count * device_power_kw
     
     # Temps
-    tdev_seconds = float(tdev)
+    tdev_seconds = float(billable_seconds(tdev, timings))
     tdev_hours = tdev_seconds / 3600.0
     
-    # Facteurs carbones
-    ci_val = CARBON_INTENSITY.get(region_used, CARBON_INTENSITY[region_used]) # kgCO2e/kWh
+    # Facteurs carbones : intensité du réseau à l'heure de l'appel si un jeu de données horaire est disponible
+    call_timestamp = st.session_state.get("last_timestamp")
+    ci_val, ci_version = intensity_info(region_used, call_timestamp) # kgCO2e/kWh
     
     # A. Calcul Opérationnel (Énergie)
     # Formule : Puissance * PUE * Intensité Carbone * Temps
     operational_carbon_kg = total_power_kw * PUE * ci_val * tdev_hours
     
     # B. Calcul Matériel (Embodied)
-    # Formule : (Temps d'usage / Durée de vie) * Coût fabrication total
-    hardware_carbon_kg = (tdev_hours / LIFETIME_HOURS) * TOTAL_HARDWARE_CO2
+    # Formule : (Temps d'usage / Durée de vie) * Fabrication des puces et serveurs alloués
+    bom = embodied_bill_of_materials(session_model)
+    hardware_carbon_kg = tdev_seconds * embodied_g_per_second(session_model) / 1000
     
     # Total
     total_carbon_g = (operational_carbon_kg + hardware_carbon_kg) * 1000.0
 
+    # D. Attribution "batched" : la requête ne paie que sa part du pod, partagé entre les séquences servies
+    attribution = st.session_state.get("last_attribution", "whole")
+    share = batching_share(session_model)
+    batched_operational_kg = operational_carbon_kg * share["energy_factor"]
+    batched_hardware_kg = hardware_carbon_kg * share["time_factor"]
+    batched_total_g = (batched_operational_kg + batched_hardware_kg) * 1000.0
+
+    # C. Moteur FLOPs : tokens x paramètres actifs, indépendant de la latence
+    usage = st.session_state.get("last_usage") or {}
+    prompt_tokens, completion_tokens = call_tokens(
+        st.session_state.get("last_prompt", ""),
+        st.session_state.get("last_response", ""),
+        usage,
+    )
+    flops = flops_footprint(session_model, prompt_tokens, completion_tokens, timestamp=call_timestamp)
+
     # --- 3. Affichage Créatif ---
 
     st.divider()
 
-    # Le Résultat Héroïque
-    c_res1, c_res2, c_res3 = st.columns([1, 2, 1])
+    # Le Résultat Héroïque : les deux moteurs côte à côte
+    c_res1, c_res2 = st.columns(2)
+    with c_res1:
+        st.metric(
+            label="Empreinte Totale de la requête (temps mesuré)",
+            value=f"{batched_total_g if attribution == 'batched' else total_carbon_g:.4f} gCO2e",
+            delta=f"Puissance x durée · {ATTRIBUTION_MODES[attribution]}",
+            delta_color="off"
+        )
     with c_res2:
         st.metric(
-            label="Empreinte Totale de la requête",
-            value=f"{total_carbon_g:.4f} gCO2e",
-            delta="Résultat final",
+            label="Empreinte Totale de la requête (FLOPs)",
+            value=f"{flops['total']:.4f} gCO2e" if flops else "Non disponible",
+            delta="Tokens x paramètres actifs",
             delta_color="off"
         )
 
@@ -91,13 +135,48 @@ def show_calculation():
         * **Efficacité du datacenter (PUE)** : x {PUE} (le surcoût du refroidissement)
         * **Durée du calcul** : {tdev_seconds:.3f} secondes
         """)
+
+        if timings and timings.get("streamed") and len(timings["chunk_times"]) < 2:
+            st.caption(
+                f"Mode streaming, réponse en un seul morceau : seule la fenêtre requête envoyée -> morceau est "
+                f"comptée ({tdev_seconds:.3f} s), sur {float(tdev):.3f} s au total."
+            )
+        elif timings and timings.get("streamed"):
+            st.caption(
+                f"Mode streaming : premier token après {timings['ttft']:.3f} s (file d'attente, réseau, prefill), "
+                f"puis {len(timings['chunk_times'])} morceaux en {timings['generation']:.3f} s. "
+                f"Seule la génération est comptée, sur {float(tdev):.3f} s au total."
+            )
+        elif timings and timings.get("server") is not None:
+            st.caption(
+                f"Seule la fenêtre côté serveur (requête envoyée -> premier octet) est comptée : "
+                f"{timings['server']:.3f} s sur {float(tdev):.3f} s au total."
+            )
+
+        if timings and timings.get("request_sent") is not None:
+            def fmt(value):
+                return "—" if value is None else f"{value * 1000:.1f} ms"
+            connection = "réutilisée (keep-alive)" if timings.get("connection_reused") else \
+                f"TCP {fmt(timings.get('connect'))}, TLS {fmt(timings.get('tls'))}"
+            st.markdown(f"""
+            **Décomposition de la latence** :
+            * Connexion : {connection}
+            * Requête envoyée à : {fmt(timings.get('request_sent'))}
+            * Premier octet à : {fmt(timings.get('first_byte'))}
+            * Dernier octet à : {fmt(timings.get('last_byte'))}
+            """)
         
         st.markdown("#### La formule :")
         st.latex(r'''
            E_{éléc} = P_{uissance} \times PUE \times Temps \times Intensité_{Réseau}
         ''')
         
-        st.write(f"L'intensité carbone de la région ({region_used}) est de **{ci_val} kgCO2e/kWh**.")
+        if ci_version is not None:
+            call_time = datetime.fromtimestamp(call_timestamp).strftime("%d/%m/%Y à %H:%M")
+            st.write(f"L'intensité carbone de la région ({region_used}) le {call_time} était de **{ci_val:.3f} kgCO2e/kWh** "
+                     f"(données horaires, version {ci_version} ; moyenne annuelle : {CARBON_INTENSITY.get(region_used, CARBON_INTENSITY['default'])} kgCO2e/kWh).")
+        else:
+            st.write(f"L'intensité carbone de la région ({region_used}) est de **{ci_val} kgCO2e/kWh** (moyenne annuelle).")
         
         st.success(f"**Impact Énergie :** {operational_carbon_kg*1000:.4f} gCO2e")
 
@@ -106,22 +185,83 @@ def show_calculation():
         st.info("La fabrication des serveurs émet énormément de CO2. On attribue une infime fraction de ce coût à votre requête.")
         
         percent_usage = (tdev_hours / LIFETIME_HOURS) * 100
+        host_detail = " + ".join(f"{name} {value:g}" for name, value in FABRICATION_CO2.items())
         st.markdown(f"""
-        * **Coût de fabrication serveur** : {TOTAL_HARDWARE_CO2:.0f} kgCO2e
-        * **Durée de vie estimée** : {LIFETIME_HOURS:,.0f} heures
+        * **Puces** : {bom['device_count']} x {bom['chip_type']} à {bom['chip_kg']:g} kgCO2e = {bom['chips_kg']:,.0f} kgCO2e
+        * **Serveurs hôtes** : {bom['servers']:g} x {HOST_FABRICATION_CO2:.0f} kgCO2e ({host_detail}) = {bom['host_kg']:,.0f} kgCO2e
+        * **Coût de fabrication du matériel alloué** : {bom['total_kg']:,.0f} kgCO2e
+        * **Durée de vie estimée** : {LIFETIME_HOURS:,.0f} heures, soit {embodied_g_per_second(session_model):.2e} gCO2e par seconde d'usage
         * **Votre temps d'usage** : {tdev_seconds:.3f} secondes
         """)
         
         st.markdown("#### La formule :")
         st.latex(r'''
-           E_{matériel} = \frac{Temps_{usage}}{Durée_{vie}} \times Empreinte_{Fabrication}
+           E_{matériel} = \frac{Temps_{usage}}{Durée_{vie}} \times (N_{puces} \times E_{puce} + N_{serveurs} \times E_{serveur})
         ''')
         
-        st.write(f"Votre requête représente **{percent_usage:.10f} %** de la vie du serveur.")
+        st.write(f"Votre requête représente **{percent_usage:.10f} %** de la vie du matériel.")
         
         st.warning(f"**Impact Matériel :** {hardware_carbon_kg*1000:.4f} gCO2e")
 
     st.divider()
 
+    st.subheader("🔀 Le Partage du Pod (batching)")
+    st.info("Un provider ne réserve pas tout un pod à une seule requête : il sert de nombreuses séquences en même temps. "
+            "L'attribution « partagée » répartit l'énergie du pod (consommation à vide comprise) entre elles.")
+
+    if "batching" not in profile:
+        st.warning(f"Pas de profil de batching pour **{session_model}** : la requête est supposée seule sur le matériel, "
+                   "les deux attributions donnent le même résultat.")
+    else:
+        st.markdown(f"""
+        * **Séquences servies en même temps** : {share['concurrent_sequences']:g} (batch max : {share['max_batch']:g}), soit une charge de {share['utilization']:.0%}
+        * **Puissance du pod à cette charge** : {total_power_kw * share['power_fraction']:.2f} kW sur {total_power_kw:.2f} kW max (à vide : {share['idle_power_fraction']:.0%})
+        * **Part d'énergie de la requête** : {share['energy_factor']:.3%} de l'énergie du pod à pleine puissance
+        * **Part du temps matériel** : 1 / {share['concurrent_sequences']:g} = {share['time_factor']:.3%}
+        """)
+
+        st.markdown("#### La formule :")
+        st.latex(r'''
+           E_{requête} = \frac{P_{max} \times (P_{vide} + (1 - P_{vide}) \times Charge)}{N_{séquences}} \times PUE \times Temps \times Intensité_{Réseau}
+        ''')
+
+    col_whole, col_batched = st.columns(2)
+    with col_whole:
+        st.metric(ATTRIBUTION_MODES["whole"], f"{total_carbon_g:.4f} gCO2e",
+                  help=f"Énergie {operational_carbon_kg * 1000:.4f} g · Matériel {hardware_carbon_kg * 1000:.4f} g")
+    with col_batched:
+        st.metric(ATTRIBUTION_MODES["batched"], f"{batched_total_g:.4f} gCO2e",
+                  help=f"Énergie {batched_operational_kg * 1000:.4f} g · Matériel {batched_hardware_kg * 1000:.4f} g")
+
+    st.divider()
+
+    st.subheader("🧮 L'Estimation par les FLOPs")
+    st.info("Plutôt que le temps mesuré (qui dépend du réseau et de la charge du provider), on compte les opérations "
+            "nécessaires : environ 2 FLOPs par paramètre actif et par token traité.")
+
+    if flops is None:
+        st.warning(f"Le nombre de paramètres de **{session_model}** n'est pas publié : "
+                   "ce moteur n'est pas disponible pour ce modèle.")
+    else:
+        chip = CHIP_SPECS.get(chip_name, CHIP_SPECS[DEFAULT_CHIP])
+        token_source = "compteurs du provider" if usage.get("completion_tokens") else "estimation ~4 caractères/token"
+        st.markdown(f"""
+        * **Paramètres actifs** : {flops['active_params_b']:g} milliards
+        * **Tokens traités** : {prompt_tokens} en entrée + {completion_tokens} en sortie ({token_source})
+        * **Calcul** : {flops['flops']:.3e} FLOPs
+        * **Débit d'une puce {chip_name}** : {chip['peak_tflops']} TFLOP/s crête x {chip['utilization']:.0%} d'utilisation
+        * **Temps de puce équivalent** : {flops['device_seconds']:.4f} secondes
+        """)
+
+        st.markdown("#### La formule :")
+        st.latex(r'''
+           E = \frac{2 \times N_{actifs} \times (T_{entrée} + T_{sortie})}{FLOP/s_{crête} \times Utilisation} \times P_{puce} \times PUE \times Intensité_{Réseau}
+        ''')
+
+        st.success(f"**Impact Énergie :** {flops['operational']:.4f} gCO2e · "
+                   f"**Impact Matériel :** {flops['embodied']:.4f} gCO2e")
+
+    st.divider()
+
 if __name__ == "__main__":
     show_calculation()
\ No newline at end of file
@@ -5,9 +5,14 @@ import sys
 import os
 import base64  # Ajout de l'import manquant
 import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
 from codecarbon import EmissionsTracker
 import pandas as pd
 
+from backend.config import HISTORY_PAGE_SIZE
+from app.theme import apply_theme
+from app.session import get_session_history
+
 project_name = "streamlit_codecarbon"
 
 st.set_page_config(
@@ -17,58 +22,51 @@ st.set_page_config(
 )
 
 # --- DÉBUT BLOC STYLE ACCUEIL ---
-css_path = "app/accueil_styles.css"
-
-if os.path.exists(css_path):
-    with open(css_path) as f:
-        css_content = f.read()
-    
-    st.markdown(f"""
-        <style>
-            {css_content}
-            .stApp {{
-                /* Dégradé du vert clair vers un vert plus soutenu */
-                background: linear-gradient(135deg, #94a773 0%, #94a45a 100%);
-                background-attachment: fixed;
-            }}
-            /* Styles spécifiques pour les cartes de cette page (adaptés de styles.css) */
-            .metric-card {{
-                background: rgba(255, 255, 255, 0.6);
-                backdrop-filter: blur(10px);
-                border-radius: 15px;
-                padding: 1.5rem;
-                border: 1px solid rgba(255, 255, 255, 0.4);
-                box-shadow: 0 4px 15px rgba(0, 0, 0, 0.05);
-                margin-bottom: 1rem;
-            }}
-            .comparison-item {{
-                background: rgba(255, 255, 255, 0.6);
-                padding: 1rem;
-                border-radius: 12px;
-                margin: 0.5rem 0;
-                border-left: 4px solid #7fb069;
-            }}
-
-            /* --- NOUVEAU : Style pour les expanders (menus déroulants) en blanc --- */
-            [data-testid="stExpander"] {{
-                background-color: #ffffff !important;
-                border-radius: 8px !important;
-                border: none !important;
-                box-shadow: 0 2px 6px rgba(0,0,0,0.1);
-                color: #000000 !important;
-            }}
-            [data-testid="stExpander"] summary {{
-                color: #000000 !important;
-            }}
-            [data-testid="stExpander"] summary:hover {{
-                color: #333333 !important;
-            }}
-            /* Force la couleur du texte à l'intérieur en noir */
-            [data-testid="stExpander"] p, [data-testid="stExpander"] li, [data-testid="stExpander"] span, [data-testid="stExpander"] div {{
-                color: #000000 !important;
-            }}
-        </style>
-    """, unsafe_allow_html=True)
+# Feuille de style commune (minifiée une fois par process), suivie des règles propres à cette page
+PAGE_CSS = """
+    .stApp {
+        /* Dégradé du vert clair vers un vert plus soutenu */
+        background: linear-gradient(135deg, #94a773 0%, #94a45a 100%);
+        background-attachment: fixed;
+    }
+    /* Styles spécifiques pour les cartes de cette page (adaptés de styles.css) */
+    .metric-card {
+        background: rgba(255, 255, 255, 0.6);
+        backdrop-filter: blur(10px);
+        border-radius: 15px;
+        padding: 1.5rem;
+        border: 1px solid rgba(255, 255, 255, 0.4);
+        box-shadow: 0 4px 15px rgba(0, 0, 0, 0.05);
+        margin-bottom: 1rem;
+    }
+    .comparison-item {
+        background: rgba(255, 255, 255, 0.6);
+        padding: 1rem;
+        border-radius: 12px;
+        margin: 0.5rem 0;
+        border-left: 4px solid #7fb069;
+    }
+
+    /* --- NOUVEAU : Style pour les expanders (menus déroulants) en blanc --- */
+    [data-testid="stExpander"] {
+        background-color: #ffffff !important;
+        border-radius: 8px !important;
+        border: none !important;
+        box-shadow: 0 2px 6px rgba(0,0,0,0.1);
+        color: #000000 !important;
+    }
+    [data-testid="stExpander"] summary {
+        color: #000000 !important;
+    }
+    [data-testid="stExpander"] summary:hover {
+        color: #333333 !important;
+    }
+    /* Force la couleur du texte à l'intérieur en noir */
+    [data-testid="stExpander"] p, [data-testid="stExpander"] li, [data-testid="stExpander"] span, [data-testid="stExpander"] div {
+        color: #000000 !important;
+    }
+"""
+apply_theme(PAGE_CSS)
 
 # 2. Barre de navigation simplifiée (Juste le logo)
 st.markdown("""
@@ -246,6 +244,7 @@ if run:
         st.markdown("## Empreinte carbone")
 
         emissions_kg = None
+        energy_kwh = None
         try:
             if isinstance(emissions, (float, int)):
                 emissions_kg = float(emissions)
@@ -395,6 +394,20 @@ if run:
         else:
             st.warning("Impossible de convertir les émissions en valeurs numériques (non disponible).")
 
+        # Historique des exécutions (table codecarbon_runs, voir backend/utils.py)
+        get_session_history().add_run({
+            "timestamp": start_time,
+            "project_name": project_name,
+            "run_mode": run_mode,
+            "command": command_text.strip() if run_mode == "Autre" else None,
+            "duration_seconds": duration,
+            "repetitions": int(repetitions),
+            "returncode": returncode,
+            "timed_out": timed_out,
+            "emissions_kg": emissions_kg,
+            "energy_kwh": energy_kwh,
+        })
+
         st.markdown("---")
         st.markdown("## Données détaillées")
         
@@ -475,6 +488,19 @@ if run:
 
 st.markdown("---")
 
+# Dernières exécutions de la session (requête paginée sur l'index par session et par date)
+recent_runs = get_session_history().runs(limit=HISTORY_PAGE_SIZE)
+if recent_runs:
+    st.markdown("## Historique des exécutions")
+    runs_df = pd.DataFrame(recent_runs)
+    runs_df["date"] = pd.to_datetime(runs_df["timestamp"], unit="s").dt.strftime("%Y-%m-%d %H:%M:%S")
+    runs_df["emissions_g"] = pd.to_numeric(runs_df["emissions_kg"]) * 1000.0
+    st.dataframe(
+        runs_df[["date", "run_mode", "duration_seconds", "repetitions", "returncode", "emissions_g", "energy_kwh"]],
+        use_container_width=True,
+        hide_index=True,
+    )
+
 st.markdown("---")
 
 with st.expander("Méthodologie technique", expanded=False):
@@ -1,15 +1,31 @@
 import sys
 import os
 import base64 # Ajout de l'import
+import time
+from datetime import datetime, timedelta, timezone
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
 
 import streamlit as st
 from pathlib import Path
-from backend.config import MODELS_LIST
-from backend.llm_caller import call_llm
-from backend.utils import load_json, save_json
-from backend.compute_LLM_footprint import compute_carbon
+from backend.config import MODELS_LIST, DEFAULT_CARBON_ENGINE, DEFAULT_ATTRIBUTION, PROMPTS_LOG_PATH, HISTORY_PAGE_SIZE
+from backend.llm_async import fan_out_sync, fan_out_stream_sync
+from backend.llm_cache import get_cache
+from backend.utils import get_jsonl_store
+from backend.blob_store import store_text, load_text
+from backend.compute_LLM_footprint import (
+    ENGINES,
+    ATTRIBUTION_MODES,
+    compute_carbon,
+    compute_carbon_flops,
+    billable_seconds,
+    call_tokens,
+    tokens_per_second,
+    carbon_per_1k_tokens,
+)
+from backend.uncertainty import result_interval, totals_interval
 from app.page_llm_calcul import show_calculation
+from app.theme import apply_theme
+from app.session import current_session_id, get_session_history
 
 
 # -----------------------------
@@ -22,24 +38,11 @@ st.set_page_config(
 )
 
 # -----------------------------
-# FICHIERS JSON
+# HISTORIQUE (appels LLM : SQLite ou JSONL selon STORAGE_BACKEND ; prompts : journal JSONL)
+# Chaque session Streamlit a son propre espace : une nouvelle session ne vide plus l'historique des autres.
 # -----------------------------
-PROMPTS_FILE = Path("data/prompts.json")
-SESSION_FILE = Path("data/session_data.json")
-
-if "app_started" not in st.session_state:
-    save_json(SESSION_FILE, [])
-    save_json(PROMPTS_FILE, [])
-    
-    st.session_state.app_started = True
-
-PROMPTS_FILE.parent.mkdir(parents=True, exist_ok=True)
-
-if not PROMPTS_FILE.exists():
-    PROMPTS_FILE.write_text("[]")
-
-if not SESSION_FILE.exists():
-    SESSION_FILE.write_text("[]")
+prompts_log = get_jsonl_store(PROMPTS_LOG_PATH)
+history = get_session_history()
 
 # -----------------------------
 # INITIALISATION SESSION STATE
@@ -50,11 +53,9 @@ if "prompt_validated" not in st.session_state:
 if "current_prompt" not in st.session_state:
     st.session_state.current_prompt = ""
 
-if "current_response" not in st.session_state:
-    st.session_state.current_response = ""
-
-if "selected_provider" not in st.session_state:
-    st.session_state.selected_provider = None
+if "llm_results" not in st.session_state:
+    # réponses de la dernière comparaison : dicts {provider, model, response, tdev, carbon}
+    st.session_state.llm_results = []
 
 if "selected_model" not in st.session_state:
     st.session_state.selected_model = None
@@ -64,77 +65,70 @@ if "last_tdev" not in st.session_state:
     st.session_state.last_tdev = 0.0
 
 # --- DÉBUT BLOC STYLE ACCUEIL ---
-css_path = "app/accueil_styles.css"
-
-if os.path.exists(css_path):
-    with open(css_path) as f:
-        css_content = f.read()
+# Feuille de style commune (minifiée une fois par process), suivie des règles propres à cette page
+PAGE_CSS = """
+    .stApp {
+        /* Dégradé du vert clair vers un vert plus soutenu */
+        background: linear-gradient(135deg, #94a773 0%, #94a45a 100%);
+        background-attachment: fixed;
+    }
+    /* Style pour les items de comparaison */
+    .comparison-item {
+        background: rgba(255, 255, 255, 0.6);
+        padding: 15px;
+        border-radius: 10px;
+        margin-bottom: 10px;
+        border: 1px solid rgba(255, 255, 255, 0.4);
+    }
     
-    st.markdown(f"""
-        <style>
-            {css_content}
-            .stApp {{
-                /* Dégradé du vert clair vers un vert plus soutenu */
-                background: linear-gradient(135deg, #94a773 0%, #94a45a 100%);
-                background-attachment: fixed;
-            }}
-            /* Style pour les items de comparaison */
-            .comparison-item {{
-                background: rgba(255, 255, 255, 0.6);
-                padding: 15px;
-                border-radius: 10px;
-                margin-bottom: 10px;
-                border: 1px solid rgba(255, 255, 255, 0.4);
-            }}
-            
-            /* --- NOUVEAU : Style pour les expanders (menus déroulants) en blanc --- */
-            [data-testid="stExpander"] {{
-                background-color: #ffffff !important;
-                border-radius: 8px !important;
-                border: none !important;
-                box-shadow: 0 2px 6px rgba(0,0,0,0.1);
-                color: #000000 !important;
-            }}
-            [data-testid="stExpander"] summary {{
-                color: #000000 !important;
-            }}
-            [data-testid="stExpander"] summary:hover {{
-                color: #333333 !important;
-            }}
-            /* Force la couleur du texte à l'intérieur en noir */
-            [data-testid="stExpander"] p, [data-testid="stExpander"] li, [data-testid="stExpander"] span, [data-testid="stExpander"] div {{
-                color: #000000 !important;
-            }}
-
-            /* --- CORRECTION : Mise en valeur des chiffres (Metrics) --- */
-            
-            /* 1. Forcer la couleur BLANCHE partout (Sidebar + Main) */
-            [data-testid="stMetricValue"], [data-testid="stMetricValue"] > div, [data-testid="stMetricValue"] * {{
-                color: #ffffff !important;
-            }}
-            
-            [data-testid="stMetricLabel"], [data-testid="stMetricLabel"] > div, [data-testid="stMetricLabel"] * {{
-                color: #f0f0f0 !important; /* Blanc cassé pour les titres */
-            }}
-
-            /* 2. Taille GÉANTE uniquement pour la zone principale */
-            section.main [data-testid="stMetricValue"] > div {{
-                font-size: 3.5rem !important; /* Encore plus gros pour bien voir */
-                font-weight: 800 !important;
-                text-shadow: 0 4px 8px rgba(0,0,0,0.2);
-            }}
-            
-            section.main [data-testid="stMetricLabel"] > div {{
-                font-size: 1.2rem !important;
-            }}
-
-            /* 3. Taille NORMALE pour la sidebar (pour ne pas casser l'affichage) */
-            [data-testid="stSidebar"] [data-testid="stMetricValue"] > div {{
-                font-size: 1.8rem !important; /* Taille raisonnable */
-                text-shadow: none;
-            }}
-        </style>
-    """, unsafe_allow_html=True)
+    /* --- NOUVEAU : Style pour les expanders (menus déroulants) en blanc --- */
+    [data-testid="stExpander"] {
+        background-color: #ffffff !important;
+        border-radius: 8px !important;
+        border: none !important;
+        box-shadow: 0 2px 6px rgba(0,0,0,0.1);
+        color: #000000 !important;
+    }
+    [data-testid="stExpander"] summary {
+        color: #000000 !important;
+    }
+    [data-testid="stExpander"] summary:hover {
+        color: #333333 !important;
+    }
+    /* Force la couleur du texte à l'intérieur en noir */
+    [data-testid="stExpander"] p, [data-testid="stExpander"] li, [data-testid="stExpander"] span, [data-testid="stExpander"] div {
+        color: #000000 !important;
+    }
+
+    /* --- CORRECTION : Mise en valeur des chiffres (Metrics) --- */
+    
+    /* 1. Forcer la couleur BLANCHE partout (Sidebar + Main) */
+    [data-testid="stMetricValue"], [data-testid="stMetricValue"] > div, [data-testid="stMetricValue"] * {
+        color: #ffffff !important;
+    }
+    
+    [data-testid="stMetricLabel"], [data-testid="stMetricLabel"] > div, [data-testid="stMetricLabel"] * {
+        color: #f0f0f0 !important; /* Blanc cassé pour les titres */
+    }
+
+    /* 2. Taille GÉANTE uniquement pour la zone principale */
+    section.main [data-testid="stMetricValue"] > div {
+        font-size: 3.5rem !important; /* Encore plus gros pour bien voir */
+        font-weight: 800 !important;
+        text-shadow: 0 4px 8px rgba(0,0,0,0.2);
+    }
+    
+    section.main [data-testid="stMetricLabel"] > div {
+        font-size: 1.2rem !important;
+    }
+
+    /* 3. Taille NORMALE pour la sidebar (pour ne pas casser l'affichage) */
+    [data-testid="stSidebar"] [data-testid="stMetricValue"] > div {
+        font-size: 1.8rem !important; /* Taille raisonnable */
+        text-shadow: none;
+    }
+"""
+apply_theme(PAGE_CSS)
 
 st.markdown("""<div style="
     position: fixed;
@@ -166,26 +160,34 @@ st.markdown("""<div style="
 # On crée un emplacement vide dans la sidebar
 sidebar_placeholder = st.sidebar.empty()
 
-# On définit une fonction qui sait lire le JSON et remplir cet emplacement
+# On définit une fonction qui interroge l'historique et remplit cet emplacement
 def update_sidebar_stats():
-    current_data = load_json(SESSION_FILE)
+    # Agrégats tenus à jour à chaque appel (SessionAggregates) : lecture en temps constant
+    stats = history.call_stats()
     
     # On "entre" dans le placeholder pour écrire dedans
     with sidebar_placeholder.container():
         st.write("") # Petit espacement
 
-        if current_data:
+        if stats["calls"]:
             # 1. Calculs des données brutes
-            total_calls = len(current_data)
-            total_carbon = sum(entry['carbon'] for entry in current_data)
-            avg_carbon = total_carbon / total_calls
-            avg_time = sum(entry['tdev_seconds'] for entry in current_data) / total_calls
+            total_calls = stats["calls"]
+            total_carbon = stats["carbon"]
+            avg_carbon = stats["avg_carbon"]
+            avg_time = stats["avg_tdev"]
 
             st.markdown("### Statistiques de la session")
             st.metric("Appels totaux", total_calls)
             st.metric("Émissions totales", f"{total_carbon:.4f} gCO₂e") # Précision augmentée
+            interval = totals_interval(history.usage_totals())
+            st.caption(f"Intervalle 90 % : {interval['p5']:.4f} – {interval['p95']:.4f} gCO₂e "
+                       f"(médiane {interval['p50']:.4f})")
             st.metric("Moyenne par appel", f"{avg_carbon:.4f} gCO₂e")
+            carbon_q = stats["carbon_quantiles"]
+            st.caption(f"p50 / p90 / p99 : {carbon_q['p50']:.4f} / {carbon_q['p90']:.4f} / {carbon_q['p99']:.4f} gCO₂e")
             st.metric("Temps moyen", f"{avg_time:.2f} s")
+            tdev_q = stats["tdev_quantiles"]
+            st.caption(f"p50 / p90 / p99 : {tdev_q['p50']:.2f} / {tdev_q['p90']:.2f} / {tdev_q['p99']:.2f} s")
 
             FACTOR_LED_G_PER_H = 1.3   # ~1.3 g par heure pour une LED 10W (mix moyen)
             FACTOR_CAR_G_PER_M = 0.12  # ~120 g/km soit 0.12 g/m pour une voiture
@@ -210,6 +212,16 @@ def update_sidebar_stats():
         else:
             st.caption("Aucune donnée de session.")
 
+        # Compteurs du cache de réponses (partagé par toutes les sessions du process)
+        cache_stats = get_cache().stats()
+        st.markdown("### Cache des réponses")
+        st.metric(
+            "Taux de hit",
+            f"{cache_stats['hit_rate'] * 100:.0f} %",
+            help=f"{cache_stats['memory_hits']} hits mémoire, {cache_stats['disk_hits']} hits disque, "
+                 f"{cache_stats['misses']} misses, {cache_stats['disk_entries']} réponses stockées"
+        )
+
 
 
 # On appelle la fonction une première fois pour afficher l'état actuel (avant calcul)
@@ -222,35 +234,77 @@ def validate_prompt():
     if st.session_state.current_prompt.strip() != "":
         st.session_state.prompt_validated = True
         
-        # Sauvegarde dans prompts.json
-        prompts = load_json(PROMPTS_FILE)
-        prompts.append({"prompt": st.session_state.current_prompt})
-        save_json(PROMPTS_FILE, prompts)
+        # Ajout au journal des prompts
+        prompt = store_text(st.session_state.current_prompt)
+        prompts_log.append({"prompt_hash": prompt["hash"], "prompt_length": prompt["length"],
+                            "session_id": current_session_id(), "timestamp": time.time()})
 
 def new_prompt():
     st.session_state.prompt_validated = False
     st.session_state.current_prompt = ""
-    st.session_state.current_response = ""
+    st.session_state.llm_results = []
     st.session_state.selected_model = None
 
     try:
-        save_json(PROMPTS_FILE, [])
-        save_json(SESSION_FILE, [])
+        # Seuls les prompts et les appels de cette session sont effacés
+        session_id = current_session_id()
+        prompts_log.remove(lambda record: record.get("session_id") == session_id)
+        history.clear_calls()
         st.info("Historique des prompts et de la session vidé.")
     except Exception as e:
         st.error(f"Impossible de vider le fichier des prompts : {e}")
 
-def save_session_entry(prompt, model_name, response, carbon, tdev_seconds):
-    """Enregistre une entrée de session incluant le temps de réponse (tdev en secondes)."""
-    session_data = load_json(SESSION_FILE)
-    session_data.append({
-        "prompt": prompt,
+# Phases de backend.timing conservées dans l'historique (en secondes)
+LATENCY_PHASES = ("connect", "tls", "request_sent", "first_byte", "last_byte", "server")
+
+def save_session_entry(prompt, model_name, response, carbon, tdev_seconds, timings=None, cache_hit=False, usage=None,
+                       estimates=None, engine="time", timestamp=None, attribution="whole", provider=None):
+    """
+    Enregistre une entrée de session incluant le temps de réponse (tdev en secondes).
+    On conserve aussi la décomposition de la latence (connexion, TLS, requête envoyée, premier et
+    dernier octet, fenêtre serveur) et, en streaming, le délai avant le premier token et les instants
+    d'arrivée des morceaux.
+    usage : tokens de prompt et de complétion, raison de fin et modèle servi, tels que renvoyés par le provider.
+    estimates : empreinte selon chaque moteur ({"time": ..., "flops": ...}), carbon étant celle du moteur `engine`.
+    La durée facturée (billable_seconds) et les tokens traités sont gardés pour recalculer les intervalles
+    d'incertitude de la session.
+    timestamp : instant de l'appel (epoch), qui fixe l'intensité carbone horaire du réseau.
+    attribution : part du pod facturée à la requête par le moteur temps ("whole" ou "batched").
+    provider : fournisseur appelé, qui sert de clé (avec le modèle et le jour) aux sketches de quantiles du store.
+    Les réponses servies par le cache sont marquées (cache_hit) et comptées à 0 gCO₂e.
+    Le prompt et la réponse sont rangés dans le blob store (backend.blob_store) : l'entrée n'en garde que
+    les hashs et les longueurs, et un prompt envoyé à plusieurs modèles n'est stocké qu'une fois.
+    """
+    prompt_blob, response_blob = store_text(prompt), store_text(response)
+    entry = {
+        "provider": provider,
         "model": model_name,
-        "response": response,
+        "prompt_hash": prompt_blob["hash"],
+        "prompt_length": prompt_blob["length"],
+        "response_hash": response_blob["hash"],
+        "response_length": response_blob["length"],
         "carbon": carbon,
         "tdev_seconds": tdev_seconds,
-    })
-    save_json(SESSION_FILE, session_data)
+        "billable_seconds": billable_seconds(tdev_seconds, timings),
+        "tokens": sum(call_tokens(prompt, response, usage)),
+        "engine": engine,
+        "attribution": attribution,
+        "cache_hit": cache_hit,
+        "timestamp": timestamp,
+    }
+    entry.update(usage or {})
+    for engine, value in (estimates or {}).items():
+        entry[f"carbon_{engine}"] = value
+    if timings:
+        for phase in LATENCY_PHASES:
+            entry[f"{phase}_seconds"] = timings.get(phase)
+        entry["connection_reused"] = timings.get("connection_reused")
+    if timings and timings.get("streamed"):
+        entry["ttft_seconds"] = timings["ttft"]
+        entry["generation_seconds"] = timings["generation"]
+        entry["chunk_times"] = timings["chunk_times"]
+
+    history.add_call(entry)
 
 
 # -----------------------------
@@ -293,126 +347,227 @@ if not st.session_state.prompt_validated:
 
 
 # -------------------------------------------------
-# 2. SÉLECTION DU MODÈLE
+# 2. SÉLECTION DES MODÈLES
 # -------------------------------------------------
-st.subheader("2. Choix du provider et du modèle LLM")
-
-# Choix du provider
-st.session_state.selected_provider = st.selectbox(
-    "Choisissez un provider :", 
-    list(MODELS_LIST.keys()),
-    index=None,
-    placeholder="Sélectionnez un provider"
-)
-
-if st.session_state.selected_provider is None:
-    st.stop()
-
-provider = st.session_state.selected_provider
-models_for_provider = MODELS_LIST.get(provider, [])
-
-if not models_for_provider:
-    st.warning(f"Aucun modèle disponible pour le provider {provider}.")
+st.subheader("2. Choix des modèles LLM à comparer")
+
+# Toutes les combinaisons provider / modèle disponibles (on ignore les entrées vides du .env)
+available_targets = [
+    (provider, model)
+    for provider, models in MODELS_LIST.items()
+    for model in models
+    if model.strip()
+]
+
+if not available_targets:
+    st.warning("Aucun modèle disponible : renseignez les variables *_MODEL dans le fichier .env.")
     st.stop()
 
-st.session_state.selected_model = st.selectbox(
-    "Choisissez un modèle spécifique :", 
-    models_for_provider,
-    index=None,
-    placeholder="Sélectionnez un modèle LLM"
+selected_targets = st.multiselect(
+    "Choisissez un ou plusieurs modèles :",
+    available_targets,
+    format_func=lambda target: f"{target[0]} · {target[1]}",
+    placeholder="Sélectionnez des modèles LLM"
 )
 
-if st.session_state.selected_model is None:
+if not selected_targets:
     st.stop()
 
 
 # -------------------------------------------------
 # 3. APPEL LLM + AFFICHAGE RÉPONSE
 # -------------------------------------------------
-st.subheader("3. Réponse du modèle")
-
-if st.button("Envoyer le prompt au modèle"):
-    with st.spinner("Le modèle réfléchit..."):
-        
-        response, tdev = call_llm(
-            st.session_state.selected_provider,
-            st.session_state.current_prompt,
-            model=st.session_state.selected_model,
-        )
-        
-        # On sauvegarde la réponse (qu'il s'agisse d'un succès ou d'une erreur)
-        st.session_state.current_response = response
-        st.session_state.last_tdev = tdev
+st.subheader("3. Réponses des modèles")
 
-        # Indique quel modèle a produit cette réponse et marque la réponse comme "à sauvegarder"
-        st.session_state.response_model = st.session_state.selected_model
-        st.session_state.pending_save = True
-
-# Cette partie gère l'affichage de la réponse ou de l'erreur stockée en session
-if st.session_state.current_response:
-    response_data = st.session_state.current_response
+def render_result(result):
+    """Affiche la réponse (ou l'erreur) d'un modèle."""
+    st.markdown(f"**{result['provider']} · {result['model']}**")
+    if result.get("cache_hit"):
+        st.caption("♻️ Réponse servie depuis le cache : aucun nouvel appel, 0 gCO₂e.")
+    response_data = result["response"]
 
     # Vérifie si la réponse est un dictionnaire et si elle contient une clé 'error'
     if isinstance(response_data, dict) and 'error' in response_data:
         st.error(f"**Une erreur est survenue lors de l'appel au modèle :**\n\n{response_data['error']}")
-    
+
     # Sinon, si la réponse est bien une chaîne de caractères (cas du succès)
     elif isinstance(response_data, str):
-        st.markdown("**Réponse du modèle :**")
         st.markdown(f"```\n{response_data}\n```")
-        
+
     # Cas de sécurité si la réponse n'est ni un dictionnaire d'erreur, ni une string
     else:
         st.warning("La réponse reçue est dans un format inattendu.")
         st.write(response_data)
 
+streaming = st.toggle(
+    "Mode streaming",
+    help="Affiche les réponses au fil de l'eau et mesure le délai avant le premier token. "
+         "Seule la fenêtre de génération est alors comptée comme temps de calcul "
+         "(sinon : la fenêtre requête envoyée -> premier octet)."
+)
 
-# -------------------------------------------------
-# 4. EMPREINTE CARBONE
-# -------------------------------------------------
-if st.session_state.current_response:
-    st.subheader("4. Empreinte carbone estimée")
-
-    # Utiliser explicitement le modèle qui a produit la réponse (s'il existe)
-    model_for_response = st.session_state.get("response_model", st.session_state.selected_model)
-
-    carbon = compute_carbon(
-        model_for_response,
-        st.session_state.current_prompt,
-        st.session_state.current_response,
-        st.session_state.last_tdev,
-    )
-
-    st.metric(label="Empreinte carbone (g CO₂e)", value=f"{carbon:.4f}")
+engine = st.radio(
+    "Moteur d'estimation",
+    list(ENGINES),
+    index=list(ENGINES).index(DEFAULT_CARBON_ENGINE) if DEFAULT_CARBON_ENGINE in ENGINES else 0,
+    format_func=ENGINES.get,
+    horizontal=True,
+    help="Temps mesuré : durée de calcul x puissance du matériel. "
+         "FLOPs : tokens x paramètres actifs du modèle, indépendant de la latence réseau. "
+         "Les deux sont affichés ; celui-ci sert aux totaux de la session."
+)
 
-    # Affichage du temps de réponse
-    st.metric(label="Temps de réponse (s)", value=f"{st.session_state.last_tdev:.3f}")
+attribution = st.radio(
+    "Attribution du matériel (moteur temps)",
+    list(ATTRIBUTION_MODES),
+    index=list(ATTRIBUTION_MODES).index(DEFAULT_ATTRIBUTION) if DEFAULT_ATTRIBUTION in ATTRIBUTION_MODES else 0,
+    format_func=ATTRIBUTION_MODES.get,
+    horizontal=True,
+    help="Pod entier : la requête paie toutes les puces du pod pendant sa durée. "
+         "Partagé : les providers servent de nombreuses requêtes en même temps ; l'énergie du pod "
+         "(consommation à vide comprise) est répartie entre elles."
+)
 
-    # Sauvegarde uniquement si la réponse vient d'être récupérée et n'a pas encore été sauvegardée
-    if st.session_state.get("pending_save", False):
-        # protège contre l'enregistrement si l'utilisateur a changé de modèle entre-temps
-        if st.session_state.get("response_model") == model_for_response:
+if st.button("Envoyer le prompt aux modèles sélectionnés"):
+    st.session_state.llm_results = []
+
+    # Un emplacement par modèle, rempli dès que sa réponse arrive
+    placeholders = {target: st.empty() for target in selected_targets}
+    for target, placeholder in placeholders.items():
+        placeholder.info(f"{target[0]} · {target[1]} : le modèle réfléchit...")
+
+    def on_result(llm_result):
+        # llm_result : LLMResult (appel classique) ou LLMStream terminé, qui exposent les mêmes attributs
+        provider, model, response = llm_result.provider, llm_result.model, llm_result.response
+        result = {
+            "provider": provider, "model": model, "response": response,
+            "tdev": llm_result.tdev, "timings": llm_result.timings, "cache_hit": llm_result.cache_hit,
+            "timestamp": time.time(),  # L'intensité carbone du réseau dépend de l'heure de l'appel
+            "attribution": attribution,
+            **llm_result.usage(),
+        }
+
+        if isinstance(response, str):
+            # Les deux moteurs sont calculés pour l'affichage côte à côte ; "carbon" suit le moteur choisi
+            result["estimates"] = {
+                "time": compute_carbon(
+                    model, st.session_state.current_prompt, response, llm_result.tdev,
+                    timings=llm_result.timings, cache_hit=llm_result.cache_hit, timestamp=result["timestamp"],
+                    attribution=attribution
+                ),
+                "flops": compute_carbon_flops(
+                    model, st.session_state.current_prompt, response,
+                    usage=llm_result.usage(), cache_hit=llm_result.cache_hit, timestamp=result["timestamp"]
+                ),
+            }
+            result["engine"] = engine if result["estimates"][engine] is not None else "time"
+            result["carbon"] = result["estimates"][result["engine"]]
+            # Intervalle d'incertitude (Monte Carlo sur les paramètres de config) du moteur retenu
+            result["interval"] = result_interval(
+                model, st.session_state.current_prompt, response, llm_result.tdev,
+                timings=llm_result.timings, usage=llm_result.usage(), engine=result["engine"],
+                cache_hit=llm_result.cache_hit, attribution=attribution
+            )
             save_session_entry(
-                st.session_state.current_prompt,
-                model_for_response,
-                st.session_state.current_response,
-                carbon,
-                st.session_state.last_tdev,
+                st.session_state.current_prompt, model, response, result["carbon"], llm_result.tdev,
+                timings=llm_result.timings, cache_hit=llm_result.cache_hit, usage=llm_result.usage(),
+                estimates=result["estimates"], engine=result["engine"], timestamp=result["timestamp"],
+                attribution=attribution, provider=provider
             )
             # Met à jour les stats dans la sidebar
             update_sidebar_stats()
 
-        # réinitialiser le marqueur pour éviter de resauvegarder lors des reruns
-        st.session_state.pending_save = False
+        st.session_state.llm_results.append(result)
+        with placeholders[(provider, model)].container():
+            render_result(result)
 
-    # Importation locale (lazy import) : 
-    # Le module n'est importé que lorsque Python lit cette ligne, pas au démarrage du script.
-    def afficher_details():
-        show_calculation()
+    # Tous les modèles sont lancés en même temps : on attend le plus lent, pas la somme des latences
+    if streaming:
+        partial_texts = {target: "" for target in selected_targets}
+
+        def on_chunk(provider, model, text):
+            partial_texts[(provider, model)] += text
+            placeholders[(provider, model)].markdown(f"**{provider} · {model}**\n\n{partial_texts[(provider, model)]}")
+
+        def on_done(provider, model, stream):
+            on_result(stream)
+
+        fan_out_stream_sync(st.session_state.current_prompt, selected_targets, on_chunk=on_chunk, on_done=on_done)
+    else:
+        fan_out_sync(st.session_state.current_prompt, selected_targets, on_result=on_result)
+
+# Sur les reruns suivants, on réaffiche les résultats stockés en session
+elif st.session_state.llm_results:
+    for result in st.session_state.llm_results:
+        render_result(result)
+
+
+# -------------------------------------------------
+# 4. EMPREINTE CARBONE
+# -------------------------------------------------
+successful_results = [r for r in st.session_state.llm_results if "carbon" in r]
+
+if successful_results:
+    st.subheader("4. Empreinte carbone estimée")
+
+    for column, result in zip(st.columns(len(successful_results)), successful_results):
+        with column:
+            st.markdown(f"**{result['model']}**")
+            time_col, flops_col = st.columns(2)
+            with time_col:
+                st.metric(label="Temps mesuré (g CO₂e)", value=f"{result['estimates']['time']:.4f}")
+            with flops_col:
+                flops_value = result["estimates"]["flops"]
+                st.metric(label="FLOPs (g CO₂e)", value="—" if flops_value is None else f"{flops_value:.4f}",
+                          help=None if flops_value is not None else "Nombre de paramètres du modèle inconnu")
+            st.caption(f"Moteur retenu pour la session : {ENGINES[result['engine']]}")
+            interval = result["interval"]
+            st.caption(f"Intervalle 90 % : {interval['p5']:.4f} – {interval['p95']:.4f} g CO₂e "
+                       f"(médiane {interval['p50']:.4f})")
+            # Affichage du temps de réponse
+            st.metric(label="Temps de réponse (s)", value=f"{result['tdev']:.3f}")
+            timings = result.get("timings") or {}
+            if timings.get("streamed"):
+                st.metric(label="Premier token (s)", value=f"{timings['ttft']:.3f}")
+            if timings.get("server") is not None:
+                st.metric(label="Fenêtre serveur (s)", value=f"{timings['server']:.3f}",
+                          help="Seule cette durée est comptée comme temps de calcul")
+            if result.get("completion_tokens"):
+                st.metric(label="Tokens (prompt / réponse)",
+                          value=f"{result.get('prompt_tokens') or '—'} / {result['completion_tokens']}",
+                          help=f"Modèle servi : {result.get('served_model') or result['model']} · "
+                               f"fin : {result.get('finish_reason') or 'inconnue'}")
+                if not result.get("cache_hit"):
+                    tps = tokens_per_second(result["completion_tokens"], result["tdev"], timings)
+                    if tps is not None:
+                        st.metric(label="Débit (tokens/s)", value=f"{tps:.1f}")
+                    per_1k = carbon_per_1k_tokens(result["carbon"], result.get("prompt_tokens"), result["completion_tokens"])
+                    st.metric(label="gCO₂e / 1k tokens", value=f"{per_1k:.4f}")
+
+    # Le détail du calcul porte sur un seul modèle à la fois
+    detail_result = successful_results[0]
+    if len(successful_results) > 1:
+        detail_result = st.selectbox(
+            "Détail du calcul pour :",
+            successful_results,
+            format_func=lambda r: f"{r['provider']} · {r['model']}"
+        )
+    st.session_state.selected_model = detail_result["model"]
+    st.session_state.last_tdev = detail_result["tdev"]
+    st.session_state.last_timings = detail_result.get("timings")
+    st.session_state.last_cache_hit = detail_result.get("cache_hit", False)
+    st.session_state.last_timestamp = detail_result.get("timestamp")
+    st.session_state.last_attribution = detail_result.get("attribution", "whole")
+    st.session_state.last_usage = {
+        "prompt_tokens": detail_result.get("prompt_tokens"),
+        "completion_tokens": detail_result.get("completion_tokens"),
+    }
+    st.session_state.last_prompt = st.session_state.current_prompt
+    st.session_state.last_response = detail_result["response"]
 
     # Le composant natif pour afficher/masquer
     with st.expander("Voir l'explication détaillée"):
-        afficher_details()
+        show_calculation()
 
 # -------------------------------------------------
 # 5. Visualisation de session
@@ -420,15 +575,41 @@ if st.session_state.current_response:
 st.subheader("5. Visualisation comparative des modèles")
 
 # Import du module de visualisation
-from backend.visualisation import create_model_comparison_chart, create_session_timeline
+from backend.visualisation import (
+    create_model_comparison_chart,
+    create_session_timeline,
+    create_token_efficiency_chart,
+    load_model_quantiles,
+)
+
+# Figures mises en cache par version des données : un rerun sans nouvel appel ne les reconstruit pas.
+# L'historique est passé tel quel : ses appels et agrégats ne sont lus que si la figure doit être construite.
+figure_cache = {"version": history.data_version, "theme": st.context.theme.type or "light"}
 
 # Créer et afficher le graphique comparatif
-fig_comparison = create_model_comparison_chart()
+fig_comparison = create_model_comparison_chart(history=history, **figure_cache)
 st.plotly_chart(fig_comparison, use_container_width=True)
 
+# Queues de distribution de tous les utilisateurs, à partir des sketches persistés par (provider, modèle, jour)
+with st.expander("📈 p50 / p90 / p99 par modèle, toutes sessions (7 derniers jours)"):
+    since_day = (datetime.now(timezone.utc) - timedelta(days=6)).strftime("%Y-%m-%d")
+    quantiles = load_model_quantiles(since_day)
+    if quantiles.empty:
+        st.caption("Aucun appel enregistré sur la période.")
+    else:
+        st.dataframe(quantiles.rename(columns={
+            "model": "Modèle", "count": "Appels",
+            "carbon_p50": "gCO₂e p50", "carbon_p90": "gCO₂e p90", "carbon_p99": "gCO₂e p99",
+            "tdev_p50": "Temps p50 (s)", "tdev_p90": "Temps p90 (s)", "tdev_p99": "Temps p99 (s)",
+        }), use_container_width=True, hide_index=True)
+
+# Débit et émissions rapportés aux tokens comptés par les providers
+fig_tokens = create_token_efficiency_chart(history=history, **figure_cache)
+st.plotly_chart(fig_tokens, use_container_width=True)
+
 # Afficher également la timeline (optionnel)
 with st.expander("📊 Voir la chronologie de la session"):
-    fig_timeline = create_session_timeline()
+    fig_timeline = create_session_timeline(history=history, **figure_cache)
     st.plotly_chart(fig_timeline, use_container_width=True)
 
 # -------------------------------------------------
@@ -437,10 +618,17 @@ with st.expander("📊 Voir la chronologie de la session"):
 
 st.subheader("6. Historique des appels LLM de la session")
 
-session_data = load_json(SESSION_FILE)
-if not session_data:
+total_calls = history.count_calls()
+if not total_calls:
     st.info("Aucun appel LLM enregistré dans cette session.")
 else:
+    # Pagination : seule la page affichée est rendue, du plus récent au plus ancien
+    page_count = (total_calls + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+    page = st.number_input(f"Page (sur {page_count})", min_value=1, max_value=page_count, value=1, step=1) \
+        if page_count > 1 else 1
+    offset = (page - 1) * HISTORY_PAGE_SIZE
+    session_data = history.calls(limit=HISTORY_PAGE_SIZE, offset=offset, newest_first=True)
+    st.caption(f"Appels {offset + 1} à {offset + len(session_data)} sur {total_calls}, du plus récent au plus ancien.")
     for i, entry in enumerate(session_data):
         # On utilise flex et gap pour l'espacement, et un style de badge pour chaque métrique
         # Note : Ici on met les chiffres en vert foncé car le fond de la carte est clair
@@ -455,8 +643,12 @@ else:
                         🌳 <b style="color: #1b5e20; font-size: 1.4em;">{entry['carbon']:.4f}</b> <span style="color: #555">gCO₂e</span>
                     </span>
                     <span style="color: #666;">
-                        💬 <b>{len(entry['response'].split())}</b> mots
+                        💬 <b>{entry.get('completion_tokens') or '—'}</b> tokens générés
                     </span>
                 </div>
             </div>
             """, unsafe_allow_html=True)
+        # Textes lus dans le blob store seulement si on demande à les voir
+        if st.toggle("Voir le prompt et la réponse", key=f"history_body_{total_calls - offset - i}"):
+            st.markdown(f"**Prompt** : {load_text(entry.get('prompt_hash')) or entry.get('prompt') or '—'}")
+            st.markdown(f"**Réponse** : {load_text(entry.get('response_hash')) or entry.get('response') or '—'}")
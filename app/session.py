@@ -0,0 +1,28 @@
+import uuid
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from backend.utils import SessionHistory, prune_history
+
+
+def current_session_id():
+    """Identifiant de la session Streamlit courante (un par onglet de navigateur), stable d'un rerun à l'autre."""
+    if "session_id" not in st.session_state:
+        ctx = get_script_run_ctx()
+        st.session_state.session_id = ctx.session_id if ctx is not None else uuid.uuid4().hex
+    return st.session_state.session_id
+
+
+@st.cache_resource(show_spinner=False)
+def _prune_history_at_startup():
+    # Une seule fois par process (cache_resource), avant que la première session ne charge son historique
+    return prune_history()
+
+
+def get_session_history():
+    """Historique de la session courante (voir SessionHistory), créé au premier appel et gardé dans st.session_state."""
+    _prune_history_at_startup()
+    if "history" not in st.session_state:
+        st.session_state.history = SessionHistory(current_session_id())
+    return st.session_state.history
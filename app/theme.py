@@ -0,0 +1,80 @@
+import re
+from functools import lru_cache
+from pathlib import Path
+
+import streamlit as st
+
+from backend.utils import versioned_url
+
+# Thème commun aux pages : feuille de style et images, préparées une seule fois par process.
+#
+# Les CSS sont minifiées et mises en cache (la clé inclut la date de modification du fichier : une
+# modification est prise en compte sans redémarrer). Les images sont servies par le serveur de fichiers
+# statiques de Streamlit (dossier app/static, enableStaticServing dans .streamlit/config.toml) : la page ne
+# contient que leur URL, suffixée de l'empreinte du fichier, au lieu d'une data URI base64 renvoyée à chaque
+# rerun. Le serveur répond avec ETag / Last-Modified, le navigateur ne retélécharge que si l'empreinte change.
+
+APP_DIR = Path(__file__).resolve().parent
+STATIC_DIR = APP_DIR / "static"
+BASE_CSS = APP_DIR / "accueil_styles.css"
+
+# Chaînes entre guillemets (gardées telles quelles) ou commentaires (supprimés)
+_STRING_OR_COMMENT = re.compile(r"(\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*')|/\*.*?\*/", re.S)
+_STRING = re.compile(r"(\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*')")
+
+
+def _minify_segment(css):
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    # Espace avant ":" retiré seulement dans une déclaration ("color :red" : propriété après { ou ; et valeur
+    # terminée par ; ou }) : dans un sélecteur, "a :hover" et "a:hover" ne sont pas équivalents
+    css = re.sub(r"([{;])([-\w]+)\s+:(?=[^{}]*[;}])", r"\1\2:", css)
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}")
+
+
+@lru_cache(maxsize=None)
+def minify_css(css):
+    """CSS sans commentaires ni espaces superflus ; le contenu des chaînes (url('...'), content: "...") est conservé."""
+    css = _STRING_OR_COMMENT.sub(lambda m: m.group(1) or "", css)
+    parts = _STRING.split(css)
+    # Les indices impairs sont les chaînes capturées par split
+    return "".join(part if i % 2 else _minify_segment(part) for i, part in enumerate(parts)).strip()
+
+
+@lru_cache(maxsize=None)
+def _load_css(path, mtime_ns):
+    return minify_css(Path(path).read_text(encoding="utf-8"))
+
+
+def load_css(path=BASE_CSS):
+    """Contenu minifié de la feuille de style `path`, lu une seule fois par process (et par version du fichier)."""
+    path = Path(path)
+    if not path.is_file():
+        print(f"Feuille de style {path} introuvable.")
+        return ""
+    return _load_css(str(path), path.stat().st_mtime_ns)
+
+
+def static_url(name):
+    """URL de app/static/`name` pour le serveur statique de Streamlit, suffixée de l'empreinte du fichier."""
+    return versioned_url(STATIC_DIR / name, f"app/static/{name}")
+
+
+def apply_theme(page_css="", background=None):
+    """
+    Injecte la feuille de style commune, suivie des règles propres à la page (`page_css`).
+    background : image de app/static utilisée comme fond de l'application.
+    """
+    css = load_css() + minify_css(page_css)
+    if background is not None:
+        css += minify_css(f"""
+            .stApp {{
+                background-image: url("{static_url(background)}");
+                background-size: cover;
+                background-position: center;
+                background-repeat: no-repeat;
+                background-attachment: fixed;
+            }}
+        """)
+    st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
@@ -0,0 +1,263 @@
+import math
+from datetime import datetime, timezone
+
+# Agrégats d'une session tenus à jour à chaque écriture : un rerun lit des totaux déjà calculés
+# au lieu de reparcourir l'historique (coût constant, quelle que soit la longueur de la session).
+
+SKETCH_METRICS = ("carbon", "tdev_seconds")
+SKETCH_QUANTILES = (0.5, 0.9, 0.99)
+
+
+class RunningStats:
+    """
+    Nombre, somme, minimum, maximum, moyenne et variance d'une série, mis à jour en O(1) par valeur
+    (algorithme de Welford : pas de perte de précision sur la somme des carrés).
+    """
+
+    __slots__ = ("count", "total", "mean", "_m2", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        if value is None:
+            return
+        self.count += 1
+        self.total += value
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        """Ajoute les valeurs résumées par `other` (formule de Chan et al.)."""
+        if not other.count:
+            return
+        if not self.count:
+            self.count, self.total, self.mean, self._m2 = other.count, other.total, other.mean, other._m2
+            self.min, self.max = other.min, other.max
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self):
+        """Variance empirique (n - 1), None avec moins de deux valeurs."""
+        return self._m2 / (self.count - 1) if self.count > 1 else None
+
+    @property
+    def std(self):
+        variance = self.variance
+        return math.sqrt(variance) if variance is not None else None
+
+
+class DDSketch:
+    """
+    Sketch de quantiles DDSketch : chaque quantile est estimé à relative_accuracy près (1 % par défaut),
+    en mémoire bornée (max_bins paquets), et deux sketches se fusionnent exactement (merge).
+
+    Une valeur x > 0 tombe dans le paquet ceil(log_gamma(x)), gamma = (1 + a) / (1 - a) ; les valeurs
+    nulles ou négatives (émissions d'une réponse du cache...) sont comptées à part, comme des zéros.
+    Au-delà de max_bins paquets, les plus bas sont fusionnés : seuls les tout petits quantiles perdent en précision.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_bins=2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}  # indice de paquet -> nombre de valeurs
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value):
+        if value is None:
+            return
+        self.count += 1
+        if value <= 0:
+            self.zero_count += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self.bins[key] = self.bins.get(key, 0) + 1
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def _collapse(self):
+        keys = sorted(self.bins)
+        lowest, next_lowest = keys[0], keys[1]
+        self.bins[next_lowest] += self.bins.pop(lowest)
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracies.")
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        while len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def quantile(self, q):
+        """Quantile q (entre 0 et 1), None si le sketch est vide."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        cumulative = self.zero_count
+        for key in sorted(self.bins):
+            cumulative += self.bins[key]
+            if cumulative > rank:
+                # Milieu (relatif) du paquet : erreur relative au plus relative_accuracy
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def quantiles(self, qs=SKETCH_QUANTILES):
+        """{"p50": ..., "p90": ..., "p99": ...} en un seul tri des paquets."""
+        return {f"p{q * 100:g}": self.quantile(q) for q in qs}
+
+    def to_dict(self):
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "max_bins": self.max_bins,
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "bins": {str(key): count for key, count in self.bins.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["relative_accuracy"], data["max_bins"])
+        sketch.zero_count = data["zero_count"]
+        sketch.count = data["count"]
+        sketch.bins = {int(key): count for key, count in data["bins"].items()}
+        return sketch
+
+
+def sketch_day(timestamp):
+    """Jour UTC (AAAA-MM-JJ) d'un instant epoch : granularité des sketches persistés."""
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%d")
+
+
+def sketch_key(entry):
+    """(provider, modèle, jour) d'une entrée de session, clé des sketches persistés par les stores."""
+    return entry.get("provider") or "unknown", entry["model"], sketch_day(entry.get("timestamp") or 0)
+
+
+def merge_sketches(sketches):
+    """Fusionne des DDSketch (ex : tous les jours et providers d'un modèle) ; None s'il n'y en a aucun."""
+    merged = None
+    for sketch in sketches:
+        if merged is None:
+            merged = DDSketch(sketch.relative_accuracy, sketch.max_bins)
+        merged.merge(sketch)
+    return merged
+
+
+class SessionAggregates:
+    """
+    Agrégats des appels LLM d'une session : émissions et temps de réponse (global et par modèle),
+    secondes facturées et tokens par (modèle, moteur, attribution) pour les intervalles d'incertitude.
+    """
+
+    def __init__(self):
+        # Compteurs d'appels à part : un appel sans émissions ou sans temps (None) compte quand même
+        self.calls = 0
+        self.model_calls = {}  # modèle -> nombre d'appels
+        self.carbon = RunningStats()
+        self.tdev = RunningStats()
+        self.models = {}  # modèle -> (RunningStats carbone, RunningStats temps)
+        self.usage = {}   # (modèle, moteur, attribution) -> [secondes, tokens]
+        # Queues de distribution : un DDSketch par métrique, pour la session et pour chaque modèle
+        self.sketches = {metric: DDSketch() for metric in SKETCH_METRICS}
+        self.model_sketches = {}  # modèle -> {métrique: DDSketch}
+
+    @classmethod
+    def from_entries(cls, entries):
+        aggregates = cls()
+        for entry in entries:
+            aggregates.add(entry)
+        return aggregates
+
+    def add(self, entry):
+        carbon, tdev = entry.get("carbon"), entry.get("tdev_seconds")
+        self.calls += 1
+        self.model_calls[entry["model"]] = self.model_calls.get(entry["model"], 0) + 1
+        self.carbon.add(carbon)
+        self.tdev.add(tdev)
+        model_carbon, model_tdev = self.models.setdefault(entry["model"], (RunningStats(), RunningStats()))
+        model_carbon.add(carbon)
+        model_tdev.add(tdev)
+        model_sketches = self.model_sketches.setdefault(
+            entry["model"], {metric: DDSketch() for metric in SKETCH_METRICS}
+        )
+        for metric in SKETCH_METRICS:
+            self.sketches[metric].add(entry.get(metric))
+            model_sketches[metric].add(entry.get(metric))
+
+        if not entry.get("cache_hit"):
+            usage = self.usage.setdefault((entry["model"], entry.get("engine"), entry.get("attribution")), [0.0, 0])
+            usage[0] += entry.get("billable_seconds", tdev) or 0.0
+            usage[1] += entry.get("tokens") or 0
+
+    def call_stats(self):
+        """
+        {"calls", "carbon", "avg_carbon", "avg_tdev", ...} : nombre d'appels, total et moyennes,
+        et quantiles p50 / p90 / p99 des émissions ("carbon_quantiles") et du temps ("tdev_quantiles").
+        """
+        return {
+            "carbon_quantiles": self.sketches["carbon"].quantiles(),
+            "tdev_quantiles": self.sketches["tdev_seconds"].quantiles(),
+            "calls": self.calls,
+            "carbon": self.carbon.total,
+            "avg_carbon": self.carbon.mean if self.carbon.count else None,
+            "std_carbon": self.carbon.std,
+            "min_carbon": self.carbon.min,
+            "max_carbon": self.carbon.max,
+            "avg_tdev": self.tdev.mean if self.tdev.count else None,
+            "std_tdev": self.tdev.std,
+        }
+
+    def model_stats(self):
+        """
+        Par modèle : nombre d'appels, émissions (moyenne, total, écart-type, min, max, p50 / p90 / p99),
+        temps de réponse (mêmes statistiques).
+        """
+        return [
+            {
+                **{f"carbon_{name}": value for name, value in self.model_sketches[model]["carbon"].quantiles().items()},
+                **{f"tdev_{name}": value
+                   for name, value in self.model_sketches[model]["tdev_seconds"].quantiles().items()},
+                "model": model,
+                "count": self.model_calls[model],
+                "carbon": carbon.mean,
+                "carbon_total": carbon.total,
+                "carbon_std": carbon.std,
+                "carbon_min": carbon.min,
+                "carbon_max": carbon.max,
+                "tdev_seconds": tdev.mean,
+                "tdev_std": tdev.std,
+                "tdev_min": tdev.min,
+                "tdev_max": tdev.max,
+            }
+            for model, (carbon, tdev) in sorted(self.models.items())
+        ]
+
+    def usage_totals(self):
+        """Quantités attendues par backend.uncertainty.totals_interval."""
+        return [
+            {"model": model, "engine": engine, "attribution": attribution, "seconds": seconds, "tokens": tokens}
+            for (model, engine, attribution), (seconds, tokens) in self.usage.items()
+        ]
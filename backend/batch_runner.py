@@ -0,0 +1,233 @@
+import argparse
+import asyncio
+import csv
+import json
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .config import MODELS_LIST, DEFAULT_CARBON_ENGINE, DEFAULT_ATTRIBUTION
+from .compute_LLM_footprint import ENGINES, ATTRIBUTION_MODES, compute_carbon, compute_carbon_flops
+from .llm_async import call_llm_async, call_llm_cached_async
+from .utils import JsonlStore
+
+# Évaluation "headless" d'un fichier de prompts sur plusieurs modèles.
+# Le fichier de résultats (JSONL, une ligne par couple prompt x modèle) sert aussi de checkpoint :
+# relancer la même commande après un crash ne refait que les appels manquants.
+#
+# Exemple : python -m backend.batch_runner prompts.jsonl -m groq:llama-3.3-70b-versatile -m hf:mistralai/Mistral-7B-Instruct-v0.2:featherless-ai
+
+
+def load_prompts(path):
+    """
+    Lit les prompts d'un fichier .jsonl ({"prompt": ..., "id": ...}) ou .csv (colonnes prompt[, id]).
+    Sans identifiant explicite, le numéro de ligne sert d'id.
+    """
+    path = Path(path)
+    prompts = []
+
+    if path.suffix.lower() == ".csv":
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    for i, row in enumerate(rows):
+        prompt = row.get("prompt", "")
+        if not prompt or not prompt.strip():
+            continue
+        # Un id "falsy" (0, "") reste un id : seul un id absent est remplacé par le numéro de ligne
+        prompt_id = row.get("id")
+        prompts.append({"id": str(i if prompt_id is None else prompt_id), "prompt": prompt})
+    return prompts
+
+
+def parse_targets(specs):
+    """Transforme ["provider:model", ...] en [(provider, model), ...] ; sans spec, tous les modèles configurés."""
+    if not specs:
+        return [(provider, model) for provider, models in MODELS_LIST.items() for model in models if model.strip()]
+
+    targets = []
+    for spec in specs:
+        # Le nom du modèle peut lui-même contenir ":" (ex : modèles HF "org/model:provider")
+        provider, _, model = spec.partition(":")
+        if not model:
+            raise ValueError(f"Cible invalide '{spec}' : format attendu provider:model")
+        targets.append((provider.lower(), model))
+    return targets
+
+
+def _record_key(record):
+    return (record["prompt_id"], record["provider"], record["model"])
+
+
+def load_checkpoint(output_path, retry_errors=True):
+    """
+    Relit le fichier de résultats et renvoie les clés (prompt_id, provider, model) déjà traitées.
+    Une dernière ligne tronquée (crash pendant l'écriture) est supprimée pour garder un JSONL valide.
+    Si retry_errors est vrai, les appels en erreur seront retentés.
+    """
+    output_path = Path(output_path)
+    done = set()
+    if not output_path.exists():
+        return done
+
+    with open(output_path, "rb+") as f:
+        content = f.read()
+        if content and not content.endswith(b"\n"):
+            last_newline = content.rfind(b"\n")
+            f.truncate(last_newline + 1)
+            content = content[:last_newline + 1]
+            print(f"Checkpoint : dernière ligne incomplète de {output_path} supprimée.")
+
+    for line in content.decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            key = _record_key(record)
+        except json.JSONDecodeError:
+            print(f"Checkpoint : ligne illisible de {output_path} ignorée.")
+            continue
+        except (KeyError, TypeError):
+            # Enregistrement partiel ou d'un autre format : l'appel correspondant sera refait
+            print(f"Checkpoint : enregistrement sans prompt_id / provider / model dans {output_path}, ignoré.")
+            continue
+        if retry_errors and "error" in record:
+            continue
+        done.add(key)
+    return done
+
+
+async def run_batch_async(prompts, targets, output_path, concurrency=8, use_cache=True, retry_errors=True,
+                          engine=DEFAULT_CARBON_ENGINE, attribution=DEFAULT_ATTRIBUTION):
+    """
+    Exécute le produit cartésien prompts x targets avec au plus `concurrency` appels en vol
+    (en plus des limites par provider de llm_async), et ajoute chaque résultat au fichier JSONL.
+    Chaque enregistrement porte l'empreinte des deux moteurs (carbon_time, carbon_flops) ;
+    carbon est celle du moteur `engine` ; `attribution` ("whole" ou "batched") s'applique au moteur temps.
+    Renvoie un résumé {"total", "skipped", "done", "errors"}.
+    """
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    done_keys = load_checkpoint(output_path, retry_errors=retry_errors)
+
+    jobs = [
+        (prompt, provider, model)
+        for prompt in prompts
+        for provider, model in targets
+        if (prompt["id"], provider, model) not in done_keys
+    ]
+    summary = {"total": len(prompts) * len(targets), "skipped": len(prompts) * len(targets) - len(jobs), "done": 0, "errors": 0}
+    if not jobs:
+        return summary
+
+    queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+
+    start = time.time()
+    # Chaque ligne est écrite et flushée aussitôt ; les fsync sont groupés (JSONL_FSYNC_EVERY / JSONL_FSYNC_INTERVAL)
+    # et faits hors de la boucle asyncio, pour ne pas bloquer les appels en vol
+    out = JsonlStore(output_path)
+    try:
+
+        async def worker():
+            while True:
+                try:
+                    prompt, provider, model = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+
+                if use_cache:
+                    result = await call_llm_cached_async(provider, prompt["prompt"], model)
+                else:
+                    result = await call_llm_async(provider, prompt["prompt"], model)
+
+                called_at = datetime.now(timezone.utc)
+                record = {
+                    "prompt_id": prompt["id"],
+                    "prompt": prompt["prompt"],
+                    "provider": provider,
+                    "model": model,
+                    "tdev_seconds": result.tdev,
+                    "cache_hit": result.cache_hit,
+                    "timestamp": called_at.isoformat(),
+                    "attribution": attribution,
+                }
+                if isinstance(result.response, str):
+                    record["response"] = result.response
+                    record["timings"] = result.timings
+                    record.update(result.usage())
+                    record["carbon_time"] = compute_carbon(
+                        model, prompt["prompt"], result.response, result.tdev,
+                        timings=result.timings, cache_hit=result.cache_hit, timestamp=called_at,
+                        attribution=attribution,
+                    )
+                    record["carbon_flops"] = compute_carbon_flops(
+                        model, prompt["prompt"], result.response, usage=result.usage(), cache_hit=result.cache_hit,
+                        timestamp=called_at,
+                    )
+                    # Le moteur FLOPs n'est pas disponible sans nombre de paramètres : repli sur le moteur temps
+                    record["carbon"] = record.get(f"carbon_{engine}")
+                    if record["carbon"] is None:
+                        record["carbon"] = record["carbon_time"]
+                else:
+                    record["error"] = result.response.get("error", str(result.response))
+                    summary["errors"] += 1
+
+                await asyncio.to_thread(out.append, record)
+                summary["done"] += 1
+                if summary["done"] % 50 == 0 or summary["done"] == len(jobs):
+                    print(f"[batch] {summary['done']}/{len(jobs)} appels ({summary['errors']} erreurs) "
+                          f"en {time.time() - start:.0f} s")
+
+        await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(jobs))))))
+    finally:
+        out.close()
+
+    return summary
+
+
+def run_batch(prompts_path, targets, output_path, concurrency=8, use_cache=True, retry_errors=True,
+              engine=DEFAULT_CARBON_ENGINE, attribution=DEFAULT_ATTRIBUTION):
+    """API Python synchrone : lit le fichier de prompts et lance run_batch_async."""
+    prompts = load_prompts(prompts_path)
+    return asyncio.run(run_batch_async(
+        prompts, targets, output_path,
+        concurrency=concurrency, use_cache=use_cache, retry_errors=retry_errors, engine=engine,
+        attribution=attribution,
+    ))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Évalue un fichier de prompts sur plusieurs modèles LLM (avec reprise).")
+    parser.add_argument("prompts", help="Fichier .jsonl ou .csv contenant une colonne/clé 'prompt' (et optionnellement 'id')")
+    parser.add_argument("-m", "--model", action="append", dest="models", metavar="PROVIDER:MODEL",
+                        help="Modèle à évaluer (répétable). Par défaut : tous les modèles du .env")
+    parser.add_argument("-o", "--output", default="data/batch_results.jsonl", help="Fichier de résultats JSONL (append-only)")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="Nombre maximal d'appels simultanés")
+    parser.add_argument("--no-cache", action="store_true", help="Ne pas utiliser le cache de réponses")
+    parser.add_argument("--keep-errors", action="store_true", help="Ne pas retenter les appels en erreur lors d'une reprise")
+    parser.add_argument("--engine", choices=list(ENGINES), default=DEFAULT_CARBON_ENGINE,
+                        help="Moteur d'estimation utilisé pour le champ carbon")
+    parser.add_argument("--attribution", choices=list(ATTRIBUTION_MODES), default=DEFAULT_ATTRIBUTION,
+                        help="Part du pod facturée à chaque requête par le moteur temps")
+    args = parser.parse_args(argv)
+
+    summary = run_batch(
+        args.prompts,
+        parse_targets(args.models),
+        args.output,
+        concurrency=args.concurrency,
+        use_cache=not args.no_cache,
+        retry_errors=not args.keep_errors,
+        engine=args.engine,
+        attribution=args.attribution,
+    )
+    print(f"Terminé : {summary['done']} appels effectués, {summary['skipped']} déjà présents, {summary['errors']} erreurs.")
+
+
+if __name__ == "__main__":
+    main()
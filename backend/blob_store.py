@@ -0,0 +1,132 @@
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from .config import BLOB_STORE_DIR, BLOB_COMPRESSION, BLOB_CACHE_ENTRIES
+
+try:
+    import zstandard
+except ImportError:  # dépendance optionnelle : gzip sinon
+    zstandard = None
+
+# Stockage des prompts et des réponses adressé par contenu.
+#
+# Un texte est rangé sous l'empreinte SHA-256 de son contenu : <BLOB_STORE_DIR>/<2 premiers caractères>/<hash>.<codec>
+# (codec "zst" si zstandard est installé, "gz" sinon). Les entrées de l'historique ne gardent que le hash,
+# la longueur et les tokens ; un même prompt envoyé à cinq modèles n'est écrit qu'une fois.
+# Les fichiers ne sont jamais modifiés : écriture dans un fichier temporaire puis renommage.
+
+CODECS = {
+    "zst": (
+        lambda data: zstandard.ZstdCompressor(level=10).compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+    ),
+    "gz": (
+        lambda data: gzip.compress(data, compresslevel=6, mtime=0),
+        gzip.decompress,
+    ),
+}
+
+
+def content_hash(text):
+    """Empreinte SHA-256 (hexadécimale) d'un texte, clé de son blob."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class BlobStore:
+    """
+    Blobs de texte compressés et dédupliqués, adressés par content_hash.
+    Les derniers textes lus ou écrits restent en mémoire (LRU de cache_entries éléments).
+    """
+
+    def __init__(self, root=BLOB_STORE_DIR, compression=BLOB_COMPRESSION, cache_entries=BLOB_CACHE_ENTRIES):
+        self.root = Path(root)
+        if compression == "auto":
+            compression = "zst" if zstandard is not None else "gz"
+        if compression == "zst" and zstandard is None:
+            print("Blob store : zstandard n'est pas installé, compression gzip utilisée.")
+            compression = "gz"
+        if compression not in CODECS:
+            raise ValueError(f"Compression {compression} not supported.")
+        self.codec = compression
+        self.cache_entries = cache_entries
+        self._cache = OrderedDict()  # hash -> texte
+        self._lock = threading.Lock()
+
+    def _path(self, key, codec):
+        return self.root / key[:2] / f"{key}.{codec}"
+
+    def _remember(self, key, text):
+        with self._lock:
+            self._cache[key] = text
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+
+    def put(self, text):
+        """Range `text` (s'il n'est pas déjà présent) et renvoie son hash."""
+        key = content_hash(text)
+        if key in self._cache or self.exists(key):
+            self._remember(key, text)
+            return key
+
+        path = self._path(key, self.codec)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(CODECS[self.codec][0](text.encode("utf-8")))
+        # Deux écrivains du même contenu produisent le même fichier : le dernier renommage l'emporte sans dommage
+        os.replace(tmp, path)
+        self._remember(key, text)
+        return key
+
+    def exists(self, key):
+        return any(self._path(key, codec).exists() for codec in CODECS)
+
+    def get(self, key):
+        """Texte du blob `key`, None s'il est introuvable."""
+        with self._lock:
+            text = self._cache.get(key)
+            if text is not None:
+                self._cache.move_to_end(key)
+                return text
+
+        for codec, (_, decompress) in CODECS.items():
+            path = self._path(key, codec)
+            if not path.exists():
+                continue
+            if codec == "zst" and zstandard is None:
+                print(f"Blob store : {path} est compressé en zstd mais zstandard n'est pas installé.")
+                return None
+            text = decompress(path.read_bytes()).decode("utf-8")
+            self._remember(key, text)
+            return text
+        return None
+
+
+_BLOB_STORE = None
+_BLOB_STORE_LOCK = threading.Lock()
+
+
+def get_blob_store():
+    """Blob store partagé par tout le process."""
+    global _BLOB_STORE
+    if _BLOB_STORE is None:
+        with _BLOB_STORE_LOCK:
+            if _BLOB_STORE is None:
+                _BLOB_STORE = BlobStore()
+    return _BLOB_STORE
+
+
+def store_text(text):
+    """Range `text` dans le blob store partagé ; renvoie {"hash", "length"} (None pour un texte absent)."""
+    if not isinstance(text, str):
+        return {"hash": None, "length": None}
+    return {"hash": get_blob_store().put(text), "length": len(text)}
+
+
+def load_text(key):
+    """Texte rangé sous `key` dans le blob store partagé (None si key est None ou introuvable)."""
+    return get_blob_store().get(key) if key else None
@@ -0,0 +1,104 @@
+import atexit
+import threading
+
+import httpx
+from openai import OpenAI, DefaultHttpxClient
+from google import genai
+from google.genai import types as genai_types
+from groq import Groq, DefaultHttpxClient as GroqDefaultHttpxClient
+
+from .config import HTTP_POOL_MAXSIZE, HTTP_KEEPALIVE_EXPIRY, HTTP_TIMEOUT
+from .timing import TracingTransport
+
+# Registre process-wide : un client (et donc un pool de connexions keep-alive) par (provider, clé API).
+# Les handshakes TCP/TLS ne sont payés qu'au premier appel, et plus dans chaque tdev mesuré.
+# Tous passent par TracingTransport, qui alimente la décomposition de latence de backend.timing.
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def _httpx_limits():
+    return httpx.Limits(
+        max_connections=HTTP_POOL_MAXSIZE,
+        max_keepalive_connections=HTTP_POOL_MAXSIZE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def _transport():
+    # Avec un transport explicite, httpx ignore l'argument limits du client : on le passe au transport
+    return TracingTransport(limits=_httpx_limits())
+
+
+def _build_openai(api_key):
+    # max_retries=0 : les nouveaux essais sont gérés par backend.rate_limit, pas par le SDK
+    return OpenAI(api_key=api_key, max_retries=0,
+                  http_client=DefaultHttpxClient(transport=_transport(), timeout=HTTP_TIMEOUT))
+
+
+def _build_groq(api_key):
+    return Groq(api_key=api_key, max_retries=0,
+                http_client=GroqDefaultHttpxClient(transport=_transport(), timeout=HTTP_TIMEOUT))
+
+
+def _build_gemini(api_key):
+    http_client = httpx.Client(transport=_transport(), timeout=HTTP_TIMEOUT)
+    return genai.Client(api_key=api_key, http_options=genai_types.HttpOptions(httpx_client=http_client))
+
+
+def _build_hf(api_key):
+    # Client httpx (et non plus requests.Session) pour profiter des mêmes événements de trace
+    return httpx.Client(
+        transport=_transport(),
+        timeout=HTTP_TIMEOUT,
+        headers={
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        },
+    )
+
+
+_BUILDERS = {
+    "openai": _build_openai,
+    "gemini": _build_gemini,
+    "groq": _build_groq,
+    "hf": _build_hf,
+    "mock": _build_hf,  # même protocole que le routeur HF
+}
+
+
+def get_client(provider, api_key):
+    """
+    Renvoie le client partagé pour (provider, api_key), en le créant au premier appel.
+    Les clients renvoyés sont thread-safe et réutilisent leurs connexions.
+    """
+    key = (provider, api_key)
+    client = _CLIENTS.get(key)
+    if client is not None:
+        return client
+
+    with _CLIENTS_LOCK:
+        # Double vérification : un autre thread a pu créer le client entre-temps
+        client = _CLIENTS.get(key)
+        if client is None:
+            if provider not in _BUILDERS:
+                raise ValueError(f"Provider {provider} not supported.")
+            client = _BUILDERS[provider](api_key)
+            _CLIENTS[key] = client
+        return client
+
+
+def close_clients():
+    """Ferme proprement tous les clients (et leurs pools de connexions)."""
+    with _CLIENTS_LOCK:
+        for client in _CLIENTS.values():
+            try:
+                close = getattr(client, "close", None)
+                if close is not None:
+                    close()
+            except Exception as e:
+                print(f"Erreur lors de la fermeture d'un client : {e}")
+        _CLIENTS.clear()
+
+
+atexit.register(close_clients)
@@ -1,27 +1,370 @@
-from .config import HARDWARE_PROFILES, PUE, CARBON_INTENSITY, TOTAL_HARDWARE_CO2, LIFETIME_HOURS
+from functools import lru_cache
 
-def compute_carbon(model_name, prompt, response, tdev):
+import numpy as np
+import pandas as pd
+
+from .config import (
+    HARDWARE_PROFILES,
+    PUE,
+    CARBON_INTENSITY,
+    HOST_FABRICATION_CO2,
+    LIFETIME_HOURS,
+    CHIP_SPECS,
+    DEFAULT_CHIP,
+)
+from .grid_intensity import intensity_at, intensity_at_many
+from .tokens import estimate_tokens
+
+# Moteurs d'estimation disponibles (voir compute_carbon)
+ENGINES = {
+    "time": "Temps mesuré",
+    "flops": "FLOPs (LLMCarbon)",
+}
+
+# Attribution de l'énergie du matériel dans le moteur temps (voir batching_share)
+ATTRIBUTION_MODES = {
+    "whole": "Pod entier",
+    "batched": "Partagé entre requêtes (batching)",
+}
+
+DEFAULT_PROFILE = {"device_count": 1, "device_power_kw": 0.5, "chip_type": "H100"}
+
+# Sans information de batching, une requête occupe seule le matériel à pleine puissance (= "whole")
+DEFAULT_BATCHING = {"concurrent_sequences": 1, "max_batch": 1, "idle_power_fraction": 1.0}
+
+def embodied_bill_of_materials(model_name):
+    """
+    Nomenclature carbone (kg CO2e) du matériel alloué à un modèle : device_count puces du type du profil
+    (CHIP_SPECS[...]["embodied_kg"]) plus la part des serveurs hôtes qui les portent (CPU, DRAM, SSD),
+    soit device_count / chips_per_server serveurs.
+    """
+    profile = HARDWARE_PROFILES.get(model_name, DEFAULT_PROFILE)
+    chip_type = profile.get("chip_type") if profile.get("chip_type") in CHIP_SPECS else DEFAULT_CHIP
+    chip = CHIP_SPECS[chip_type]
+    servers = profile["device_count"] / chip["chips_per_server"]
+    chips_kg = profile["device_count"] * chip["embodied_kg"]
+    host_kg = servers * HOST_FABRICATION_CO2
+    return {
+        "chip_type": chip_type,
+        "device_count": profile["device_count"],
+        "chip_kg": chip["embodied_kg"],
+        "chips_kg": chips_kg,
+        "servers": servers,
+        "host_kg": host_kg,
+        "total_kg": chips_kg + host_kg,
+    }
+
+def _amortized_g_per_second(model_name):
+    return embodied_bill_of_materials(model_name)["total_kg"] / LIFETIME_HOURS / 3600 * 1000
+
+# Fabrication amortie sur la durée de vie du matériel, en gCO2e par seconde d'usage de tout le matériel
+# alloué au modèle : calculée une fois à l'import, le calcul par requête n'est plus qu'une multiplication.
+EMBODIED_G_PER_SECOND = {model: _amortized_g_per_second(model) for model in HARDWARE_PROFILES}
+DEFAULT_EMBODIED_G_PER_SECOND = _amortized_g_per_second(None)
+
+def embodied_g_per_second(model_name):
+    return EMBODIED_G_PER_SECOND.get(model_name, DEFAULT_EMBODIED_G_PER_SECOND)
+
+def billable_seconds(tdev, timings=None):
+    """
+    Durée facturée comme temps de calcul GPU.
+
+    On ne retient que la fenêtre côté serveur mesurée par backend.timing (timings["server"]) :
+    requête envoyée -> premier octet pour une réponse classique, fenêtre de génération
+    (premier -> dernier morceau) en streaming. La connexion TCP/TLS, l'envoi de la requête et
+    le téléchargement de la réponse ne font pas tourner les accélérateurs pour cette requête.
+    Stream d'un seul morceau sans trace réseau : requête envoyée -> unique morceau (à défaut de date d'envoi,
+    depuis le début de l'essai, connexion et TLS déduits). Sans mesure détaillée, c'est le temps total tdev.
+    """
+    if timings:
+        if timings.get("server") is not None:
+            return timings["server"]
+        chunk_times = timings.get("chunk_times") or []
+        if len(chunk_times) >= 2:
+            return timings["generation"]
+        if chunk_times:
+            sent = timings.get("request_sent")
+            if sent is None:
+                sent = (timings.get("connect") or 0.0) + (timings.get("tls") or 0.0)
+            return max(chunk_times[0] - sent, 0.0)
+    return tdev
+
+def batching_share(model_name, concurrent_sequences=None):
+    """
+    Part du pod attribuée à une requête quand le provider sert plusieurs séquences en même temps.
+
+      charge           u = séquences simultanées / taille de batch max  (plafonnée à 1)
+      puissance        P(u) = P_max x (idle + (1 - idle) x u^power_exponent)   (courbe d'utilisation, linéaire par défaut)
+      part d'énergie   P(u) / P_max / séquences simultanées  -> appliquée à l'empreinte opérationnelle
+      part de temps    1 / séquences simultanées              -> appliquée à l'amortissement du matériel
+
+    La consommation à vide est répartie entre les requêtes servies, comme le reste.
+    concurrent_sequences remplace la valeur du profil (scalaire ou tableau numpy, pour le Monte Carlo).
+    """
+    batching = HARDWARE_PROFILES.get(model_name, DEFAULT_PROFILE).get("batching", DEFAULT_BATCHING)
+    if concurrent_sequences is None:
+        concurrent_sequences = batching["concurrent_sequences"]
+    concurrent_sequences = np.maximum(concurrent_sequences, 1)
+
+    idle = batching["idle_power_fraction"]
+    utilization = np.minimum(concurrent_sequences / batching["max_batch"], 1.0)
+    power_fraction = idle + (1 - idle) * utilization ** batching.get("power_exponent", 1.0)
+    return {
+        "concurrent_sequences": concurrent_sequences,
+        "max_batch": batching["max_batch"],
+        "idle_power_fraction": idle,
+        "utilization": utilization,
+        "power_fraction": power_fraction,
+        "energy_factor": power_fraction / concurrent_sequences,
+        "time_factor": 1 / concurrent_sequences,
+    }
+
+def call_tokens(prompt, response, usage=None):
+    """(tokens d'entrée, tokens de sortie) : compteurs du provider, sinon estimation ~4 caractères/token."""
+    usage = usage or {}
+    prompt_tokens = usage.get("prompt_tokens")
+    completion_tokens = usage.get("completion_tokens")
+    if prompt_tokens is None:
+        prompt_tokens = estimate_tokens(prompt or "")
+    if completion_tokens is None:
+        completion_tokens = estimate_tokens(response if isinstance(response, str) else "")
+    return prompt_tokens, completion_tokens
+
+def flops_footprint(model_name, prompt_tokens, completion_tokens, timestamp=None):
+    """
+    Moteur FLOPs, d'après LLMCarbon : indépendant de la latence réseau et de la charge du provider.
+
+      FLOPs       = 2 x paramètres actifs x (tokens d'entrée + tokens de sortie)   (une passe avant par token)
+      temps puce  = FLOPs / (débit crête x taux d'utilisation)
+      énergie     = temps puce x puissance d'une puce x PUE
+      matériel    = (temps puce / nb de puces) x fabrication amortie du matériel alloué (embodied_g_per_second)
+
+    Renvoie le détail {"flops", "active_params_b", "device_seconds", "energy_kwh", "operational",
+    "embodied", "total"} (émissions en gCO2e), ou None si le nombre de paramètres du modèle est inconnu.
+    timestamp : instant de l'appel, pour l'intensité carbone horaire du réseau (voir backend.grid_intensity).
+    """
+    profile = HARDWARE_PROFILES.get(model_name, DEFAULT_PROFILE)
+    active_params_b = profile.get("active_params_b") or profile.get("params_b")
+    if not active_params_b:
+        return None
+
+    chip = CHIP_SPECS.get(profile.get("chip_type"), CHIP_SPECS[DEFAULT_CHIP])
+    flops = 2 * active_params_b * 1e9 * (prompt_tokens + completion_tokens)
+    device_seconds = flops / (chip["peak_tflops"] * 1e12 * chip["utilization"])
+
+    energy_kwh = device_seconds / 3600 * profile["device_power_kw"] * PUE
+    operational = energy_kwh * intensity_at(profile.get("country", "default"), timestamp)
+
+    allocation_seconds = device_seconds / profile["device_count"]
+    embodied = allocation_seconds * embodied_g_per_second(model_name) / 1000
+
+    return {
+        "flops": flops,
+        "active_params_b": active_params_b,
+        "device_seconds": device_seconds,
+        "energy_kwh": energy_kwh,
+        "operational": operational * 1000,
+        "embodied": embodied * 1000,
+        "total": (operational + embodied) * 1000,
+    }
+
+def compute_carbon_flops(model_name, prompt, response, usage=None, cache_hit=False, timestamp=None):
+    """Empreinte (gCO2e) selon le moteur FLOPs, ou None si le modèle n'a pas de nombre de paramètres."""
+    if cache_hit:
+        return 0.0
+    footprint = flops_footprint(model_name, *call_tokens(prompt, response, usage), timestamp=timestamp)
+    return footprint["total"] if footprint else None
+
+def compute_carbon(model_name, prompt, response, tdev, timings=None, cache_hit=False, engine="time", usage=None,
+                   timestamp=None, attribution="whole"):
     """
-    Stub pour calculer l'empreinte carbone.
-    Remplace par ta vraie fonction.
+    Empreinte carbone d'un appel, en gCO2e.
+
+    engine : "time" (durée de calcul mesurée x puissance du matériel) ou "flops" (voir flops_footprint).
+    Le moteur FLOPs retombe sur le moteur temps quand le nombre de paramètres du modèle est inconnu.
+    timings : décomposition de la latence de l'appel (voir LLMResult / LLMStream), optionnelle.
+    cache_hit : réponse servie par le cache local, aucun accélérateur n'a tourné -> 0 gCO2e.
+    usage : compteurs de tokens renvoyés par le provider (moteur FLOPs).
+    timestamp : instant de l'appel (epoch, datetime ou ISO) ; l'intensité carbone est alors celle du réseau
+    à cette heure-là (backend.grid_intensity), sinon la moyenne annuelle de CARBON_INTENSITY.
+    attribution (moteur temps) : "whole", la requête paie tout le pod pendant sa durée, ou "batched",
+    seulement sa part parmi les séquences servies en même temps (voir batching_share).
+    Le moteur FLOPs compte déjà le calcul propre à la requête et n'est pas concerné.
     """
+    if cache_hit:
+        return 0.0
+
+    if engine == "flops":
+        carbon = compute_carbon_flops(model_name, prompt, response, usage=usage, timestamp=timestamp)
+        if carbon is not None:
+            return carbon
 
     # Si modèle inconnu
-    profile = HARDWARE_PROFILES.get(model_name, {
-        "device_count": 1, "device_power_kw": 0.5, "chip_type": "H100"
-    })
+    profile = HARDWARE_PROFILES.get(model_name, DEFAULT_PROFILE)
 
     country = profile.get("country", "default")
 
     P = profile["device_count"] * profile["device_power_kw"]  # Puissance totale (kW)
 
-    tdev_h = tdev / 3600  # conversion secondes -> heures
+    tdev_s = billable_seconds(tdev, timings)
+    tdev_h = tdev_s / 3600  # conversion secondes -> heures
 
     # Calcul de l'empreinte carbone
-    operational_carbon = P * PUE * CARBON_INTENSITY[country] * tdev_h
+    operational_carbon = P * PUE * intensity_at(country, timestamp) * tdev_h
 
-    hardware_carbon = (tdev_h / LIFETIME_HOURS) * TOTAL_HARDWARE_CO2
+    hardware_carbon = tdev_s * embodied_g_per_second(model_name) / 1000  # Fabrication amortie (kg)
+
+    if attribution == "batched":
+        share = batching_share(model_name)
+        operational_carbon *= share["energy_factor"]
+        hardware_carbon *= share["time_factor"]
 
     total_carbon = (operational_carbon + hardware_carbon) * 1000 # Conversion en grammes
 
-    return total_carbon
\ No newline at end of file
+    return total_carbon
+
+def tokens_per_second(completion_tokens, tdev, timings=None):
+    """Débit de génération : tokens de complétion par seconde de calcul facturée (None sans compteur)."""
+    seconds = billable_seconds(tdev, timings)
+    if not completion_tokens or not seconds:
+        return None
+    return completion_tokens / seconds
+
+def carbon_per_1k_tokens(carbon, prompt_tokens, completion_tokens):
+    """gCO2e pour 1000 tokens traités (prompt + complétion), None si le provider n'a pas donné de compteurs."""
+    total_tokens = (prompt_tokens or 0) + (completion_tokens or 0)
+    if not total_tokens:
+        return None
+    return carbon / total_tokens * 1000
+
+
+# -----------------------------
+# CALCUL VECTORISÉ (historiques complets)
+# -----------------------------
+
+@lru_cache(maxsize=32)
+def _coefficient_table(pue, carbon_intensity_items):
+    """
+    Coefficients par modèle, précalculés une fois pour un couple (PUE, intensités carbone).
+    La dernière ligne correspond au profil par défaut (modèles inconnus).
+    """
+    carbon_intensity = dict(carbon_intensity_items)
+    models = list(HARDWARE_PROFILES)
+    profiles = [HARDWARE_PROFILES[model] for model in models] + [DEFAULT_PROFILE]
+    regions = list(carbon_intensity)
+
+    device_count = np.array([p["device_count"] for p in profiles], dtype=float)
+    device_power_kw = np.array([p["device_power_kw"] for p in profiles], dtype=float)
+    shares = [batching_share(model) for model in models] + [batching_share(None)]
+
+    # Moteur FLOPs : secondes de puce par token (NaN si le nombre de paramètres est inconnu)
+    chip_seconds_per_token = []
+    for profile in profiles:
+        active_params_b = profile.get("active_params_b") or profile.get("params_b")
+        chip = CHIP_SPECS.get(profile.get("chip_type"), CHIP_SPECS[DEFAULT_CHIP])
+        chip_seconds_per_token.append(
+            2 * active_params_b * 1e9 / (chip["peak_tflops"] * 1e12 * chip["utilization"])
+            if active_params_b else np.nan
+        )
+
+    return {
+        "models": pd.Index(models),
+        "regions": pd.Index(regions),
+        "region_intensity": np.array(
+            [carbon_intensity[r] for r in regions] + [carbon_intensity.get("default", CARBON_INTENSITY["default"])]
+        ),
+        # Pays absent des intensités fournies (ex : carbon_intensity={"default": 0.3}) : -1, l'intensité "default"
+        "model_region": np.array([
+            regions.index(p.get("country", "default")) if p.get("country", "default") in carbon_intensity else -1
+            for p in profiles
+        ]),
+        "model_region_name": np.array([p.get("country", "default") for p in profiles], dtype=object),
+        # gCO2e opérationnels par seconde de calcul et par kgCO2e/kWh d'intensité
+        "operational_g_per_s": device_count * device_power_kw * pue / 3600 * 1000,
+        "chip_operational_g_per_s": device_power_kw * pue / 3600 * 1000,
+        "chip_seconds_per_token": np.array(chip_seconds_per_token),
+        "device_count": device_count,
+        # Attribution "batched" du moteur temps
+        "batched_energy_factor": np.array([share["energy_factor"] for share in shares], dtype=float),
+        "batched_time_factor": np.array([share["time_factor"] for share in shares], dtype=float),
+        # gCO2e de fabrication amortis par seconde d'allocation du matériel
+        "embodied_g_per_s": np.array([embodied_g_per_second(model) for model in models] + [DEFAULT_EMBODIED_G_PER_SECOND]),
+    }
+
+def _column(data, *names):
+    for name in names:
+        if name in data:
+            return data[name]
+    return None
+
+def compute_carbon_batch(model, tdev=None, tokens=None, region=None, timestamp=None, cache_hit=None,
+                         engine="time", pue=None, carbon_intensity=None, attribution="whole"):
+    """
+    Version vectorisée de compute_carbon, pour re-calculer un historique entier d'un coup.
+
+    model : tableau de noms de modèles, ou DataFrame avec les colonnes model, tdev (ou tdev_seconds),
+            tokens, region, timestamp, cache_hit (toutes optionnelles sauf model).
+    tdev : durée facturable en secondes (voir billable_seconds) ; tokens : tokens traités (entrée + sortie).
+    region : code d'intensité carbone par ligne (défaut : pays du profil du modèle).
+    timestamp : instant de chaque appel ; avec un jeu de données horaire (backend.grid_intensity), l'intensité
+                est celle du réseau à cet instant. Recopié dans le résultat, pour agréger par période.
+    pue / carbon_intensity : permettent de rejouer l'historique avec d'autres hypothèses que config
+                (des intensités explicites remplacent alors les données horaires).
+    attribution : "whole" ou "batched" pour le moteur temps, comme compute_carbon.
+
+    Renvoie un DataFrame (operational, embodied, total en gCO2e), aligné sur les lignes d'entrée.
+    Comme compute_carbon, le moteur FLOPs retombe sur le moteur temps pour les modèles sans nombre de paramètres.
+    """
+    if isinstance(model, pd.DataFrame):
+        frame = model
+        model = frame["model"]
+        tdev = _column(frame, "tdev", "tdev_seconds") if tdev is None else tdev
+        tokens = _column(frame, "tokens") if tokens is None else tokens
+        region = _column(frame, "region") if region is None else region
+        timestamp = _column(frame, "timestamp") if timestamp is None else timestamp
+        cache_hit = _column(frame, "cache_hit") if cache_hit is None else cache_hit
+
+    pue = PUE if pue is None else pue
+    hourly = timestamp is not None and carbon_intensity is None
+    carbon_intensity = CARBON_INTENSITY if carbon_intensity is None else carbon_intensity
+    table = _coefficient_table(pue, tuple(sorted(carbon_intensity.items())))
+
+    model = np.asarray(model, dtype=object)
+    n = len(model)
+    # Indices dans la table ; -1 (modèle inconnu) désigne la dernière ligne, le profil par défaut
+    model_idx = table["models"].get_indexer(model)
+    if hourly:
+        regions = table["model_region_name"][model_idx] if region is None else region
+        intensity = intensity_at_many(regions, timestamp, static=carbon_intensity)
+    else:
+        if region is None:
+            region_idx = table["model_region"][model_idx]
+        else:
+            # Région inconnue : -1 désigne la dernière valeur, l'intensité "default"
+            region_idx = table["regions"].get_indexer(np.asarray(region, dtype=object))
+        intensity = table["region_intensity"][region_idx]
+
+    seconds = np.zeros(n) if tdev is None else np.asarray(tdev, dtype=float)
+    operational = table["operational_g_per_s"][model_idx] * intensity * seconds
+    embodied = table["embodied_g_per_s"][model_idx] * seconds
+    if attribution == "batched":
+        operational = operational * table["batched_energy_factor"][model_idx]
+        embodied = embodied * table["batched_time_factor"][model_idx]
+
+    if engine == "flops" and tokens is not None:
+        chip_seconds = np.asarray(tokens, dtype=float) * table["chip_seconds_per_token"][model_idx]
+        has_flops = ~np.isnan(chip_seconds)
+        operational = np.where(has_flops, table["chip_operational_g_per_s"][model_idx] * intensity * chip_seconds, operational)
+        embodied = np.where(has_flops, table["embodied_g_per_s"][model_idx] * chip_seconds / table["device_count"][model_idx], embodied)
+
+    if cache_hit is not None:
+        # Historique mêlant des entrées avec et sans cache_hit : les valeurs manquantes (NaN, None) ne sont pas des hits
+        served = ~pd.Series(cache_hit, dtype="boolean").fillna(False).to_numpy(dtype=bool)
+        operational = operational * served
+        embodied = embodied * served
+
+    result = pd.DataFrame({"operational": operational, "embodied": embodied, "total": operational + embodied})
+    if timestamp is not None:
+        # Pas de np.asarray : une colonne datetime avec fuseau deviendrait un tableau d'objets Timestamp
+        result.insert(0, "timestamp", pd.Series(timestamp).array)
+    return result
@@ -9,6 +9,7 @@ API_KEYS = {
     "gemini": os.getenv("GEMINI_API_KEY"),
     "groq": os.getenv("GROQ_API_KEY"),
     "hf": os.getenv("HUGGINGFACE_API_KEY"),
+    "mock": os.getenv("MOCK_API_KEY", "mock"),  # serveur local backend/mock_server.py, la clé est ignorée
 }
 
 # Models lists
@@ -17,8 +18,79 @@ MODELS_LIST = {
     "gemini": os.getenv("GEMINI_MODEL", "").split(","),
     "groq": os.getenv("GROQ_MODEL", "").split(","),
     "hf": os.getenv("HUGGINGFACE_MODEL", "").split(","),
+    "mock": os.getenv("MOCK_MODEL", "").split(","),  # ex : mock-llm (vide = provider masqué)
 }
 
+# Adresse du faux provider local (python -m backend.mock_server)
+MOCK_API_URL = os.getenv("MOCK_API_URL", "http://127.0.0.1:8008/v1/chat/completions")
+
+# Pools de connexions HTTP partagés par les clients des providers (voir backend/clients.py)
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))          # connexions keep-alive max par client
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))  # secondes avant fermeture d'une connexion inactive
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+
+# Nombre max d'appels simultanés par provider lors d'un fan-out asynchrone (voir backend/llm_async.py)
+_DEFAULT_CONCURRENCY = int(os.getenv("PROVIDER_MAX_CONCURRENCY", "4"))
+PROVIDER_CONCURRENCY = {
+    "openai": int(os.getenv("OPENAI_MAX_CONCURRENCY", _DEFAULT_CONCURRENCY)),
+    "gemini": int(os.getenv("GEMINI_MAX_CONCURRENCY", _DEFAULT_CONCURRENCY)),
+    "groq": int(os.getenv("GROQ_MAX_CONCURRENCY", _DEFAULT_CONCURRENCY)),
+    "hf": int(os.getenv("HUGGINGFACE_MAX_CONCURRENCY", _DEFAULT_CONCURRENCY)),
+    "mock": int(os.getenv("MOCK_MAX_CONCURRENCY", _DEFAULT_CONCURRENCY)),
+}
+
+# Limites de débit par provider (requêtes et tokens par minute, voir backend/rate_limit.py).
+# Valeurs par défaut prudentes, proches des quotas "free tier" ; 0 désactive la limite.
+def _limit(name, default):
+    value = int(os.getenv(name, str(default)))
+    return value or None
+
+RATE_LIMITS = {
+    "openai": {"rpm": _limit("OPENAI_RPM", 500), "tpm": _limit("OPENAI_TPM", 200000)},
+    "gemini": {"rpm": _limit("GEMINI_RPM", 15), "tpm": _limit("GEMINI_TPM", 1000000)},
+    "groq": {"rpm": _limit("GROQ_RPM", 30), "tpm": _limit("GROQ_TPM", 12000)},
+    "hf": {"rpm": _limit("HUGGINGFACE_RPM", 60), "tpm": _limit("HUGGINGFACE_TPM", 0)},
+    "mock": {"rpm": _limit("MOCK_RPM", 0), "tpm": _limit("MOCK_TPM", 0)},
+}
+
+# Nouveaux essais sur 429 / 5xx / timeouts : backoff exponentiel avec jitter, Retry-After respecté
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "5"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "1"))   # secondes
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "60"))    # secondes
+
+# Cache des réponses LLM (voir backend/llm_cache.py)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "data/llm_cache.sqlite")
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))  # une semaine
+LLM_CACHE_MAX_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MAX_MEMORY_ENTRIES", "256"))
+LLM_CACHE_MAX_DISK_ENTRIES = int(os.getenv("LLM_CACHE_MAX_DISK_ENTRIES", "10000"))
+
+# Historique des appels LLM et des exécutions CodeCarbon (voir get_session_store dans backend/utils.py) :
+# base SQLite indexée ("sqlite") ou journaux JSONL append-only ("jsonl", voir JsonlStore)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+STORAGE_PATH = os.getenv("STORAGE_PATH", "data/carbon_history.sqlite")
+SESSION_LOG_PATH = os.getenv("SESSION_LOG_PATH", "data/session_data.jsonl")
+RUNS_LOG_PATH = os.getenv("RUNS_LOG_PATH", "data/codecarbon_runs.jsonl")
+PROMPTS_LOG_PATH = os.getenv("PROMPTS_LOG_PATH", "data/prompts.jsonl")
+SKETCHES_PATH = os.getenv("SKETCHES_PATH", "data/sketches.jsonl")  # journal des sketches de quantiles (backend jsonl)
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "10"))  # appels par page dans l'historique
+# Rétention : au démarrage, les sessions sans activité depuis plus de N jours sont purgées (0 : jamais)
+HISTORY_RETENTION_DAYS = float(os.getenv("HISTORY_RETENTION_DAYS", "30"))
+
+# Prompts et réponses : blobs compressés adressés par leur hash (voir backend/blob_store.py)
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", "data/blobs")
+BLOB_COMPRESSION = os.getenv("BLOB_COMPRESSION", "auto")  # auto (zstd si installé, sinon gzip), zst ou gz
+BLOB_CACHE_ENTRIES = int(os.getenv("BLOB_CACHE_ENTRIES", "256"))  # textes gardés en mémoire
+
+# Graphiques de session déjà construits, par (graphique, version des données, thème) (voir backend/visualisation.py)
+FIGURE_CACHE_ENTRIES = int(os.getenv("FIGURE_CACHE_ENTRIES", "64"))
+# Courbes par appel : rendu WebGL (Scattergl) au-delà de ce nombre de points...
+PLOT_WEBGL_THRESHOLD = int(os.getenv("PLOT_WEBGL_THRESHOLD", "1000"))
+# ... et réduction LTTB à ce nombre de points (avec enveloppe min / max par paquet)
+PLOT_MAX_POINTS = int(os.getenv("PLOT_MAX_POINTS", "2000"))
+JSONL_FSYNC_EVERY = int(os.getenv("JSONL_FSYNC_EVERY", "20"))             # fsync après ce nombre d'ajouts...
+JSONL_FSYNC_INTERVAL = float(os.getenv("JSONL_FSYNC_INTERVAL", "2"))      # ... ou après ce délai (secondes)
+
 # Variables globales pour compute_LLM_footprint.py
 
 HARDWARE_PROFILES = {
@@ -27,7 +99,18 @@ HARDWARE_PROFILES = {
         "device_power_kw": 0.185,     # ~185W par puce LPU (hors refroidissement rack)
         "chip_type": "Groq LPU Gen1", # Language Processing Unit
         "notes": "Architecture massivement parallèle sur SRAM pour latence ultra-faible.",
-        "country": "us"
+        "country": "us",
+        "params_b": 70.6,             # Modèle dense : tous les paramètres sont actifs
+        "batching": {
+            "concurrent_sequences": 100,   # Séquences servies en même temps par le pod (charge typique)
+            "max_batch": 200,              # Séquences simultanées à pleine charge
+            "idle_power_fraction": 0.4,    # Puissance à vide / puissance max (SRAM et réseau toujours alimentés)
+        },
+        "uncertainty": {
+            "device_count": ("triangular", 288, 576, 720),           # Taille du pod réellement allouée
+            "device_power_kw": ("triangular", 0.15, 0.185, 0.215),
+            "concurrent_sequences": ("triangular", 25, 100, 200),
+        },
     },
 
     "llama-3.3-70b": {
@@ -35,7 +118,18 @@ HARDWARE_PROFILES = {
         "device_power_kw": 0.185,
         "chip_type": "Groq LPU Gen1",
         "notes": "Même configuration que le modèle 'versatile', optimisé pour inférence batch.",
-        "country": "us"
+        "country": "us",
+        "params_b": 70.6,
+        "batching": {
+            "concurrent_sequences": 100,
+            "max_batch": 200,
+            "idle_power_fraction": 0.4,
+        },
+        "uncertainty": {
+            "device_count": ("triangular", 288, 576, 720),
+            "device_power_kw": ("triangular", 0.15, 0.185, 0.215),
+            "concurrent_sequences": ("triangular", 25, 100, 200),
+        },
     },
 
     "gpt-3.5-turbo": {
@@ -43,7 +137,18 @@ HARDWARE_PROFILES = {
         "device_power_kw": 0.7,       # ~700W max par H100 (ou 400W si A100)
         "chip_type": "H100 NVL",      # Souvent migré sur H100 pour l'efficacité FP8
         "notes": "Configuration dense, probablement 8 GPUs servant de multiples requêtes en batch.",
-        "country": "us"
+        "country": "us",
+        "params_b": 20,               # Non publié : ordre de grandeur des estimations publiques (~20B)
+        "batching": {
+            "concurrent_sequences": 64,    # Batching continu (type vLLM) sur un noeud très sollicité
+            "max_batch": 256,
+            "idle_power_fraction": 0.2,    # ~100W à vide par H100, plus l'hôte
+        },
+        "uncertainty": {
+            "device_power_kw": ("triangular", 0.4, 0.7, 0.7),        # 400W (A100) à 700W (H100)
+            "params_b": ("lognormal", 20, 2.0),                      # Facteur 2 autour de 20B
+            "concurrent_sequences": ("triangular", 16, 64, 256),
+        },
     },
     
     "gpt-4": {
@@ -51,7 +156,20 @@ HARDWARE_PROFILES = {
         "device_power_kw": 0.7,
         "chip_type": "H100 NVL",
         "notes": "Inférence distribuée sur cluster nécessaire pour la VRAM totale.",
-        "country": "us"
+        "country": "us",
+        "params_b": 1800,             # Non publié : MoE ~1,8T paramètres selon les estimations publiques
+        "active_params_b": 280,       # ~2 experts actifs par token
+        "batching": {
+            "concurrent_sequences": 32,
+            "max_batch": 128,
+            "idle_power_fraction": 0.2,
+        },
+        "uncertainty": {
+            "device_count": ("triangular", 8, 16, 32),
+            "device_power_kw": ("triangular", 0.4, 0.7, 0.7),
+            "active_params_b": ("triangular", 200, 280, 440),
+            "concurrent_sequences": ("triangular", 8, 32, 128),
+        },
     },
 
     "gemini-2.5-flash": {
@@ -59,14 +177,37 @@ HARDWARE_PROFILES = {
         "device_power_kw": 0.25,      # ~250W par puce TPU v5e
         "chip_type": "TPU v5e",       # Tensor Processing Unit v5e (optimisé inférence)
         "notes": "Modèle optimisé pour tenir sur une petite topologie de puces.",
-        "country": "us"
+        "country": "us",
+        "params_b": None,             # Non publié : le moteur FLOPs n'est pas disponible pour ce modèle
+        "batching": {
+            "concurrent_sequences": 32,
+            "max_batch": 128,
+            "idle_power_fraction": 0.25,
+        },
+        "uncertainty": {
+            "device_count": ("triangular", 1, 4, 8),
+            "device_power_kw": ("triangular", 0.17, 0.25, 0.3),
+            "concurrent_sequences": ("triangular", 8, 32, 128),
+        },
     },
     "deepseek-ai/DeepSeek-V3.1:novita": {
         "device_count": 16,           # Nécessite ~2 noeuds H100 (ou 1 noeud H200) pour tenir en VRAM
         "device_power_kw": 0.7,       # ~700W par H100 NVL/SXM5
         "chip_type": "H100 NVL",      # Indispensable pour l'accélération FP8 (Transformer Engine)
         "notes": "Modèle 671B MoE. En FP8 (config), pèse ~671Go. Ne tient pas sur un seul noeud H100 80Go (640Go total). Requiert du parallélisme inter-noeuds (TP/EP).",
-        "country": "cn"
+        "country": "cn",
+        "params_b": 671,
+        "active_params_b": 37,        # MoE : 37B paramètres activés par token
+        "batching": {
+            "concurrent_sequences": 64,    # Gros batchs nécessaires pour rentabiliser le parallélisme d'experts
+            "max_batch": 256,
+            "idle_power_fraction": 0.2,
+        },
+        "uncertainty": {
+            "device_count": ("triangular", 8, 16, 32),               # 1 noeud H200 à 4 noeuds H100
+            "device_power_kw": ("triangular", 0.5, 0.7, 0.7),
+            "concurrent_sequences": ("triangular", 16, 64, 256),
+        },
     },
 
     "mistralai/Mistral-7B-Instruct-v0.2:featherless-ai": {
@@ -74,26 +215,157 @@ HARDWARE_PROFILES = {
         "device_power_kw": 0.35,      # ~350W (Profil A100 PCIe ou L40S)
         "chip_type": "NVIDIA A100",   # Ou L40S, souvent utilisé pour les petits modèles (7B)
         "notes": "Modèle dense 7B (15Go en BF16). Sur Featherless (serverless), une seule instance GPU charge le modèle et sert les requêtes via une file d'attente.",
-        "country": "fr"
+        "country": "fr",
+        "params_b": 7.24,
+        "batching": {
+            "concurrent_sequences": 8,     # Serverless : file d'attente partagée, batchs modestes
+            "max_batch": 32,
+            "idle_power_fraction": 0.3,
+        },
+        "uncertainty": {
+            "device_power_kw": ("triangular", 0.3, 0.35, 0.4),       # A100 PCIe (300W) à L40S (350W+)
+            "concurrent_sequences": ("triangular", 1, 8, 32),
+        },
     }
 }
 
+# Caractéristiques des puces :
+# peak_tflops = débit crête dense en BF16/FP16 par puce, utilization = part de ce débit
+# réellement atteinte en inférence (MFU), bien plus faible qu'en entraînement (décodage limité par la mémoire).
+# embodied_kg = empreinte de fabrication d'une puce avec sa mémoire (kg CO2e, ordre de grandeur d'après
+# la surface de silicium et la quantité de HBM, méthode LLMCarbon), chips_per_server = puces par serveur hôte.
+CHIP_SPECS = {
+    "Groq LPU Gen1": {"peak_tflops": 188, "utilization": 0.3, "embodied_kg": 7.0, "chips_per_server": 8},    # 14 nm, SRAM seule
+    "H100 NVL": {"peak_tflops": 835, "utilization": 0.3, "embodied_kg": 16.0, "chips_per_server": 8},        # 94 Go de HBM3
+    "H100": {"peak_tflops": 989, "utilization": 0.3, "embodied_kg": 14.652, "chips_per_server": 8},          # HGX H100, 80 Go
+    "NVIDIA A100": {"peak_tflops": 312, "utilization": 0.3, "embodied_kg": 12.0, "chips_per_server": 8},
+    "TPU v5e": {"peak_tflops": 197, "utilization": 0.3, "embodied_kg": 6.0, "chips_per_server": 8},          # 16 Go de HBM2
+}
+DEFAULT_CHIP = "H100"
+
+# Moteur d'estimation par défaut : "time" (durée mesurée x puissance) ou "flops" (tokens x paramètres actifs)
+DEFAULT_CARBON_ENGINE = os.getenv("CARBON_ENGINE", "time")
+
+# Attribution de l'énergie du moteur temps : "whole" (la requête paie tout le pod pendant sa durée)
+# ou "batched" (partagée entre les séquences servies en même temps, voir HARDWARE_PROFILES[...]["batching"])
+DEFAULT_ATTRIBUTION = os.getenv("CARBON_ATTRIBUTION", "whole")
+
 PUE = 1.1
 
+# Intensité carbone moyenne annuelle par pays (kg CO2e / kWh), source : Electricity Maps / IEA.
+# Table unique pour les calculs (CARBON_INTENSITY) et la carte de l'accueil (backend/plot.py).
+COUNTRY_CARBON_INTENSITY = {
+    "fr": {"name": "France", "iso3": "FRA", "intensity": 0.06},
+    "de": {"name": "Germany", "iso3": "DEU", "intensity": 0.42},
+    "us": {"name": "United States", "iso3": "USA", "intensity": 0.4},
+    "cn": {"name": "China", "iso3": "CHN", "intensity": 0.55},
+    "in": {"name": "India", "iso3": "IND", "intensity": 0.7},
+    "jp": {"name": "Japan", "iso3": "JPN", "intensity": 0.48},
+    "gb": {"name": "United Kingdom", "iso3": "GBR", "intensity": 0.22},
+    "ca": {"name": "Canada", "iso3": "CAN", "intensity": 0.13},
+    "au": {"name": "Australia", "iso3": "AUS", "intensity": 0.68},
+    "br": {"name": "Brazil", "iso3": "BRA", "intensity": 0.1},
+    "ru": {"name": "Russia", "iso3": "RUS", "intensity": 0.48},
+    "za": {"name": "South Africa", "iso3": "ZAF", "intensity": 0.9},
+    "no": {"name": "Norway", "iso3": "NOR", "intensity": 0.02},
+    "se": {"name": "Sweden", "iso3": "SWE", "intensity": 0.04},
+    "es": {"name": "Spain", "iso3": "ESP", "intensity": 0.18},
+    "it": {"name": "Italy", "iso3": "ITA", "intensity": 0.28},
+    "pl": {"name": "Poland", "iso3": "POL", "intensity": 0.78},
+    "nl": {"name": "Netherlands", "iso3": "NLD", "intensity": 0.39},
+    "be": {"name": "Belgium", "iso3": "BEL", "intensity": 0.18},
+    "ch": {"name": "Switzerland", "iso3": "CHE", "intensity": 0.03},
+    "at": {"name": "Austria", "iso3": "AUT", "intensity": 0.09},
+    "dk": {"name": "Denmark", "iso3": "DNK", "intensity": 0.12},
+    "fi": {"name": "Finland", "iso3": "FIN", "intensity": 0.085},
+    "pt": {"name": "Portugal", "iso3": "PRT", "intensity": 0.25},
+    "gr": {"name": "Greece", "iso3": "GRC", "intensity": 0.38},
+    "cz": {"name": "Czech Republic", "iso3": "CZE", "intensity": 0.55},
+    "hu": {"name": "Hungary", "iso3": "HUN", "intensity": 0.28},
+    "ro": {"name": "Romania", "iso3": "ROU", "intensity": 0.32},
+    "bg": {"name": "Bulgaria", "iso3": "BGR", "intensity": 0.48},
+    "sk": {"name": "Slovakia", "iso3": "SVK", "intensity": 0.12},
+    "ie": {"name": "Ireland", "iso3": "IRL", "intensity": 0.35},
+    "nz": {"name": "New Zealand", "iso3": "NZL", "intensity": 0.11},
+    "ar": {"name": "Argentina", "iso3": "ARG", "intensity": 0.38},
+    "mx": {"name": "Mexico", "iso3": "MEX", "intensity": 0.42},
+    "cl": {"name": "Chile", "iso3": "CHL", "intensity": 0.38},
+    "co": {"name": "Colombia", "iso3": "COL", "intensity": 0.18},
+    "id": {"name": "Indonesia", "iso3": "IDN", "intensity": 0.72},
+    "th": {"name": "Thailand", "iso3": "THA", "intensity": 0.48},
+    "vn": {"name": "Vietnam", "iso3": "VNM", "intensity": 0.52},
+    "my": {"name": "Malaysia", "iso3": "MYS", "intensity": 0.62},
+    "ph": {"name": "Philippines", "iso3": "PHL", "intensity": 0.68},
+    "sg": {"name": "Singapore", "iso3": "SGP", "intensity": 0.42},
+    "kr": {"name": "South Korea", "iso3": "KOR", "intensity": 0.48},
+    "tw": {"name": "Taiwan", "iso3": "TWN", "intensity": 0.52},
+    "tr": {"name": "Turkey", "iso3": "TUR", "intensity": 0.42},
+    "ua": {"name": "Ukraine", "iso3": "UKR", "intensity": 0.35},
+    "eg": {"name": "Egypt", "iso3": "EGY", "intensity": 0.48},
+    "sa": {"name": "Saudi Arabia", "iso3": "SAU", "intensity": 0.62},
+    "ae": {"name": "United Arab Emirates", "iso3": "ARE", "intensity": 0.48},
+    "il": {"name": "Israel", "iso3": "ISR", "intensity": 0.52},
+}
+
 CARBON_INTENSITY = {
     "default": 0.4,   # kg CO2e / kWh
-    "us": 0.4,
-    "fr": 0.06,
-    "cn": 0.55
+    **{code: country["intensity"] for code, country in COUNTRY_CARBON_INTENSITY.items()},
 }
 
+# Intensité carbone horaire par région (voir backend/grid_intensity.py) : jeux de données versionnés
+# construits à partir d'exports CSV (ex : Electricity Maps), dans GRID_INTENSITY_DIR/<version>/.
+# "latest" = la version la plus récente ; sans jeu de données, CARBON_INTENSITY est utilisée.
+GRID_INTENSITY_DIR = os.getenv("GRID_INTENSITY_DIR", "data/grid_intensity")
+GRID_INTENSITY_VERSION = os.getenv("GRID_INTENSITY_VERSION", "latest")
+
+# Graphiques statiques de l'accueil, sérialisés une fois en JSON (voir backend/static_figures.py) :
+#   python -m backend.static_figures build
+FIGURES_DIR = os.getenv("FIGURES_DIR", "data/figures")
+
+# Fabrication d'un serveur hôte, hors accélérateurs (voir CHIP_SPECS[...]["embodied_kg"]).
+# Chaque profil compte device_count puces et device_count / chips_per_server serveurs hôtes.
 FABRICATION_CO2 = {
     "CPU": 1.47,   # kg
     "DRAM": 102.4, # kg
     "SSD": 576.0,  # kg
-    "H100": 14.652 # kg
 }
 
-TOTAL_HARDWARE_CO2 = sum(FABRICATION_CO2.values())  # kg
+HOST_FABRICATION_CO2 = sum(FABRICATION_CO2.values())  # kg par serveur hôte
+
+LIFETIME_HOURS = 4 * 365.25 * 24  # durée de vie matérielle en heures
+
+# Incertitudes (voir backend/uncertainty.py). Chaque paramètre peut porter une distribution :
+#   ("uniform", min, max), ("triangular", min, mode, max), ("normal", moyenne, écart-type)
+#   ou ("lognormal", médiane, facteur géométrique : ~68 % des tirages entre médiane / f et médiane x f).
+# Les paramètres des modèles sont dans HARDWARE_PROFILES[...]["uncertainty"] ; sans distribution,
+# la valeur ponctuelle est utilisée telle quelle.
+PUE_UNCERTAINTY = ("triangular", 1.08, 1.1, 1.4)  # Hyperscalers (~1.1) à datacenter moyen (~1.4)
+
+CARBON_INTENSITY_UNCERTAINTY = {
+    "default": ("triangular", 0.1, 0.4, 0.7),
+    "us": ("triangular", 0.25, 0.4, 0.5),    # Forte variation entre États et selon l'heure
+    "fr": ("triangular", 0.03, 0.06, 0.1),
+    "cn": ("triangular", 0.45, 0.55, 0.65),
+}
+
+FABRICATION_CO2_UNCERTAINTY = {
+    "CPU": ("triangular", 1.0, 1.47, 2.5),
+    "DRAM": ("triangular", 60.0, 102.4, 150.0),
+    "SSD": ("triangular", 300.0, 576.0, 800.0),
+}
+
+# Fabrication d'une puce (kg CO2e), par type de puce de CHIP_SPECS
+CHIP_EMBODIED_UNCERTAINTY = {
+    "Groq LPU Gen1": ("triangular", 4.0, 7.0, 12.0),
+    "H100 NVL": ("triangular", 10.0, 16.0, 28.0),
+    "H100": ("triangular", 10.0, 14.652, 25.0),
+    "NVIDIA A100": ("triangular", 8.0, 12.0, 20.0),
+    "TPU v5e": ("triangular", 3.0, 6.0, 10.0),
+}
+
+# Taux d'utilisation des puces (moteur FLOPs), commun à toutes les puces de CHIP_SPECS
+CHIP_UTILIZATION_UNCERTAINTY = ("triangular", 0.1, 0.3, 0.5)
 
-LIFETIME_HOURS = 4 * 365.25 * 24  # durée de vie matérielle en heures
\ No newline at end of file
+# Nombre de tirages Monte Carlo (tirages précalculés une fois puis réutilisés) et graine
+MONTE_CARLO_SAMPLES = int(os.getenv("MONTE_CARLO_SAMPLES", "10000"))
+MONTE_CARLO_SEED = int(os.getenv("MONTE_CARLO_SEED", "42"))
\ No newline at end of file
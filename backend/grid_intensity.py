@@ -0,0 +1,323 @@
+import argparse
+import json
+import shutil
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .config import CARBON_INTENSITY, GRID_INTENSITY_DIR, GRID_INTENSITY_VERSION
+
+# Intensité carbone du réseau électrique heure par heure (ou plus fin), par région.
+#
+# Format sur disque, une version = un dossier :
+#   <GRID_INTENSITY_DIR>/<version>/manifest.json             version, source, régions (nb de points, période, pas)
+#   <GRID_INTENSITY_DIR>/<version>/<region>.timestamps.npy   int64, secondes epoch UTC, triées
+#   <GRID_INTENSITY_DIR>/<version>/<region>.intensity.npy    float32, kg CO2e / kWh
+# Les .npy sont ouverts en mmap : une recherche (searchsorted, O(log n)) ne lit que quelques pages.
+#
+# Construction à partir d'exports CSV horaires (ex : Electricity Maps, un fichier par zone) :
+#   python -m backend.grid_intensity build FR_2024_hourly.csv US_2024_hourly.csv
+# Sans jeu de données (ou pour une région absente), on retombe sur la valeur statique de CARBON_INTENSITY.
+# Les versions d'exemple (suffixe SAMPLE_SUFFIX) ne sont jamais choisies comme "latest" : elles ne se chargent
+# qu'en les nommant explicitement (GRID_INTENSITY_VERSION=2024-sample).
+
+WEEK_SECONDS = 7 * 24 * 3600
+SAMPLE_SUFFIX = "-sample"
+
+# Colonnes reconnues dans les CSV (format Electricity Maps, puis format générique)
+TIME_COLUMNS = ("Datetime (UTC)", "datetime", "timestamp")
+REGION_COLUMNS = ("Zone Id", "zone", "region")
+INTENSITY_COLUMNS = (  # gCO2e / kWh
+    "Carbon Intensity gCO₂eq/kWh (LCA)",
+    "Carbon Intensity gCO₂eq/kWh (direct)",
+    "carbon_intensity",
+)
+
+
+def to_epoch_seconds(timestamps):
+    """Secondes epoch UTC (int64) à partir de nombres, datetime, chaînes ISO ou datetime64 (naïf = UTC)."""
+    values = np.asarray(timestamps)
+    if values.dtype.kind in "iuf":
+        return values.astype(np.int64)
+    parsed = pd.to_datetime(pd.Series(values.ravel()), utc=True)
+    # Pas de astype("int64") : la résolution interne (s, ms, us, ns) dépend de l'entrée
+    seconds = (parsed - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)
+    return seconds.to_numpy(dtype=np.int64).reshape(values.shape)
+
+
+class GridIntensityDataset:
+    """Une version du jeu de données ; les séries de chaque région sont mappées à la demande."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.manifest = json.loads((self.path / "manifest.json").read_text(encoding="utf-8"))
+        self.version = self.manifest["version"]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def regions(self):
+        return list(self.manifest["regions"])
+
+    def _load(self, region):
+        series = self._series.get(region)
+        if series is None and region in self.manifest["regions"]:
+            with self._lock:
+                series = self._series.get(region)
+                if series is None:
+                    series = (
+                        np.load(self.path / f"{region}.timestamps.npy", mmap_mode="r"),
+                        np.load(self.path / f"{region}.intensity.npy", mmap_mode="r"),
+                    )
+                    self._series[region] = series
+        return series
+
+    def lookup(self, region, timestamps):
+        """
+        Intensité (kg CO2e / kWh) en vigueur à chaque instant (secondes epoch), NaN si la région est absente.
+
+        Après la fin des données (ex : appel d'aujourd'hui, données de l'an dernier), on recule d'un nombre
+        entier de semaines pour retomber dans la période couverte : l'heure et le jour de la semaine sont
+        conservés, ce qui garde le profil jour / nuit et semaine / week-end.
+        """
+        t = np.atleast_1d(np.asarray(timestamps, dtype=np.int64))
+        series = self._load(region)
+        if series is None:
+            return np.full(t.shape, np.nan)
+
+        stamps, values = series
+        end = int(stamps[-1]) + self.manifest["regions"][region]["step_seconds"]
+        weeks_late = np.where(t >= end, (t - end) // WEEK_SECONDS + 1, 0)
+        t = t - weeks_late * WEEK_SECONDS
+
+        index = np.searchsorted(stamps, t, side="right") - 1
+        found = index >= 0
+        return np.where(found, values[np.maximum(index, 0)], np.nan)
+
+
+_DATASETS = {}
+_DATASETS_LOCK = threading.Lock()
+
+
+def available_versions(root=GRID_INTENSITY_DIR):
+    """Versions présentes sur disque, de la plus ancienne à la plus récente."""
+    root = Path(root)
+    if not root.is_dir():
+        return []
+    return sorted(p.name for p in root.iterdir() if (p / "manifest.json").is_file())
+
+
+def get_dataset(version=GRID_INTENSITY_VERSION, root=GRID_INTENSITY_DIR):
+    """Jeu de données `version` ("latest" = le plus récent), ouvert une seule fois par process ; None s'il n'y en a pas."""
+    if version == "latest":
+        versions = [v for v in available_versions(root) if not v.endswith(SAMPLE_SUFFIX)]
+        if not versions:
+            return None
+        version = versions[-1]
+
+    key = (str(root), version)
+    dataset = _DATASETS.get(key)
+    if dataset is None:
+        with _DATASETS_LOCK:
+            dataset = _DATASETS.get(key)
+            if dataset is None:
+                path = Path(root) / version
+                if not (path / "manifest.json").is_file():
+                    print(f"Intensité carbone : version {version} introuvable dans {root}, valeurs statiques utilisées.")
+                    return None
+                dataset = GridIntensityDataset(path)
+                _DATASETS[key] = dataset
+    return dataset
+
+
+def intensity_info(region, timestamp=None):
+    """
+    (intensité en kg CO2e / kWh, version du jeu de données ou None si valeur statique) pour `region` à `timestamp`.
+    Sans timestamp, c'est la valeur statique de CARBON_INTENSITY.
+    """
+    static = CARBON_INTENSITY.get(region, CARBON_INTENSITY["default"])
+    dataset = get_dataset() if timestamp is not None else None
+    if dataset is None:
+        return static, None
+    value = dataset.lookup(region, to_epoch_seconds([timestamp]))[0]
+    if np.isnan(value):
+        return static, None
+    return float(value), dataset.version
+
+
+def intensity_at(region, timestamp=None):
+    """Intensité carbone (kg CO2e / kWh) de `region` à `timestamp` (voir intensity_info)."""
+    return intensity_info(region, timestamp)[0]
+
+
+def intensity_at_many(regions, timestamps, static=None):
+    """
+    Version vectorisée : une recherche dichotomique par région distincte, pas par ligne.
+    static : intensités de repli par région (CARBON_INTENSITY par défaut).
+    """
+    static = CARBON_INTENSITY if static is None else static
+    codes, uniques = pd.factorize(np.asarray(regions, dtype=object))
+    result = np.array([static.get(r, static["default"]) for r in uniques], dtype=float)[codes]
+
+    dataset = get_dataset()
+    if dataset is None:
+        return result
+
+    t = to_epoch_seconds(timestamps)
+    for code, region in enumerate(uniques):
+        if region not in dataset.manifest["regions"]:
+            continue
+        rows = codes == code
+        values = dataset.lookup(region, t[rows])
+        result[rows] = np.where(np.isnan(values), result[rows], values)
+    return result
+
+
+def build_dataset(csv_paths, version=None, region=None, root=GRID_INTENSITY_DIR, source=None):
+    """
+    Construit une nouvelle version du jeu de données à partir d'exports CSV (gCO2e / kWh).
+
+    region : force la région de tous les fichiers ; sinon, colonne de zone du CSV, réduite au code pays
+    en minuscules ("US-CAL-CISO" -> "us"). Plusieurs zones d'un même pays sont moyennées heure par heure.
+    Renvoie le chemin du dossier créé.
+    """
+    frames = []
+    for csv_path in csv_paths:
+        df = pd.read_csv(csv_path)
+        time_col = next((c for c in TIME_COLUMNS if c in df.columns), None)
+        value_col = next((c for c in INTENSITY_COLUMNS if c in df.columns), None)
+        region_col = next((c for c in REGION_COLUMNS if c in df.columns), None)
+        if time_col is None or value_col is None or (region is None and region_col is None):
+            raise ValueError(f"{csv_path} : colonnes de date, d'intensité ou de région introuvables.")
+
+        frame = pd.DataFrame({
+            "timestamp": to_epoch_seconds(df[time_col]),
+            "intensity": pd.to_numeric(df[value_col], errors="coerce") / 1000,  # g -> kg
+            "region": region or df[region_col].astype(str).str.split("-").str[0].str.lower(),
+        })
+        frames.append(frame.dropna())
+
+    data = pd.concat(frames).groupby(["region", "timestamp"], as_index=False)["intensity"].mean()
+    return write_dataset(data, version, root, source or ", ".join(Path(p).name for p in csv_paths))
+
+
+def write_dataset(data, version=None, root=GRID_INTENSITY_DIR, source=""):
+    """
+    Écrit une version du jeu de données à partir d'un DataFrame (region, timestamp en secondes epoch,
+    intensity en kg CO2e / kWh). Renvoie le chemin du dossier créé.
+    """
+    version = version or datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    target = Path(root) / version
+    if target.exists():
+        raise FileExistsError(f"La version {version} existe déjà dans {root}.")
+    # Écriture dans un dossier temporaire puis renommage : une version visible est toujours complète
+    tmp = Path(root) / f".{version}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    manifest = {
+        "version": version,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "source": source,
+        "unit": "kgCO2e/kWh",
+        "regions": {},
+    }
+    for name, group in data.sort_values(["region", "timestamp"]).groupby("region"):
+        stamps = group["timestamp"].to_numpy(dtype=np.int64)
+        np.save(tmp / f"{name}.timestamps.npy", stamps)
+        np.save(tmp / f"{name}.intensity.npy", group["intensity"].to_numpy(dtype=np.float32))
+        manifest["regions"][name] = {
+            "rows": len(stamps),
+            "start": datetime.fromtimestamp(stamps[0], timezone.utc).isoformat(),
+            "end": datetime.fromtimestamp(stamps[-1], timezone.utc).isoformat(),
+            # Pas de temps médian : durée de validité du dernier point
+            "step_seconds": int(np.median(np.diff(stamps))) if len(stamps) > 1 else 3600,
+        }
+
+    (tmp / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    tmp.rename(target)
+    return target
+
+
+# Jeu d'exemple (SAMPLE_VERSION, commande sample), pour essayer l'intensité horaire sans téléchargement.
+# C'est un profil SYNTHÉTIQUE d'une semaine, pas une mesure : la moyenne annuelle de CARBON_INTENSITY de chaque pays
+# des profils matériels, modulée par un creux solaire en milieu de journée, une pointe le soir (centrales d'appoint
+# fossiles) et une baisse le week-end, en heure locale. La moyenne sur la semaine reste la moyenne annuelle.
+# Il n'est pas versionné dans le dépôt et n'est jamais pris comme "latest" : il ne sert qu'avec
+# GRID_INTENSITY_VERSION=2024-sample. Pour des données réelles, construire une version à partir d'exports horaires
+# (commande build).
+SAMPLE_VERSION = f"2024{SAMPLE_SUFFIX}"
+SAMPLE_START = "2024-01-01"  # un lundi
+SAMPLE_PROFILES = {
+    # région : (décalage UTC en heures, creux solaire, pointe du soir, baisse du week-end)
+    "fr": (1, 0.05, 0.25, 0.08),
+    "us": (-6, 0.12, 0.12, 0.04),
+    "cn": (8, 0.06, 0.05, 0.02),
+}
+
+
+def sample_data(profiles=SAMPLE_PROFILES, start=SAMPLE_START):
+    """DataFrame (region, timestamp, intensity) du jeu d'exemple synthétique : une semaine au pas horaire."""
+    hours = pd.date_range(start, periods=WEEK_SECONDS // 3600, freq="h", tz="UTC")
+    stamps = to_epoch_seconds(hours)
+    frames = []
+    for region, (utc_offset, solar_dip, evening_peak, weekend_drop) in profiles.items():
+        local = hours + pd.Timedelta(hours=utc_offset)
+        hour = local.hour.to_numpy()
+        solar = np.clip(np.sin(np.pi * (hour - 6) / 12), 0, None)
+        evening = np.exp(-((hour - 19) ** 2) / (2 * 1.5 ** 2))
+        weekend = (local.dayofweek.to_numpy() >= 5).astype(float)
+        factor = 1 - solar_dip * solar + evening_peak * evening - weekend_drop * weekend
+        frames.append(pd.DataFrame({
+            "region": region,
+            "timestamp": stamps,
+            "intensity": CARBON_INTENSITY[region] * factor / factor.mean(),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def build_sample_dataset(root=GRID_INTENSITY_DIR, version=SAMPLE_VERSION):
+    """Écrit le jeu d'exemple synthétique (voir SAMPLE_PROFILES)."""
+    return write_dataset(
+        sample_data(), version, root,
+        source="Profil synthétique d'une semaine (moyennes annuelles de CARBON_INTENSITY modulées par heure locale), "
+               "pas une mesure",
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Jeux de données d'intensité carbone horaire par région.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Construit une nouvelle version à partir d'exports CSV")
+    build.add_argument("csv", nargs="+", help="Fichiers CSV (ex : exports horaires Electricity Maps)")
+    build.add_argument("--version", help="Nom de la version (défaut : date et heure UTC)")
+    build.add_argument("--region", help="Région de tous les fichiers (défaut : colonne de zone du CSV)")
+    build.add_argument("--root", default=GRID_INTENSITY_DIR)
+    build.add_argument("--source", help="Description de la source, conservée dans le manifest")
+
+    sample = commands.add_parser("sample", help="Écrit le jeu d'exemple synthétique (à activer avec GRID_INTENSITY_VERSION)")
+    sample.add_argument("--root", default=GRID_INTENSITY_DIR)
+
+    commands.add_parser("list", help="Liste les versions disponibles")
+    args = parser.parse_args(argv)
+
+    if args.command in ("build", "sample"):
+        if args.command == "build":
+            target = build_dataset(args.csv, version=args.version, region=args.region, root=args.root,
+                                   source=args.source)
+        else:
+            target = build_sample_dataset(args.root)
+        manifest = json.loads((target / "manifest.json").read_text(encoding="utf-8"))
+        print(f"Version {manifest['version']} écrite dans {target}")
+        for name, info in manifest["regions"].items():
+            print(f"  {name} : {info['rows']} points, {info['start']} -> {info['end']}")
+    else:
+        for version in available_versions():
+            print(version)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import asyncio
+import time
+import weakref
+
+from .config import PROVIDER_CONCURRENCY, LLM_CACHE_ENABLED
+from .llm_caller import call_llm, call_llm_stream, LLMStream
+from .llm_cache import cache_key, cached_result, get_cache, resolve_model, store_result
+
+# Un jeu de sémaphores par boucle asyncio : Streamlit relance une boucle neuve (asyncio.run) à chaque rerun,
+# et un sémaphore ne peut pas être partagé entre deux boucles.
+_SEMAPHORES = weakref.WeakKeyDictionary()
+
+
+def _get_semaphore(provider):
+    loop = asyncio.get_running_loop()
+    semaphores = _SEMAPHORES.setdefault(loop, {})
+    if provider not in semaphores:
+        semaphores[provider] = asyncio.Semaphore(max(1, PROVIDER_CONCURRENCY.get(provider, 1)))
+    return semaphores[provider]
+
+
+async def call_llm_async(provider, prompt, model=None):
+    """
+    Version asynchrone de call_llm (renvoie un LLMResult), bornée par PROVIDER_CONCURRENCY.
+    L'appel bloquant s'exécute dans un thread et réutilise les clients partagés de backend.clients.
+    """
+    provider = provider.lower()
+    async with _get_semaphore(provider):
+        return await asyncio.to_thread(call_llm, provider, prompt, model)
+
+
+async def call_llm_cached_async(provider, prompt, model=None):
+    """
+    Version asynchrone de call_llm_cached : renvoie un LLMResult.
+    Le cache est consulté avant de prendre le sémaphore : une réponse en cache n'occupe pas une place
+    de PROVIDER_CONCURRENCY dont les appels réels ont besoin.
+    """
+    provider = provider.lower()
+    if not LLM_CACHE_ENABLED:
+        return await call_llm_async(provider, prompt, model)
+    result = await asyncio.to_thread(cached_result, provider, prompt, model)
+    if result is None:
+        result = await call_llm_async(provider, prompt, model)
+        await asyncio.to_thread(store_result, provider, prompt, model, result)
+    return result
+
+
+async def fan_out(prompt, targets, use_cache=True):
+    """
+    Envoie le même prompt à plusieurs modèles en parallèle.
+
+    targets : liste de couples (provider, model).
+    Générateur asynchrone qui produit les LLMResult dans l'ordre de complétion :
+    la durée totale est celle du modèle le plus lent, et non la somme des latences.
+    """
+    async def _call(provider, model):
+        if use_cache:
+            return await call_llm_cached_async(provider, prompt, model)
+        return await call_llm_async(provider, prompt, model)
+
+    tasks = [asyncio.create_task(_call(provider, model)) for provider, model in targets]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Si l'appelant s'arrête avant la fin, on n'attend pas les appels restants
+        for task in tasks:
+            task.cancel()
+
+
+def fan_out_sync(prompt, targets, on_result=None, use_cache=True):
+    """
+    Enveloppe synchrone de fan_out (pour Streamlit ou un script).
+    on_result(result) est appelé avec chaque LLMResult dès qu'il arrive.
+    Renvoie la liste des résultats dans l'ordre de complétion.
+    """
+    async def _collect():
+        results = []
+        async for result in fan_out(prompt, targets, use_cache=use_cache):
+            if on_result is not None:
+                on_result(result)
+            results.append(result)
+        return results
+
+    return asyncio.run(_collect())
+
+
+def _cached_stream(provider, prompt, model):
+    """LLMStream servi depuis le cache, ou None si la réponse n'y est pas."""
+    try:
+        model = resolve_model(provider, model)
+    except KeyError:
+        return None
+    start = time.perf_counter()
+    cached = get_cache().get(cache_key(provider, model, prompt))
+    if cached is None:
+        return None
+    response, usage = cached
+    return LLMStream.from_cache(provider, model, response, time.perf_counter() - start, usage)
+
+
+async def fan_out_stream(prompt, targets, use_cache=True):
+    """
+    Variante streaming de fan_out : tous les modèles génèrent en parallèle.
+
+    Générateur asynchrone qui produit des tuples (provider, model, morceau, stream) :
+    morceau est un fragment de texte, ou None quand le modèle a fini (stream.response,
+    stream.tdev, stream.timings et stream.cache_hit sont alors renseignés).
+    """
+    use_cache = use_cache and LLM_CACHE_ENABLED
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def _consume(stream):
+        # Itération bloquante dans un thread : chaque morceau est renvoyé à la boucle asyncio
+        for text in stream:
+            loop.call_soon_threadsafe(queue.put_nowait, (stream, text))
+
+    async def _run(provider, model):
+        provider = provider.lower()
+        # Consultation et écriture du cache (SQLite) hors de la boucle : un accès disque ne bloque pas les autres flux
+        stream = await asyncio.to_thread(_cached_stream, provider, prompt, model) if use_cache else None
+        if stream is not None:
+            queue.put_nowait((stream, stream.response))
+            queue.put_nowait((stream, None))
+            return
+
+        stream = call_llm_stream(provider, prompt, model)
+        try:
+            async with _get_semaphore(provider):
+                await asyncio.to_thread(_consume, stream)
+            if use_cache:
+                await asyncio.to_thread(get_cache().put, cache_key(provider, stream.model, prompt), provider,
+                                        stream.model, stream.response, stream.usage())
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, (stream, None))
+
+    tasks = [asyncio.create_task(_run(provider, model)) for provider, model in targets]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            stream, text = await queue.get()
+            if text is None:
+                remaining -= 1
+            yield stream.provider, stream.model, text, stream
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def fan_out_stream_sync(prompt, targets, on_chunk=None, on_done=None, use_cache=True):
+    """
+    Enveloppe synchrone de fan_out_stream.
+    on_chunk(provider, model, morceau) à chaque fragment, on_done(provider, model, stream) en fin de réponse.
+    """
+    async def _collect():
+        streams = []
+        async for provider, model, text, stream in fan_out_stream(prompt, targets, use_cache=use_cache):
+            if text is None:
+                streams.append(stream)
+                if on_done is not None:
+                    on_done(provider, model, stream)
+            elif on_chunk is not None:
+                on_chunk(provider, model, text)
+        return streams
+
+    return asyncio.run(_collect())
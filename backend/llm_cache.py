@@ -0,0 +1,210 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from .config import (
+    MODELS_LIST,
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_PATH,
+    LLM_CACHE_TTL_SECONDS,
+    LLM_CACHE_MAX_MEMORY_ENTRIES,
+    LLM_CACHE_MAX_DISK_ENTRIES,
+)
+from .llm_caller import call_llm, LLMResult
+
+
+def resolve_model(provider, model=None):
+    """Modèle effectivement appelé par call_llm (le premier de la liste si aucun n'est précisé)."""
+    return model if model else MODELS_LIST[provider][0]
+
+
+def cache_key(provider, model, prompt, params=None):
+    """Empreinte SHA-256 de (provider, modèle, prompt, paramètres de génération)."""
+    payload = json.dumps(
+        {"provider": provider.lower(), "model": model, "prompt": prompt, "params": params or {}},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Cache à deux niveaux des réponses LLM, adressé par cache_key :
+      - une LRU en mémoire (max_memory_entries) pour les répétitions dans un même process ;
+      - une table SQLite sur disque (max_disk_entries) qui survit aux redémarrages.
+    Les entrées plus vieilles que ttl_seconds sont ignorées puis supprimées.
+    Seules les réponses réussies (texte) sont mises en cache, avec leurs informations d'usage
+    (tokens, raison de fin, modèle servi).
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, ttl_seconds=LLM_CACHE_TTL_SECONDS,
+                 max_memory_entries=LLM_CACHE_MAX_MEMORY_ENTRIES, max_disk_entries=LLM_CACHE_MAX_DISK_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()  # key -> (response, usage, created_at)
+        self._lock = threading.Lock()
+        self.stats_counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                provider TEXT,
+                model TEXT,
+                response TEXT,
+                created_at REAL,
+                last_access REAL,
+                usage TEXT
+            )
+            """
+        )
+        # Caches créés avant l'ajout de la colonne usage
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(llm_cache)")}
+        if "usage" not in columns:
+            self._db.execute("ALTER TABLE llm_cache ADD COLUMN usage TEXT")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)")
+        self._db.commit()
+
+    def _expired(self, created_at, now):
+        return now - created_at > self.ttl_seconds
+
+    def _remember(self, key, response, usage, created_at):
+        self._memory[key] = (response, usage, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.stats_counters["evictions"] += 1
+
+    def get(self, key):
+        """Renvoie (réponse, usage) en cache, ou None (absente ou expirée)."""
+        now = time.time()
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                if not self._expired(cached[2], now):
+                    self._memory.move_to_end(key)
+                    self.stats_counters["memory_hits"] += 1
+                    return cached[0], cached[1]
+                del self._memory[key]
+
+            row = self._db.execute("SELECT response, usage, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                if not self._expired(row[2], now):
+                    self._db.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+                    usage = json.loads(row[1]) if row[1] else {}
+                    self._remember(key, row[0], usage, row[2])
+                    self.stats_counters["disk_hits"] += 1
+                    return row[0], usage
+                self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._db.commit()
+
+            self.stats_counters["misses"] += 1
+            return None
+
+    def put(self, key, provider, model, response, usage=None):
+        if not isinstance(response, str):
+            return
+        usage = usage or {}
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, usage, now)
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, provider, model, response, created_at, last_access, usage) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, model, response, now, now, json.dumps(usage)),
+            )
+            self._evict_disk(now)
+            self._db.commit()
+
+    def _evict_disk(self, now):
+        # 1. Entrées expirées
+        cursor = self._db.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        self.stats_counters["evictions"] += cursor.rowcount
+        # 2. Borne de taille : on retire les entrées les moins récemment utilisées
+        count = self._db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        if count > self.max_disk_entries:
+            cursor = self._db.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_access LIMIT ?)",
+                (count - self.max_disk_entries,),
+            )
+            self.stats_counters["evictions"] += cursor.rowcount
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._db.execute("DELETE FROM llm_cache")
+            self._db.commit()
+
+    def stats(self):
+        """Compteurs hits/misses pour les tableaux de bord."""
+        with self._lock:
+            stats = dict(self.stats_counters)
+            stats["memory_entries"] = len(self._memory)
+            stats["disk_entries"] = self._db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_cache():
+    """Cache partagé par tout le process (créé au premier appel)."""
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = LLMCache()
+    return _CACHE
+
+
+def cached_result(provider, prompt, model=None, params=None):
+    """LLMResult servi depuis le cache (cache_hit vrai, tdev = durée de la consultation), ou None si absent."""
+    provider = provider.lower()
+    try:
+        model = resolve_model(provider, model)
+    except KeyError:
+        return None
+    start = time.perf_counter()
+    cached = get_cache().get(cache_key(provider, model, prompt, params))
+    if cached is None:
+        return None
+    response, usage = cached
+    return LLMResult(provider, model, response, time.perf_counter() - start, cache_hit=True, **usage)
+
+
+def store_result(provider, prompt, model, result, params=None):
+    """Met en cache la réponse d'un appel réel (les erreurs ne sont pas gardées, voir LLMCache.put)."""
+    provider = provider.lower()
+    try:
+        model = resolve_model(provider, model)
+    except KeyError:
+        return
+    get_cache().put(cache_key(provider, model, prompt, params), provider, model, result.response, result.usage())
+
+
+def call_llm_cached(provider, prompt, model=None, params=None):
+    """
+    call_llm précédé d'une consultation du cache.
+    Renvoie un LLMResult ; sur un hit, cache_hit est vrai et tdev est la durée de la consultation.
+    """
+    if not LLM_CACHE_ENABLED:
+        return call_llm(provider, prompt, model)
+
+    result = cached_result(provider, prompt, model, params)
+    if result is None:
+        # Provider inconnu : call_llm renverra l'erreur habituelle (et store_result ne garde rien)
+        result = call_llm(provider, prompt, model)
+        store_result(provider, prompt, model, result, params)
+    return result
@@ -1,107 +1,223 @@
-from openai import OpenAI, APIError
-from google import genai
-from groq import Groq, APIError as GroqAPIError
-from .config import API_KEYS, MODELS_LIST
+from openai import APIError
+from groq import APIError as GroqAPIError
+from .config import API_KEYS, MODELS_LIST, HTTP_TIMEOUT, MOCK_API_URL
+from .clients import get_client
+from .rate_limit import call_with_retry, settle_tokens, RetryableHTTPError, RETRYABLE_STATUSES
+from .timing import CallTrace, activate, trace_call, restart_trace, elapsed_since
+from .tokens import estimate_tokens
 
-import requests
-import time
+from dataclasses import dataclass, field
+import httpx
+import json
+
+# Informations d'usage renvoyées par les providers, communes à LLMResult et LLMStream
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "finish_reason", "served_model")
+
+@dataclass
+class LLMResult:
+    """
+    Résultat d'un appel non streamé, avec les mêmes attributs qu'un LLMStream terminé :
+      - response : texte, ou {"error": ...} en cas d'échec
+      - tdev : durée de l'essai qui a abouti (s), 0 en cas d'échec
+      - timings : décomposition de la latence (voir CallTrace.phases) et tdev
+      - cache_hit : True si la réponse vient du cache (voir backend.llm_cache)
+      - prompt_tokens, completion_tokens : compteurs renvoyés par le provider (None s'il n'en donne pas)
+      - finish_reason : raison de fin de génération ("stop", "length"...)
+      - served_model : modèle réellement servi, qui peut différer de l'alias demandé
+    """
+    provider: str
+    model: str
+    response: object
+    tdev: float = 0.0
+    timings: dict = field(default_factory=dict)
+    cache_hit: bool = False
+    prompt_tokens: int = None
+    completion_tokens: int = None
+    finish_reason: str = None
+    served_model: str = None
+
+    def usage(self):
+        """Champs d'usage, pour les reporter sur un autre résultat (cache, historique)."""
+        return {key: getattr(self, key) for key in USAGE_FIELDS}
+
+def _openai_usage(response):
+    """Tokens, raison de fin et modèle servi d'une réponse OpenAI ou Groq (même format)."""
+    usage = getattr(response, "usage", None)
+    choice = response.choices[0] if response.choices else None
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+        "finish_reason": getattr(choice, "finish_reason", None),
+        "served_model": getattr(response, "model", None),
+    }
+
+def _gemini_usage(response):
+    """Équivalent de _openai_usage pour Gemini (usage_metadata)."""
+    usage = getattr(response, "usage_metadata", None)
+    completion_tokens = getattr(usage, "candidates_token_count", None)
+    if completion_tokens is not None:
+        # Les modèles "thinking" génèrent aussi des tokens de réflexion, facturés comme la réponse
+        completion_tokens += getattr(usage, "thoughts_token_count", None) or 0
+    finish_reason = None
+    if response.candidates and response.candidates[0].finish_reason is not None:
+        reason = response.candidates[0].finish_reason
+        finish_reason = getattr(reason, "name", str(reason)).lower()
+    return {
+        "prompt_tokens": getattr(usage, "prompt_token_count", None),
+        "completion_tokens": completion_tokens,
+        "finish_reason": finish_reason,
+        "served_model": getattr(response, "model_version", None),
+    }
+
+def _hf_usage(data):
+    """Équivalent de _openai_usage pour le JSON du routeur HF (format OpenAI)."""
+    usage = data.get("usage") or {}
+    choices = data.get("choices") or [{}]
+    return {
+        "prompt_tokens": usage.get("prompt_tokens"),
+        "completion_tokens": usage.get("completion_tokens"),
+        "finish_reason": choices[0].get("finish_reason"),
+        "served_model": data.get("model"),
+    }
 
 def call_openai(api_key, prompt, model):
     try:
-        client = OpenAI(api_key=api_key)
-        start = time.time()
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-        )
-        tdev = time.time() - start
-        return response.choices[0].message.content, tdev
+        client = get_client("openai", api_key)
+
+        # Chaque essai est chronométré séparément : les attentes du backoff ne comptent pas dans tdev
+        def attempt():
+            start = restart_trace()
+            response = client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+            )
+            return response, elapsed_since(start)
+
+        response, tdev = call_with_retry("openai", attempt, tokens=estimate_tokens(prompt))
+        return LLMResult("openai", model, response.choices[0].message.content, tdev, **_openai_usage(response))
     except APIError as e:
         # Gère toutes les erreurs venant de l'API OpenAI (authentification, rate limit, etc.)
         error_message = f"Erreur de l'API OpenAI : {e.status_code} - {e.message}"
         print(error_message)
-        return {"error": error_message}, 0
+        return LLMResult("openai", model, {"error": error_message})
     except Exception as e:
         # Gère les autres erreurs (ex: problème de connexion)
         error_message = f"Une erreur inattendue est survenue avec OpenAI : {e}"
         print(error_message)
-        return {"error": error_message}, 0
+        return LLMResult("openai", model, {"error": error_message})
 
 def call_gemini(api_key, prompt, model):
     try:
-        client = genai.Client(api_key=api_key)
-        start = time.time()
-        response = client.models.generate_content(
-            model=model,
-            contents=prompt
-            )
-        tdev = time.time() - start
-        return response.text, tdev
+        client = get_client("gemini", api_key)
+
+        def attempt():
+            start = restart_trace()
+            response = client.models.generate_content(
+                model=model,
+                contents=prompt
+                )
+            return response, elapsed_since(start)
+
+        response, tdev = call_with_retry("gemini", attempt, tokens=estimate_tokens(prompt))
+        return LLMResult("gemini", model, response.text, tdev, **_gemini_usage(response))
     except Exception as e:
         # La bibliothèque de Google peut lever des exceptions variées,
         # notamment pour des problèmes de permission (403), de ressource non trouvée (404) ou de surcharge (503).
         error_message = f"Une erreur est survenue avec l'API Gemini : {e}"
         print(error_message)
-        return {"error": error_message}, 0
+        return LLMResult("gemini", model, {"error": error_message})
+
+def _groq_error_details(e):
+    """Extrait un message lisible d'une erreur Groq (JSON, page HTML Cloudflare ou texte brut)."""
+    error_details = "Détails non disponibles"
+    
+    if e.body:
+        if isinstance(e.body, dict):
+            # Cas 1 : L'erreur est un JSON propre, on l'analyse
+            error_details = e.body.get('error', {}).get('message', str(e.body))
+        else:
+            # Cas 2 : L'erreur n'est pas un dictionnaire (string, HTML...)
+            body_str = str(e.body).strip()
+            
+            # On vérifie si la chaîne ressemble à du HTML
+            if body_str.lower().startswith('<!doctype html'):
+                # Si c'est du HTML, on crée un message d'erreur clair et concis
+                error_details = (
+                    "Le service a rencontré une erreur interne (probablement une erreur 5xx de Cloudflare). "
+                    "Le service est peut-être temporairement indisponible."
+                )
+            else:
+                # Si c'est une autre chaîne, on l'affiche (en la tronquant si elle est trop longue)
+                error_details = (body_str[:250] + '...') if len(body_str) > 250 else body_str
+
+    return error_details
 
 def call_groq(api_key, prompt, model):
     try:
-        client = Groq(api_key=api_key)
-        start = time.time()
-        response = client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
-            model=model,
-        )
-        tdev = time.time() - start
-        return response.choices[0].message.content, tdev
+        client = get_client("groq", api_key)
+
+        def attempt():
+            start = restart_trace()
+            response = client.chat.completions.create(
+                messages=[{"role": "user", "content": prompt}],
+                model=model,
+            )
+            return response, elapsed_since(start)
+
+        # Les 429 et les pages d'erreur 5xx de Cloudflare sont retentées avant d'être remontées
+        response, tdev = call_with_retry("groq", attempt, tokens=estimate_tokens(prompt))
+        return LLMResult("groq", model, response.choices[0].message.content, tdev, **_openai_usage(response))
     except GroqAPIError as e:
-        error_details = "Détails non disponibles"
-        
-        if e.body:
-            if isinstance(e.body, dict):
-                # Cas 1 : L'erreur est un JSON propre, on l'analyse
-                error_details = e.body.get('error', {}).get('message', str(e.body))
-            else:
-                # Cas 2 : L'erreur n'est pas un dictionnaire (string, HTML...)
-                body_str = str(e.body).strip()
-                
-                # On vérifie si la chaîne ressemble à du HTML
-                if body_str.lower().startswith('<!doctype html'):
-                    # Si c'est du HTML, on crée un message d'erreur clair et concis
-                    error_details = (
-                        "Le service a rencontré une erreur interne (probablement une erreur 5xx de Cloudflare). "
-                        "Le service est peut-être temporairement indisponible."
-                    )
-                else:
-                    # Si c'est une autre chaîne, on l'affiche (en la tronquant si elle est trop longue)
-                    error_details = (body_str[:250] + '...') if len(body_str) > 250 else body_str
-        
+        error_details = _groq_error_details(e)
+
         # Ce message est pour les logs côté backend
         full_error_message = f"Erreur de l'API Groq : {e.status_code} - {error_details}"
         print(full_error_message)
         
         # On retourne un message simple et propre pour le front-end
-        return {"error": f"Une erreur est survenue avec l'API Groq (code {e.status_code}). Veuillez réessayer plus tard."}, 0
+        return LLMResult("groq", model, {"error": f"Une erreur est survenue avec l'API Groq (code {e.status_code}). Veuillez réessayer plus tard."})
         
     except Exception as e:
         # Gère les autres erreurs (ex: problème de connexion)
         error_message = f"Une erreur inattendue est survenue avec Groq : {e}"
         print(error_message)
-        return {"error": error_message}, 0
+        return LLMResult("groq", model, {"error": error_message})
     
 
 
 HF_API_URL = "https://router.huggingface.co/v1/chat/completions"
 
-def call_HF(api_key: str, prompt: str, model: str):
+def _hf_error_response(response, model):
+    """Transforme une réponse HTTP non-200 de Hugging Face en dictionnaire {"error": ...}."""
+    error_details = response.text
+    
+    # Tentative d'extraction propre du message d'erreur JSON renvoyé par HF
+    try:
+        error_json = response.json()
+        # HF renvoie souvent {'error': 'Model is loading...'} ou {'error': ['msg...']}
+        if isinstance(error_json, dict) and 'error' in error_json:
+            error_details = error_json['error']
+    except ValueError:
+        # Si ce n'est pas du JSON (ex: page HTML d'erreur 502 Bad Gateway)
+        pass
+
+    # Gestion spécifique : Modèle en cours de chargement (Erreur 503 fréquente sur HF)
+    if response.status_code == 503 and "loading" in str(error_details).lower():
+        print(f"Info HF : Le modèle {model} est en cours de chargement (Cold Boot).")
+        return {"error": "Le modèle est en cours de chargement sur les serveurs Hugging Face. Veuillez réessayer dans 20-30 secondes."}
+    
+    error_message = f"Erreur de l'API HF : {response.status_code} - {error_details}"
+    print(error_message)
+    return {"error": f"Une erreur est survenue avec Hugging Face (code {response.status_code})."}
+
+def call_HF(api_key: str, prompt: str, model: str, url: str = HF_API_URL, provider: str = "hf"):
     """
     Envoie un message utilisateur vers l'API Inference de Hugging Face.
     Gère les erreurs réseaux, les erreurs d'API (4xx, 5xx) et le chargement des modèles.
+    url/provider permettent de viser un autre serveur compatible OpenAI (ex : le mock local).
     """
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
+    # Client httpx partagé : les en-têtes (Authorization...) sont portés par le client
+    session = get_client(provider, api_key)
 
     payload = {
         "model": model,
@@ -111,63 +227,74 @@ def call_HF(api_key: str, prompt: str, model: str):
         "stream": False # On force le non-streaming pour simplifier la réponse
     }
 
-    try:
-        start = time.time()
+    def attempt():
+        start = restart_trace()
         # On ajoute un timeout pour éviter que le script ne pende indéfiniment
-        response = requests.post(HF_API_URL, headers=headers, json=payload, timeout=30)
-        
+        response = session.post(url, json=payload, timeout=HTTP_TIMEOUT)
+        # 429, 503 "model loading", 5xx... : on laisse call_with_retry retenter
+        if response.status_code in RETRYABLE_STATUSES:
+            raise RetryableHTTPError(response)
+        return response, elapsed_since(start)
+
+    try:
+        response, tdev = call_with_retry(provider, attempt, tokens=estimate_tokens(prompt))
+
         # Gestion des codes d'erreur HTTP (4xx, 5xx)
         if response.status_code != 200:
-            error_details = response.text
-            
-            # Tentative d'extraction propre du message d'erreur JSON renvoyé par HF
-            try:
-                error_json = response.json()
-                # HF renvoie souvent {'error': 'Model is loading...'} ou {'error': ['msg...']}
-                if isinstance(error_json, dict) and 'error' in error_json:
-                    error_details = error_json['error']
-            except ValueError:
-                # Si ce n'est pas du JSON (ex: page HTML d'erreur 502 Bad Gateway)
-                pass
-
-            # Gestion spécifique : Modèle en cours de chargement (Erreur 503 fréquente sur HF)
-            if response.status_code == 503 and "loading" in str(error_details).lower():
-                print(f"Info HF : Le modèle {model} est en cours de chargement (Cold Boot).")
-                return {"error": "Le modèle est en cours de chargement sur les serveurs Hugging Face. Veuillez réessayer dans 20-30 secondes."}, 0
-            
-            error_message = f"Erreur de l'API HF : {response.status_code} - {error_details}"
-            print(error_message)
-            return {"error": f"Une erreur est survenue avec Hugging Face (code {response.status_code})."}, 0
+            return LLMResult(provider, model, _hf_error_response(response, model))
 
         # Succès
         data = response.json()
-        tdev = time.time() - start
         
         # Vérification que la structure de réponse est celle attendue
         if "choices" in data and len(data["choices"]) > 0:
-            return data["choices"][0]["message"]["content"], tdev
+            return LLMResult(provider, model, data["choices"][0]["message"]["content"], tdev, **_hf_usage(data))
         else:
             print(f"Format de réponse inattendu de HF : {data}")
-            return {"error": "Format de réponse inattendu de l'API Hugging Face."}, 0
+            return LLMResult(provider, model, {"error": "Format de réponse inattendu de l'API Hugging Face."})
+
+    except RetryableHTTPError as e:
+        # Tous les essais ont échoué : on formate la dernière réponse reçue
+        return LLMResult(provider, model, _hf_error_response(e.response, model))
 
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         error_message = "Erreur : La requête vers Hugging Face a expiré (Timeout)."
         print(error_message)
-        return {"error": error_message}, 0
+        return LLMResult(provider, model, {"error": error_message})
 
-    except requests.exceptions.ConnectionError:
+    except httpx.TransportError:
         error_message = "Erreur : Impossible de se connecter aux serveurs Hugging Face (Problème réseau)."
         print(error_message)
-        return {"error": error_message}, 0
+        return LLMResult(provider, model, {"error": error_message})
 
     except Exception as e:
         # Capture toute autre erreur imprévue (parsing, etc.)
         error_message = f"Une erreur inattendue est survenue avec HF : {e}"
         print(error_message)
-        return {"error": error_message}, 0
+        return LLMResult(provider, model, {"error": error_message})
+
+def call_mock(api_key, prompt, model):
+    """Appelle le faux provider local (backend/mock_server.py), qui parle le même protocole que HF."""
+    return call_HF(api_key, prompt, model, url=MOCK_API_URL, provider="mock")
 
 def call_llm(provider, prompt, model=None):
+    """
+    Point d'entrée unique : appelle le provider demandé et renvoie un LLMResult.
+    En cas d'échec, result.response est un dictionnaire {"error": ...} et result.tdev vaut 0.
+    """
     provider = provider.lower()
+    with trace_call() as trace:
+        result = _call_provider(provider, prompt, model)
+
+    if isinstance(result.response, str):
+        result.timings = trace.phases()
+        result.timings["tdev"] = result.tdev
+        # Seul le prompt estimé a été prélevé sur le seau TPM : on y reporte les tokens réellement consommés
+        settle_tokens(provider, estimate_tokens(prompt), result.usage(), result.response)
+    return result
+
+def _call_provider(provider, prompt, model=None):
+    """Aiguillage vers le call_* du provider ; renvoie un LLMResult."""
     api_key = ""
 
     # arguments communs
@@ -198,21 +325,310 @@ def call_llm(provider, prompt, model=None):
             kwargs["model"] = model
             kwargs["api_key"] = api_key
             return call_HF(**kwargs)
+        elif provider == "mock":
+            api_key = API_KEYS["mock"]
+            model = model if model else MODELS_LIST["mock"][0]
+            kwargs["model"] = model
+            kwargs["api_key"] = api_key
+            return call_mock(**kwargs)
         else:
             raise ValueError(f"Provider {provider} not supported.")
     except KeyError as e:
         error_message = f"Clé API ou configuration de modèle manquante pour le provider '{provider}' : {e}"
         print(error_message)
-        return {"error": error_message}
+        return LLMResult(provider, model or "", {"error": error_message})
     except ValueError as e:
         # Gère le cas où le provider n'est pas supporté
         print(e)
-        return {"error": str(e)}
+        return LLMResult(provider, model or "", {"error": str(e)})
     except Exception as e:
         # Capture toute autre erreur imprévue
         error_message = f"Une erreur générale est survenue dans call_llm : {e}"
         print(error_message)
-        return {"error": error_message}
+        return LLMResult(provider, model or "", {"error": error_message})
+
+
+# -----------------------------
+# STREAMING
+# -----------------------------
+# Chaque stream_* est un générateur qui produit les morceaux de texte au fil de l'eau, puis en dernier
+# un dictionnaire d'usage (tokens, raison de fin, modèle servi), et lève une exception en cas d'échec ;
+# LLMStream se charge du chronométrage et des erreurs.
+
+class LLMStreamError(Exception):
+    """Erreur déjà formatée pour le front-end (ex : code HTTP non-200 de Hugging Face)."""
+
+    def __init__(self, error):
+        super().__init__(error["error"])
+        self.error = error
+
+def _merge_usage(usage, update):
+    # Les compteurs arrivent souvent dans le dernier morceau seulement : on garde les valeurs renseignées
+    usage.update({key: value for key, value in update.items() if value is not None})
+
+def _chat_stream_chunks(stream):
+    """Morceaux de texte d'un stream OpenAI/Groq, suivis du dictionnaire d'usage."""
+    usage = {}
+    for chunk in stream:
+        # OpenAI : chunk.usage (stream_options) ; Groq : chunk.x_groq.usage sur le dernier morceau
+        chunk_usage = getattr(chunk, "usage", None) or getattr(getattr(chunk, "x_groq", None), "usage", None)
+        choice = chunk.choices[0] if chunk.choices else None
+        _merge_usage(usage, {
+            "prompt_tokens": getattr(chunk_usage, "prompt_tokens", None),
+            "completion_tokens": getattr(chunk_usage, "completion_tokens", None),
+            "finish_reason": getattr(choice, "finish_reason", None),
+            "served_model": getattr(chunk, "model", None),
+        })
+        if choice is not None and choice.delta.content:
+            yield choice.delta.content
+    yield usage
+
+def stream_openai(api_key, prompt, model):
+    client = get_client("openai", api_key)
+    # L'ouverture du stream (envoi de la requête + code HTTP) est retentée ; une coupure en cours de route ne l'est pas
+    def attempt():
+        restart_trace()
+        return client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            stream=True,
+            # Sans cette option, OpenAI ne renvoie pas les compteurs de tokens en streaming
+            stream_options={"include_usage": True},
+        )
+    stream = call_with_retry("openai", attempt, tokens=estimate_tokens(prompt))
+    yield from _chat_stream_chunks(stream)
+
+def _open_gemini_stream(client, prompt, model):
+    # generate_content_stream est paresseux : la requête ne part qu'au premier morceau, qu'on lit donc ici
+    restart_trace()
+    chunks = client.models.generate_content_stream(model=model, contents=prompt)
+    return next(chunks, None), chunks
+
+def stream_gemini(api_key, prompt, model):
+    client = get_client("gemini", api_key)
+    first, chunks = call_with_retry(
+        "gemini", lambda: _open_gemini_stream(client, prompt, model), tokens=estimate_tokens(prompt)
+    )
+    usage = {}
+    if first is not None:
+        # usage_metadata est cumulatif : le dernier morceau donne les totaux
+        _merge_usage(usage, _gemini_usage(first))
+        if first.text:
+            yield first.text
+    for chunk in chunks:
+        _merge_usage(usage, _gemini_usage(chunk))
+        if chunk.text:
+            yield chunk.text
+    yield usage
+
+def stream_groq(api_key, prompt, model):
+    client = get_client("groq", api_key)
+    def attempt():
+        restart_trace()
+        return client.chat.completions.create(
+            messages=[{"role": "user", "content": prompt}],
+            model=model,
+            stream=True,
+        )
+    stream = call_with_retry("groq", attempt, tokens=estimate_tokens(prompt))
+    yield from _chat_stream_chunks(stream)
+
+def stream_HF(api_key, prompt, model, url=HF_API_URL, provider="hf"):
+    session = get_client(provider, api_key)
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "user", "content": prompt}
+        ],
+        "stream": True,
+        "stream_options": {"include_usage": True}
+    }
+    def attempt():
+        restart_trace()
+        request = session.build_request("POST", url, json=payload, timeout=HTTP_TIMEOUT)
+        response = session.send(request, stream=True)
+        if response.status_code in RETRYABLE_STATUSES:
+            # On lit le corps (message d'erreur) pour libérer la connexion avant de réessayer
+            response.read()
+            response.close()
+            raise RetryableHTTPError(response)
+        return response
+
+    try:
+        response = call_with_retry(provider, attempt, tokens=estimate_tokens(prompt))
+    except RetryableHTTPError as e:
+        raise LLMStreamError(_hf_error_response(e.response, model))
+
+    try:
+        if response.status_code != 200:
+            response.read()
+            raise LLMStreamError(_hf_error_response(response, model))
+
+        # Format Server-Sent Events : une ligne "data: {...}" par morceau, terminée par "data: [DONE]"
+        # httpx décode en UTF-8 par défaut (pas de charset pour text/event-stream) et rend les lignes dès leur arrivée
+        usage = {}
+        for line in response.iter_lines():
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            _merge_usage(usage, _hf_usage(chunk))
+            if chunk.get("choices"):
+                content = chunk["choices"][0].get("delta", {}).get("content")
+                if content:
+                    yield content
+        yield usage
+    finally:
+        response.close()
+
+def stream_mock(api_key, prompt, model):
+    return stream_HF(api_key, prompt, model, url=MOCK_API_URL, provider="mock")
+
+_STREAMERS = {
+    "openai": stream_openai,
+    "gemini": stream_gemini,
+    "groq": stream_groq,
+    "hf": stream_HF,
+    "mock": stream_mock,
+}
+
+def _stream_error_message(provider, e):
+    """Message d'erreur pour le front-end, sur le même modèle que les call_*."""
+    if isinstance(e, LLMStreamError):
+        return e.error
+    if isinstance(e, GroqAPIError):
+        print(f"Erreur de l'API Groq : {getattr(e, 'status_code', None)} - {_groq_error_details(e)}")
+        return {"error": f"Une erreur est survenue avec l'API Groq (code {getattr(e, 'status_code', None)}). Veuillez réessayer plus tard."}
+    if isinstance(e, APIError):
+        error_message = f"Erreur de l'API OpenAI : {getattr(e, 'status_code', None)} - {e.message}"
+    elif isinstance(e, httpx.TimeoutException):
+        error_message = "Erreur : La requête vers Hugging Face a expiré (Timeout)."
+    elif isinstance(e, httpx.TransportError):
+        error_message = "Erreur : Impossible de se connecter aux serveurs Hugging Face (Problème réseau)."
+    else:
+        error_message = f"Une erreur inattendue est survenue avec {provider} : {e}"
+    print(error_message)
+    return {"error": error_message}
+
+class LLMStream:
+    """
+    Réponse d'un LLM en streaming, à itérer pour recevoir les morceaux de texte (ex : st.write_stream).
+
+    Une fois l'itération terminée :
+      - response : texte complet, ou {"error": ...} en cas d'échec
+      - tdev : durée totale (s), comme pour call_llm
+      - timings : {"ttft", "generation", "chunk_times", "tdev"} en secondes, où ttft est le délai avant
+        le premier morceau (file d'attente + réseau + prefill) et generation la fenêtre premier -> dernier morceau,
+        complétés par la décomposition réseau de CallTrace.phases. En streaming, la fenêtre "server"
+        retenue pour le calcul est la génération (ou requête envoyée -> unique morceau).
+      - cache_hit : True si la réponse vient du cache (voir LLMStream.from_cache)
+      - prompt_tokens, completion_tokens, finish_reason, served_model : comme pour LLMResult
+    """
+
+    def __init__(self, provider, model, chunks):
+        self.provider = provider
+        self.model = model
+        self._chunks = chunks
+        self.response = None
+        self.tdev = 0
+        self.timings = {}
+        self.cache_hit = False
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.finish_reason = None
+        self.served_model = None
+        self.reserved_tokens = None  # tokens prélevés sur le seau TPM à l'ouverture (voir call_llm_stream)
+
+    @classmethod
+    def from_cache(cls, provider, model, response, tdev, usage=None):
+        """Stream déjà terminé, servi depuis le cache : un seul morceau, pas de chronométrage."""
+        stream = cls(provider, model, iter(()))
+        stream.response = response
+        stream.tdev = tdev
+        stream.cache_hit = True
+        stream._set_usage(usage or {})
+        return stream
+
+    def _set_usage(self, usage):
+        for key in USAGE_FIELDS:
+            setattr(self, key, usage.get(key))
+
+    def usage(self):
+        return {key: getattr(self, key) for key in USAGE_FIELDS}
+
+    def __iter__(self):
+        if self.cache_hit:
+            yield self.response
+            return
+
+        parts = []
+        chunk_times = []
+        # Le générateur est paresseux : la requête part au premier next(), le chrono démarre donc ici.
+        # Chaque next() s'exécute avec la trace active, pour que le transport HTTP y rattache ses événements ;
+        # le chrono repart à chaque essai d'ouverture du stream (restart_trace), comme pour call_llm.
+        trace = CallTrace()
+        chunks = iter(self._chunks)
+        try:
+            while True:
+                with activate(trace):
+                    text = next(chunks, None)
+                if text is None:
+                    break
+                if isinstance(text, dict):
+                    # Dernier élément : l'usage, qui n'est pas un morceau de texte
+                    self._set_usage(text)
+                    continue
+                chunk_times.append(elapsed_since(trace.start_ns))
+                parts.append(text)
+                yield text
+        except Exception as e:
+            self.response = _stream_error_message(self.provider, e)
+            return
+
+        self.tdev = elapsed_since(trace.start_ns)
+        self.response = "".join(parts)
+        if self.reserved_tokens is not None:
+            settle_tokens(self.provider, self.reserved_tokens, self.usage(), self.response)
+        self.timings = trace.phases()
+        self.timings.update({
+            "ttft": chunk_times[0] if chunk_times else self.tdev,
+            "generation": chunk_times[-1] - chunk_times[0] if chunk_times else 0.0,
+            "chunk_times": chunk_times,
+            "tdev": self.tdev,
+            "streamed": True,
+        })
+        if self.timings["last_byte"] is None and chunk_times:
+            # Le stream est refermé dès "[DONE]" : le dernier morceau tient lieu de dernier octet
+            self.timings["last_byte"] = chunk_times[-1]
+        if len(chunk_times) >= 2:
+            self.timings["server"] = self.timings["generation"]
+        elif chunk_times and self.timings["request_sent"] is not None:
+            self.timings["server"] = chunk_times[0] - self.timings["request_sent"]
+        else:
+            self.timings["server"] = None
+
+def _failed_stream(error):
+    # Générateur vide qui échoue dès la première itération
+    raise LLMStreamError(error)
+    yield
+
+def call_llm_stream(provider, prompt, model=None):
+    """
+    Équivalent de call_llm en mode streaming : renvoie un LLMStream à itérer.
+    Les erreurs de configuration sont remontées dans stream.response comme pour les erreurs d'API.
+    """
+    provider = provider.lower()
+    if provider not in _STREAMERS:
+        return LLMStream(provider, model, _failed_stream({"error": f"Provider {provider} not supported."}))
+
+    api_key = API_KEYS.get(provider)
+    model = model if model else MODELS_LIST[provider][0]
+    stream = LLMStream(provider, model, _STREAMERS[provider](api_key=api_key, prompt=prompt, model=model))
+    # Même estimation que celle prélevée par les stream_* à l'ouverture, rapprochée de l'usage réel en fin de stream
+    stream.reserved_tokens = estimate_tokens(prompt)
+    return stream
 
 
 # Exemple d'utilisation avec openai
@@ -229,7 +645,8 @@ if __name__ == "__main__":
     result = call_llm(provider, prompt, model)
 
     # Le front-end devra vérifier si la réponse est un dictionnaire avec une clé 'error'
-    if isinstance(result, dict) and 'error' in result:
-        print("Une erreur a été retournée :", result['error'])
+    if isinstance(result.response, dict) and 'error' in result.response:
+        print("Une erreur a été retournée :", result.response['error'])
     else:
-        print("Réponse du modèle :", result)
\ No newline at end of file
+        print("Réponse du modèle :", result.response)
+        print("Décomposition de la latence :", result.timings)
\ No newline at end of file
@@ -0,0 +1,248 @@
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Serveur local qui imite l'API /v1/chat/completions (format OpenAI, celui du routeur Hugging Face),
+# streaming SSE compris. Il sert à mesurer débit, retries et concurrence sans clé API ni réseau.
+#
+# Lancement : python -m backend.mock_server --port 8008 --latency-mean 0.8 --error-429 0.05 --seed 42
+# Puis dans le .env : MOCK_MODEL=mock-llm (et MOCK_API_URL si le port change)
+
+_WORDS = (
+    "le la les un une des et de du en pour sur avec sans dans par carbone énergie modèle calcul serveur "
+    "réseau donnée requête réponse token GPU électricité empreinte mesure estimation latence débit"
+).split()
+
+
+@dataclass
+class MockSettings:
+    latency_dist: str = "lognormal"   # fixed | uniform | normal | lognormal : délai avant le premier token
+    latency_mean: float = 0.5         # secondes
+    latency_sigma: float = 0.25       # écart-type (normal) ou paramètre de forme (lognormal)
+    tokens_per_second: float = 50.0   # vitesse de génération
+    response_tokens: int = 60         # longueur moyenne des réponses (en mots ~ tokens)
+    error_429: float = 0.0            # probabilité de renvoyer un 429 (avec Retry-After)
+    error_503: float = 0.0            # probabilité de renvoyer un 503 "model loading"
+    timeout_rate: float = 0.0         # probabilité de ne pas répondre avant timeout_seconds
+    timeout_seconds: float = 60.0
+    retry_after: float = 1.0          # valeur de l'en-tête Retry-After des 429 (s)
+    seed: int = 0
+
+
+class _RequestRandom:
+    """
+    Générateur déterministe par requête : la graine dépend de (seed, contenu de la requête, n-ième occurrence).
+    Un même scénario rejoué donne les mêmes latences et erreurs, quel que soit l'entrelacement des threads.
+    """
+
+    def __init__(self, seed):
+        self.seed = seed
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def for_payload(self, raw_body):
+        digest = hashlib.sha256(raw_body).hexdigest()
+        with self._lock:
+            occurrence = self._counts.get(digest, 0)
+            self._counts[digest] = occurrence + 1
+        return random.Random(f"{self.seed}:{digest}:{occurrence}")
+
+
+def sample_latency(rng, settings):
+    mean, sigma = settings.latency_mean, settings.latency_sigma
+    if settings.latency_dist == "fixed":
+        return mean
+    if settings.latency_dist == "uniform":
+        return rng.uniform(max(0.0, mean - sigma), mean + sigma)
+    if settings.latency_dist == "normal":
+        return max(0.0, rng.gauss(mean, sigma))
+    # lognormal paramétrée par sa moyenne : mu = ln(mean) - sigma²/2
+    mu = math.log(max(mean, 1e-6)) - sigma ** 2 / 2
+    return rng.lognormvariate(mu, sigma)
+
+
+def _make_handler(settings, randoms):
+
+    class MockHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Sans TCP_NODELAY, Nagle regroupe les petits morceaux SSE et fausse les temps inter-tokens
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            # Pas de log par requête : le serveur sert à des tests de charge
+            pass
+
+        def _send_json(self, status, data, headers=None):
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_chunk(self, data):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/v1/models":
+                self._send_json(200, {"object": "list", "data": [{"id": "mock-llm", "object": "model"}]})
+            else:
+                self._send_json(404, {"error": "Not found"})
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/v1/chat/completions":
+                self._send_json(404, {"error": "Not found"})
+                return
+
+            raw_body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            try:
+                payload = json.loads(raw_body)
+            except ValueError:
+                self._send_json(400, {"error": "Invalid JSON body"})
+                return
+
+            rng = randoms.for_payload(raw_body)
+            model = payload.get("model", "mock-llm")
+
+            # Injection d'erreurs (un seul tirage pour que les probabilités soient exclusives)
+            draw = rng.random()
+            if draw < settings.error_429:
+                self._send_json(429, {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit"}},
+                                headers={"Retry-After": f"{settings.retry_after:g}"})
+                return
+            draw -= settings.error_429
+            if draw < settings.error_503:
+                self._send_json(503, {"error": f"Model {model} is currently loading", "estimated_time": settings.retry_after})
+                return
+            draw -= settings.error_503
+            if draw < settings.timeout_rate:
+                time.sleep(settings.timeout_seconds)
+                self.close_connection = True
+                return
+
+            prompt = " ".join(str(m.get("content", "")) for m in payload.get("messages", []))
+            prompt_tokens = max(1, len(prompt) // 4)
+            n_tokens = max(1, int(rng.expovariate(1 / settings.response_tokens)))
+            tokens = [rng.choice(_WORDS) + " " for _ in range(n_tokens)]
+            tokens[-1] = tokens[-1].strip() + "."
+            token_delay = 1.0 / settings.tokens_per_second if settings.tokens_per_second > 0 else 0.0
+
+            completion_id = f"chatcmpl-mock-{rng.getrandbits(48):012x}"
+            created = int(time.time())
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": n_tokens, "total_tokens": prompt_tokens + n_tokens}
+
+            time.sleep(sample_latency(rng, settings))
+
+            if not payload.get("stream"):
+                time.sleep(token_delay * n_tokens)
+                self._send_json(200, {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(tokens)},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": usage,
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(token_delay)
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                }
+                self._send_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            final = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+            self._send_chunk(f"data: {json.dumps(final)}\n\n".encode("utf-8"))
+            self._send_chunk(b"data: [DONE]\n\n")
+            self._send_chunk(b"")
+
+    return MockHandler
+
+
+def create_server(host="127.0.0.1", port=8008, settings=None):
+    """Crée le serveur (sans le démarrer) ; port=0 choisit un port libre, lisible dans server.server_port."""
+    settings = settings or MockSettings()
+    server = ThreadingHTTPServer((host, port), _make_handler(settings, _RequestRandom(settings.seed)))
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(host="127.0.0.1", port=0, settings=None):
+    """Démarre le serveur dans un thread (pratique pour un benchmark) et renvoie (server, url de l'API)."""
+    server = create_server(host, port, settings)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}/v1/chat/completions"
+
+
+def main(argv=None):
+    defaults = MockSettings()
+    parser = argparse.ArgumentParser(description="Faux provider LLM compatible OpenAI pour les tests de charge.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8008)
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "normal", "lognormal"], default=defaults.latency_dist)
+    parser.add_argument("--latency-mean", type=float, default=defaults.latency_mean, help="Délai moyen avant le premier token (s)")
+    parser.add_argument("--latency-sigma", type=float, default=defaults.latency_sigma)
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second)
+    parser.add_argument("--response-tokens", type=int, default=defaults.response_tokens, help="Longueur moyenne des réponses")
+    parser.add_argument("--error-429", type=float, default=defaults.error_429, help="Probabilité d'un 429")
+    parser.add_argument("--error-503", type=float, default=defaults.error_503, help="Probabilité d'un 503 'loading'")
+    parser.add_argument("--timeout-rate", type=float, default=defaults.timeout_rate, help="Probabilité de ne jamais répondre")
+    parser.add_argument("--timeout-seconds", type=float, default=defaults.timeout_seconds)
+    parser.add_argument("--retry-after", type=float, default=defaults.retry_after)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = parser.parse_args(argv)
+
+    settings = MockSettings(
+        latency_dist=args.latency_dist,
+        latency_mean=args.latency_mean,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second,
+        response_tokens=args.response_tokens,
+        error_429=args.error_429,
+        error_503=args.error_503,
+        timeout_rate=args.timeout_rate,
+        timeout_seconds=args.timeout_seconds,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    server = create_server(args.host, args.port, settings)
+    print(f"Mock LLM en écoute sur http://{args.host}:{server.server_port}/v1/chat/completions (seed={settings.seed})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,17 @@
 ## map du mix energetique, cad le carbon intensity par pays (KgCO2/kWh)
 
 import plotly.graph_objects as go
+import numpy as np
 import pandas as pd
-import base64
 import math
-from datetime import datetime
+from datetime import datetime, timezone
+
+from .config import COUNTRY_CARBON_INTENSITY
+from .grid_intensity import intensity_at_many
+from .utils import versioned_url
+
+LIGHTBULB_PATH = "app/static/lightbulb.png"
+
 
 def create_numeric_activity():
     # Données d'exemple pour le graphique
@@ -45,54 +52,24 @@ def create_numeric_activity():
     )
     return fig
 
-def create_carbon_intensity_map():
+def create_carbon_intensity_map(timestamp=None, static=False):
     """
     Crée une carte choroplèthe mondiale montrant l'intensité carbone par pays.
-    Données basées sur les mix énergétiques (gCO2eq/kWh).
+    Données basées sur les mix énergétiques (gCO2eq/kWh) : moyennes annuelles de config.COUNTRY_CARBON_INTENSITY,
+    remplacées par l'intensité à `timestamp` (par défaut maintenant) pour les pays couverts par le jeu
+    de données horaire (backend.grid_intensity). static=True : moyennes annuelles seules.
     """
-    
-    # Données d'intensité carbone par pays (gCO2eq/kWh)
-    # Source: Electricity Maps / IEA
-    carbon_intensity_data = {
-        'country': [
-            'France', 'Germany', 'United States', 'China', 'India', 'Japan',
-            'United Kingdom', 'Canada', 'Australia', 'Brazil', 'Russia',
-            'South Africa', 'Norway', 'Sweden', 'Spain', 'Italy', 'Poland',
-            'Netherlands', 'Belgium', 'Switzerland', 'Austria', 'Denmark',
-            'Finland', 'Portugal', 'Greece', 'Czech Republic', 'Hungary',
-            'Romania', 'Bulgaria', 'Slovakia', 'Ireland', 'New Zealand',
-            'Argentina', 'Mexico', 'Chile', 'Colombia', 'Indonesia',
-            'Thailand', 'Vietnam', 'Malaysia', 'Philippines', 'Singapore',
-            'South Korea', 'Taiwan', 'Turkey', 'Ukraine', 'Egypt',
-            'Saudi Arabia', 'United Arab Emirates', 'Israel'
-        ],
-        'code': [
-            'FRA', 'DEU', 'USA', 'CHN', 'IND', 'JPN',
-            'GBR', 'CAN', 'AUS', 'BRA', 'RUS',
-            'ZAF', 'NOR', 'SWE', 'ESP', 'ITA', 'POL',
-            'NLD', 'BEL', 'CHE', 'AUT', 'DNK',
-            'FIN', 'PRT', 'GRC', 'CZE', 'HUN',
-            'ROU', 'BGR', 'SVK', 'IRL', 'NZL',
-            'ARG', 'MEX', 'CHL', 'COL', 'IDN',
-            'THA', 'VNM', 'MYS', 'PHL', 'SGP',
-            'KOR', 'TWN', 'TUR', 'UKR', 'EGY',
-            'SAU', 'ARE', 'ISR'
-        ],
-        'intensity': [
-            60, 420, 420, 600, 700, 480,
-            220, 130, 680, 100, 480,
-            900, 20, 40, 180, 280, 780,
-            390, 180, 30, 90, 120,
-            85, 250, 380, 550, 280,
-            320, 480, 120, 350, 110,
-            380, 420, 380, 180, 720,
-            480, 520, 620, 680, 420,
-            480, 520, 420, 350, 480,
-            620, 480, 520
-        ]
-    }
-    
-    df = pd.DataFrame(carbon_intensity_data)
+    codes = list(COUNTRY_CARBON_INTENSITY)
+    if static:
+        intensity = np.array([COUNTRY_CARBON_INTENSITY[code]['intensity'] for code in codes])
+    else:
+        intensity = intensity_at_many(codes, [timestamp or datetime.now(timezone.utc)] * len(codes))
+
+    df = pd.DataFrame({
+        'country': [COUNTRY_CARBON_INTENSITY[code]['name'] for code in codes],
+        'code': [COUNTRY_CARBON_INTENSITY[code]['iso3'] for code in codes],
+        'intensity': (intensity * 1000).round(),  # kg -> g
+    })
     
     # Créer la carte choroplèthe
     fig = go.Figure(data=go.Choropleth(
@@ -164,9 +141,9 @@ def create_lightbulb_chart():
     valeurs_mwh = [3.5, 4.7, 16, 433, 1287]
 
     # --- Image ---
-    image_path = r"app/assets/lightbulb.png"
-    with open(image_path, "rb") as f:
-        img_b64 = base64.b64encode(f.read()).decode()
+    # Servie par le serveur statique de Streamlit (voir app/theme.py) : la figure ne contient que l'URL,
+    # pas cinq copies de l'image en base64
+    img_url = versioned_url(LIGHTBULB_PATH)
 
     # --- Calcul des tailles avec échelle logarithmique pour mieux voir les petites valeurs ---
     # Utilisation de log pour que les petites valeurs soient plus visibles
@@ -202,7 +179,7 @@ def create_lightbulb_chart():
         # Ajout de l'image
         fig.add_layout_image(
             dict(
-                source=f"data:image/png;base64,{img_b64}",
+                source=img_url,
                 x=x_pos,
                 y=y_pos,
                 xref="x",
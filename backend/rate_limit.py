@@ -0,0 +1,212 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import httpx
+from openai import APIStatusError, APIConnectionError
+from groq import APIStatusError as GroqAPIStatusError, APIConnectionError as GroqAPIConnectionError
+from google.genai import errors as genai_errors
+
+from .config import RATE_LIMITS, RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY
+from .tokens import estimate_tokens
+
+# Codes HTTP pour lesquels un nouvel essai a du sens (timeout, conflit, rate limit, erreurs serveur)
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504, 520, 521, 522, 523, 524, 529}
+
+
+class RetryableHTTPError(Exception):
+    """Réponse HTTP brute (httpx) dont le code justifie un nouvel essai."""
+
+    def __init__(self, response):
+        super().__init__(f"HTTP {response.status_code}")
+        self.response = response
+        self.status_code = response.status_code
+
+
+class TokenBucket:
+    """Seau à jetons thread-safe : `rate_per_minute` jetons par minute, au plus `capacity` en réserve."""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount=1):
+        """Prélève `amount` jetons (quitte à s'endetter) et renvoie le temps d'attente nécessaire (s)."""
+        # Une demande plus grosse que le seau ne doit pas bloquer indéfiniment
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def adjust(self, delta):
+        """Débite (delta > 0) ou rembourse (delta < 0) des jetons après coup, sans attendre."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class ProviderLimiter:
+    """
+    Limites d'un provider : requêtes/minute et tokens/minute, partagées par tous les threads.
+    Un 429 avec Retry-After suspend tous les appels du provider jusqu'à l'échéance.
+    """
+
+    def __init__(self, rpm=None, tpm=None):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        waits = [0.0]
+        if self.requests is not None:
+            waits.append(self.requests.reserve(1))
+        if self.tokens is not None:
+            waits.append(self.tokens.reserve(tokens))
+        with self._lock:
+            waits.append(self._paused_until - time.monotonic())
+        delay = max(waits)
+        if delay > 0:
+            time.sleep(delay)
+
+    def settle(self, reserved, used):
+        """
+        Ajuste le seau de tokens une fois l'usage réel connu : `reserved` tokens ont été prélevés avant l'appel
+        (estimation du prompt), `used` ont été réellement consommés (prompt + complétion).
+        """
+        if self.tokens is not None:
+            self.tokens.adjust(used - min(reserved, self.tokens.capacity))
+
+    def pause(self, seconds):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_limiter(provider):
+    with _LIMITERS_LOCK:
+        if provider not in _LIMITERS:
+            limits = RATE_LIMITS.get(provider, {})
+            _LIMITERS[provider] = ProviderLimiter(rpm=limits.get("rpm"), tpm=limits.get("tpm"))
+        return _LIMITERS[provider]
+
+
+def settle_tokens(provider, reserved, usage, response=None):
+    """
+    Rapproche le seau TPM du provider de l'usage réel d'un appel réussi : les quotas comptent le prompt
+    et la complétion, alors que seule l'estimation du prompt est prélevée avant l'appel.
+    Sans compteurs du provider, la complétion est estimée à partir du texte de la réponse.
+    """
+    prompt_tokens = usage.get("prompt_tokens")
+    completion_tokens = usage.get("completion_tokens")
+    if completion_tokens is None:
+        completion_tokens = estimate_tokens(response) if isinstance(response, str) else 0
+    used = (prompt_tokens if prompt_tokens is not None else reserved) + completion_tokens
+    get_limiter(provider).settle(reserved, used)
+
+
+def _parse_retry_after(headers):
+    if not headers:
+        return None
+    # Extension OpenAI/Groq : délai en millisecondes
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        # Format date HTTP (ex : "Wed, 21 Oct 2015 07:28:00 GMT")
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def _hf_estimated_time(response):
+    # HF indique parfois le temps de chargement restant d'un modèle : {"error": "...loading", "estimated_time": 20.0}
+    try:
+        data = response.json()
+        if isinstance(data, dict) and "estimated_time" in data:
+            return float(data["estimated_time"])
+    except ValueError:
+        pass
+    return None
+
+
+def retry_info(e):
+    """
+    Analyse une exception levée par un provider.
+    Renvoie (retryable, retry_after) où retry_after est le délai imposé par le serveur en secondes, ou None.
+    """
+    if isinstance(e, (APIStatusError, GroqAPIStatusError)):
+        return e.status_code in RETRYABLE_STATUSES, _parse_retry_after(e.response.headers)
+    if isinstance(e, (APIConnectionError, GroqAPIConnectionError)):
+        # Inclut les timeouts
+        return True, None
+    if isinstance(e, genai_errors.APIError):
+        headers = getattr(e.response, "headers", None)
+        return e.code in RETRYABLE_STATUSES, _parse_retry_after(headers)
+    if isinstance(e, RetryableHTTPError):
+        retry_after = _parse_retry_after(e.response.headers)
+        if retry_after is None and e.status_code == 503:
+            retry_after = _hf_estimated_time(e.response)
+        return True, retry_after
+    if isinstance(e, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)):
+        return True, None
+    return False, None
+
+
+def backoff_delay(attempt, retry_after=None):
+    """
+    Délai avant l'essai suivant : backoff exponentiel avec "full jitter", plafonné à RETRY_MAX_DELAY.
+    Si le serveur impose un Retry-After, on l'attend au minimum.
+    """
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+    if retry_after is not None:
+        delay = min(RETRY_MAX_DELAY, retry_after) + random.uniform(0, RETRY_BASE_DELAY)
+    return delay
+
+
+def call_with_retry(provider, attempt_fn, tokens=1, max_attempts=None):
+    """
+    Exécute attempt_fn() sous le rate limiter du provider et la retente sur les erreurs temporaires.
+    La dernière exception est relevée si tous les essais échouent, pour que l'appelant la formate.
+    """
+    limiter = get_limiter(provider)
+    max_attempts = max_attempts or RETRY_MAX_ATTEMPTS
+
+    for attempt in range(max_attempts):
+        limiter.acquire(tokens)
+        try:
+            return attempt_fn()
+        except Exception as e:
+            retryable, retry_after = retry_info(e)
+            if not retryable or attempt == max_attempts - 1:
+                raise
+            delay = backoff_delay(attempt, retry_after)
+            if retry_after is not None:
+                # Le serveur a fixé une échéance : elle vaut pour tous les appels en cours vers ce provider
+                limiter.pause(delay)
+            print(f"Info {provider} : erreur temporaire ({e}), nouvel essai {attempt + 2}/{max_attempts} dans {delay:.1f} s.")
+            time.sleep(delay)
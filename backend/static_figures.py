@@ -0,0 +1,152 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+
+import plotly
+import plotly.io as pio
+
+from . import plot
+from .config import COUNTRY_CARBON_INTENSITY, FIGURES_DIR
+from .grid_intensity import get_dataset
+
+# Graphiques de l'accueil, construits à partir de données en dur (backend/plot.py) : inutile de les
+# reconstruire (ni de relire lightbulb.png pour son empreinte) à chaque chargement de page.
+#
+# Format sur disque :
+#   <FIGURES_DIR>/manifest.json   empreinte des sources, version de plotly, date de construction, fichiers
+#   <FIGURES_DIR>/<nom>.json      figure plotly sérialisée (plotly.io.to_json)
+# Construction (à relancer après une modification de backend/plot.py ou des images) :
+#   python -m backend.static_figures build
+# Chaque figure est relue au premier affichage puis gardée en mémoire pour tout le process.
+# Sans fichiers à jour, elle est construite en mémoire à la place.
+
+STATIC_FIGURES = {
+    "adoption": plot.create_adoption_chart,
+    "lightbulb": plot.create_lightbulb_chart,
+    "numeric_activity": plot.create_numeric_activity,
+    "camenbert": plot.create_camenbert,
+    # Moyennes annuelles ; avec un jeu de données horaire, voir carbon_intensity_map
+    "carbon_intensity_map": lambda: plot.create_carbon_intensity_map(static=True),
+}
+
+# Entrées des graphiques, en plus de leurs données en dur
+SOURCE_ASSETS = (plot.LIGHTBULB_PATH,)
+
+_FIGURES = {}
+_FIGURES_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def source_hash():
+    """Empreinte de tout ce dont dépendent les figures : code de plot.py, images, table des pays, version de plotly."""
+    digest = hashlib.sha256()
+    for path in (plot.__file__, *SOURCE_ASSETS):
+        digest.update(Path(path).read_bytes() if os.path.exists(path) else b"")
+    digest.update(json.dumps(COUNTRY_CARBON_INTENSITY, sort_keys=True).encode("utf-8"))
+    digest.update(plotly.__version__.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _read_manifest(root):
+    path = Path(root) / "manifest.json"
+    if not path.is_file():
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Graphiques précalculés : manifest illisible ({e}).")
+        return None
+
+
+def _load(name, root):
+    manifest = _read_manifest(root)
+    if manifest is not None and manifest.get("source_hash") == source_hash() and name in manifest["figures"]:
+        try:
+            return pio.from_json((Path(root) / manifest["figures"][name]).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"Graphique précalculé {name} illisible ({e}), reconstruction.")
+    else:
+        print(f"Graphique précalculé {name} absent ou périmé, reconstruction "
+              "(python -m backend.static_figures build pour le précalculer).")
+    return STATIC_FIGURES[name]()
+
+
+def load_figure(name, root=FIGURES_DIR):
+    """
+    Figure statique `name` (voir STATIC_FIGURES), lue une seule fois par process.
+    La figure renvoyée est partagée entre toutes les sessions : ne pas la modifier.
+    """
+    key = (str(root), name)
+    figure = _FIGURES.get(key)
+    if figure is None:
+        with _FIGURES_LOCK:
+            figure = _FIGURES.get(key)
+            if figure is None:
+                if name not in STATIC_FIGURES:
+                    raise ValueError(f"Figure {name} not supported.")
+                figure = _load(name, root)
+                _FIGURES[key] = figure
+    return figure
+
+
+@lru_cache(maxsize=2)
+def _hourly_map(hour):
+    return plot.create_carbon_intensity_map(hour)
+
+
+def carbon_intensity_map(root=FIGURES_DIR):
+    """
+    Carte de l'intensité carbone : la version précalculée (moyennes annuelles), ou, si un jeu de données
+    horaire est disponible, la carte de l'heure en cours, construite une fois par heure et par process.
+    """
+    if get_dataset() is None:
+        return load_figure("carbon_intensity_map", root)
+    return _hourly_map(datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0))
+
+
+def build_figures(root=FIGURES_DIR):
+    """Sérialise toutes les figures de STATIC_FIGURES dans `root` et renvoie le manifest écrit."""
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    manifest = {
+        "source_hash": source_hash(),
+        "plotly": plotly.__version__,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "figures": {},
+    }
+    for name, builder in STATIC_FIGURES.items():
+        filename = f"{name}.json"
+        # Écriture dans un fichier temporaire puis renommage : un lecteur ne voit jamais de figure tronquée
+        tmp = root / f".{filename}.tmp"
+        tmp.write_text(pio.to_json(builder(), validate=False), encoding="utf-8")
+        os.replace(tmp, root / filename)
+        manifest["figures"][name] = filename
+
+    # Manifest en dernier : il ne désigne que des fichiers complets
+    tmp = root / ".manifest.json.tmp"
+    tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp, root / "manifest.json")
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Graphiques statiques de l'accueil, précalculés en JSON.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Sérialise les graphiques dans le dossier des figures")
+    build.add_argument("--root", default=FIGURES_DIR)
+    args = parser.parse_args(argv)
+
+    manifest = build_figures(args.root)
+    for name, filename in manifest["figures"].items():
+        size = (Path(args.root) / filename).stat().st_size
+        print(f"  {name} : {filename} ({size / 1024:.0f} Ko)")
+    print(f"Graphiques écrits dans {args.root} (sources {manifest['source_hash'][:12]})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+import httpx
+
+# Décomposition de la latence d'un appel LLM : connexion TCP, TLS, envoi de la requête,
+# premier octet et dernier octet de la réponse. Les repères viennent des événements "trace"
+# de httpcore (request.extensions["trace"]), branchés par TracingTransport sur tous les clients
+# de backend.clients. Toutes les mesures utilisent perf_counter_ns (horloge monotone, en ns).
+
+_CURRENT_TRACE = contextvars.ContextVar("llm_call_trace", default=None)
+
+# Événement httpcore (sans le préfixe "connection." / "http11." / "http2.") -> repère enregistré
+_HTTP_EVENTS = {
+    "connect_tcp.started": "connect_start",
+    "connect_tcp.complete": "connect_end",
+    "start_tls.started": "tls_start",
+    "start_tls.complete": "tls_end",
+    "send_request_headers.started": "request_start",
+    "send_request_body.complete": "request_sent",
+    "receive_response_headers.complete": "first_byte",
+    "receive_response_body.complete": "last_byte",
+}
+
+
+class CallTrace:
+    """
+    Repères temporels d'un appel, en nanosecondes (perf_counter_ns).
+    Le chrono repart à chaque essai (restart) : après des retries, seuls les repères
+    de l'essai qui a abouti sont conservés, comme pour tdev.
+    """
+
+    def __init__(self):
+        self.restart()
+
+    def restart(self):
+        self.start_ns = time.perf_counter_ns()
+        self.marks = {}
+        return self.start_ns
+
+    def mark(self, name):
+        self.marks[name] = time.perf_counter_ns()
+
+    def on_http_event(self, event_name, info):
+        # Callback de l'extension "trace" de httpcore, ex : "http11.receive_response_headers.complete"
+        name = _HTTP_EVENTS.get(event_name.split(".", 1)[-1])
+        if name is not None:
+            self.marks[name] = time.perf_counter_ns()
+
+    def offset(self, name):
+        """Instant du repère `name` en secondes depuis le début de l'essai, ou None."""
+        if name not in self.marks:
+            return None
+        return (self.marks[name] - self.start_ns) / 1e9
+
+    def _span(self, begin, end):
+        if begin not in self.marks or end not in self.marks:
+            return None
+        return (self.marks[end] - self.marks[begin]) / 1e9
+
+    def phases(self):
+        """
+        Décomposition de l'essai, en secondes :
+          - connect, tls : durées de la connexion TCP et du handshake TLS (0 si connexion réutilisée)
+          - request_sent, first_byte, last_byte : instants depuis le début de l'essai
+          - server : fenêtre requête envoyée -> premier octet, c'est-à-dire le temps passé côté serveur
+            (file d'attente + calcul) pour une réponse non streamée ; None si le transport n'a rien tracé.
+        """
+        reused = "connect_start" not in self.marks
+        phases = {
+            "connection_reused": reused,
+            "connect": self._span("connect_start", "connect_end") or 0.0,
+            "tls": self._span("tls_start", "tls_end") or 0.0,
+            "request_sent": self.offset("request_sent"),
+            "first_byte": self.offset("first_byte"),
+            "last_byte": self.offset("last_byte"),
+        }
+        phases["server"] = self._span("request_sent", "first_byte")
+        return phases
+
+
+def current_trace():
+    return _CURRENT_TRACE.get()
+
+
+@contextmanager
+def activate(trace):
+    """Rend `trace` courante le temps du bloc (les requêtes HTTP émises dedans y sont rattachées)."""
+    token = _CURRENT_TRACE.set(trace)
+    try:
+        yield trace
+    finally:
+        _CURRENT_TRACE.reset(token)
+
+
+@contextmanager
+def trace_call():
+    """Ouvre une CallTrace pour un appel : with trace_call() as trace: ... trace.phases()."""
+    with activate(CallTrace()) as trace:
+        yield trace
+
+
+def restart_trace():
+    """Début d'un essai : remet à zéro la trace courante et renvoie l'instant de départ (ns)."""
+    trace = _CURRENT_TRACE.get()
+    if trace is not None:
+        return trace.restart()
+    return time.perf_counter_ns()
+
+
+def elapsed_since(start_ns):
+    """Secondes écoulées depuis start_ns (perf_counter_ns)."""
+    return (time.perf_counter_ns() - start_ns) / 1e9
+
+
+class TracingTransport(httpx.HTTPTransport):
+    """Transport httpx qui rattache chaque requête à la CallTrace courante (s'il y en a une)."""
+
+    def handle_request(self, request):
+        trace = _CURRENT_TRACE.get()
+        if trace is not None:
+            # Le callback est lié à la trace : les événements du corps (lu plus tard, éventuellement
+            # dans un autre thread en streaming) arrivent bien dans la trace de cet appel
+            request.extensions["trace"] = trace.on_http_event
+        return super().handle_request(request)
@@ -0,0 +1,8 @@
+# Estimation du nombre de tokens quand le provider ne renvoie pas ses compteurs.
+# Module sans dépendance, partagé par le rate limiter (backend.rate_limit) et les calculs d'empreinte
+# (backend.compute_LLM_footprint) : recalculer un historique ne charge ni les SDK ni le limiteur.
+
+
+def estimate_tokens(text):
+    """Estimation grossière (~4 caractères par token), au moins 1."""
+    return max(1, len(text) // 4)
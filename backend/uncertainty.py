@@ -0,0 +1,227 @@
+import zlib
+from functools import lru_cache
+
+import numpy as np
+
+from .config import (
+    HARDWARE_PROFILES,
+    PUE,
+    PUE_UNCERTAINTY,
+    CARBON_INTENSITY,
+    CARBON_INTENSITY_UNCERTAINTY,
+    FABRICATION_CO2,
+    FABRICATION_CO2_UNCERTAINTY,
+    CHIP_EMBODIED_UNCERTAINTY,
+    LIFETIME_HOURS,
+    CHIP_SPECS,
+    DEFAULT_CHIP,
+    CHIP_UTILIZATION_UNCERTAINTY,
+    MONTE_CARLO_SAMPLES,
+    MONTE_CARLO_SEED,
+)
+from .compute_LLM_footprint import DEFAULT_PROFILE, DEFAULT_BATCHING, batching_share, billable_seconds, call_tokens
+
+# Intervalles d'incertitude des empreintes par Monte Carlo vectorisé.
+#
+# Chaque paramètre incertain (PUE, intensité carbone, fabrication des puces et des serveurs, puissance et nombre de puces,
+# paramètres actifs, taux d'utilisation, séquences simultanées) a une "case" de tirages : un tableau de MONTE_CARLO_SAMPLES
+# valeurs précalculé une seule fois (graine fixe) puis réutilisé à chaque rerun de Streamlit.
+# Le i-ème tirage de chaque case forme un "monde possible" : deux appels au même modèle, ou deux modèles
+# de la même région, partagent le même PUE et la même intensité carbone dans un monde donné, ce qui
+# corrèle correctement les erreurs quand on somme les appels d'une session.
+#
+# L'empreinte d'un appel est linéaire en sa durée facturée (moteur temps) ou en ses tokens (moteur FLOPs) :
+# on précalcule par modèle les tirages du taux gCO2e / seconde ou / token, et un intervalle n'est
+# plus qu'une multiplication suivie d'un calcul de quantiles.
+
+PERCENTILES = (5, 50, 95)
+
+
+@lru_cache(maxsize=None)
+def _standard_draws(slot, kind, n):
+    """Tirages uniformes [0, 1) ou normaux centrés réduits de la case `slot`, stables d'un rerun à l'autre."""
+    rng = np.random.default_rng([MONTE_CARLO_SEED, zlib.crc32(slot.encode("utf-8"))])
+    draws = rng.random(n) if kind == "uniform" else rng.standard_normal(n)
+    draws.flags.writeable = False
+    return draws
+
+
+def sample_parameter(dist, point, slot, n=MONTE_CARLO_SAMPLES):
+    """
+    Tirages d'un paramètre selon sa distribution (voir les *_UNCERTAINTY de config).
+    Sans distribution, renvoie la valeur ponctuelle (un scalaire, qui se diffuse dans les calculs numpy).
+    """
+    if dist is None:
+        return point
+
+    kind, *args = dist
+    if kind == "uniform":
+        low, high = args
+        return low + _standard_draws(slot, "uniform", n) * (high - low)
+    if kind == "triangular":
+        # Inverse de la fonction de répartition, appliqué aux tirages uniformes
+        low, mode, high = args
+        u = _standard_draws(slot, "uniform", n)
+        split = (mode - low) / (high - low)
+        return np.where(
+            u < split,
+            low + np.sqrt(u * (high - low) * (mode - low)),
+            high - np.sqrt((1 - u) * (high - low) * (high - mode)),
+        )
+    if kind == "normal":
+        mean, std = args
+        # Quantités physiques : pas de valeurs négatives
+        return np.maximum(0.0, mean + std * _standard_draws(slot, "normal", n))
+    if kind == "lognormal":
+        median, factor = args
+        return median * factor ** _standard_draws(slot, "normal", n)
+    raise ValueError(f"Distribution {kind} not supported.")
+
+
+def _model_parameter(model_name, profile, key, n):
+    dist = profile.get("uncertainty", {}).get(key)
+    return sample_parameter(dist, profile.get(key), f"{model_name}:{key}", n)
+
+
+@lru_cache(maxsize=None)
+def _shared_samples(n):
+    """Tirages des paramètres communs à tous les modèles : PUE, fabrication d'un serveur hôte."""
+    pue = sample_parameter(PUE_UNCERTAINTY, PUE, "pue", n)
+    host_fabrication = sum(
+        sample_parameter(FABRICATION_CO2_UNCERTAINTY.get(component), value, f"fabrication:{component}", n)
+        for component, value in FABRICATION_CO2.items()
+    )
+    return pue, host_fabrication
+
+
+@lru_cache(maxsize=None)
+def rate_samples(model_name, engine="time", attribution="whole", n=MONTE_CARLO_SAMPLES):
+    """
+    Tirages de l'empreinte unitaire d'un modèle, en gCO2e par seconde facturée (moteur temps)
+    ou par token traité (moteur FLOPs). attribution : "whole" ou "batched", comme compute_carbon.
+
+    Renvoie (unité, tirages) avec unité "seconds" ou "tokens" ; comme compute_carbon, le moteur FLOPs
+    retombe sur le moteur temps quand le nombre de paramètres du modèle est inconnu.
+    """
+    profile = HARDWARE_PROFILES.get(model_name, DEFAULT_PROFILE)
+    prefix = model_name if model_name in HARDWARE_PROFILES else "default"
+    pue, host_fabrication = _shared_samples(n)
+    chip_type = profile.get("chip_type") if profile.get("chip_type") in CHIP_SPECS else DEFAULT_CHIP
+    chip = CHIP_SPECS[chip_type]
+
+    region = profile.get("country", "default")
+    carbon_intensity = sample_parameter(
+        CARBON_INTENSITY_UNCERTAINTY.get(region), CARBON_INTENSITY[region], f"carbon_intensity:{region}", n
+    )
+    device_count = _model_parameter(prefix, profile, "device_count", n)
+    device_power_kw = _model_parameter(prefix, profile, "device_power_kw", n)
+    chip_embodied_kg = sample_parameter(
+        CHIP_EMBODIED_UNCERTAINTY.get(chip_type), chip["embodied_kg"], f"embodied:{chip_type}", n
+    )
+
+    # gCO2e par seconde d'usage de toutes les puces allouées (et de leurs serveurs hôtes, voir embodied_bill_of_materials)
+    operational_per_s = device_count * device_power_kw * pue * carbon_intensity / 3600 * 1000
+    fabrication = device_count * (chip_embodied_kg + host_fabrication / chip["chips_per_server"])
+    embodied_per_s = fabrication / LIFETIME_HOURS / 3600 * 1000
+
+    params_key = "active_params_b" if profile.get("active_params_b") else "params_b"
+    if engine != "flops" or not profile.get(params_key):
+        if attribution == "batched":
+            concurrent_sequences = sample_parameter(
+                profile.get("uncertainty", {}).get("concurrent_sequences"),
+                profile.get("batching", DEFAULT_BATCHING)["concurrent_sequences"],
+                f"{prefix}:concurrent_sequences", n,
+            )
+            share = batching_share(model_name, concurrent_sequences)
+            operational_per_s = operational_per_s * share["energy_factor"]
+            embodied_per_s = embodied_per_s * share["time_factor"]
+        return "seconds", np.broadcast_to(operational_per_s + embodied_per_s, (n,))
+
+    # Moteur FLOPs : secondes de puce par token, puis mêmes facteurs qu'en temps mesuré pour une seule puce
+    utilization = sample_parameter(CHIP_UTILIZATION_UNCERTAINTY, chip["utilization"], f"utilization:{chip_type}", n)
+    active_params_b = _model_parameter(prefix, profile, params_key, n)
+    chip_seconds_per_token = 2 * active_params_b * 1e9 / (chip["peak_tflops"] * 1e12 * utilization)
+
+    per_token = chip_seconds_per_token * (operational_per_s + embodied_per_s) / device_count
+    return "tokens", np.broadcast_to(per_token, (n,))
+
+
+def _quantiles(samples):
+    return {f"p{p}": float(value) for p, value in zip(PERCENTILES, np.percentile(samples, PERCENTILES))}
+
+
+@lru_cache(maxsize=None)
+def _rate_quantiles(model_name, engine, attribution, n):
+    unit, samples = rate_samples(model_name, engine, attribution, n)
+    return unit, _quantiles(samples)
+
+
+def call_interval(model_name, seconds, tokens, engine="time", cache_hit=False, attribution="whole",
+                  n=MONTE_CARLO_SAMPLES):
+    """
+    Intervalle {"p5", "p50", "p95"} (gCO2e) de l'empreinte d'un appel.
+    seconds : durée facturée (voir billable_seconds) ; tokens : tokens d'entrée + de sortie.
+    """
+    if cache_hit:
+        return {f"p{p}": 0.0 for p in PERCENTILES}
+    unit, quantiles = _rate_quantiles(model_name, engine, attribution, n)
+    quantity = tokens if unit == "tokens" else seconds
+    return {name: value * quantity for name, value in quantiles.items()}
+
+
+def totals_interval(totals, n=MONTE_CARLO_SAMPLES):
+    """
+    Intervalle {"p5", "p50", "p95"} (gCO2e) à partir de quantités déjà sommées : dicts {"model", "engine",
+    "attribution", "seconds", "tokens"} (voir usage_totals des stores de backend.utils).
+
+    Les quantités sont combinées aux tirages de chaque (modèle, moteur, attribution) en un seul produit
+    matriciel : le coût ne dépend que du nombre de groupes, pas du nombre d'appels.
+    """
+    quantities = {}
+    for total in totals:
+        key = (total["model"], total["engine"], total["attribution"])
+        unit, _ = rate_samples(*key, n=n)
+        quantities[key] = quantities.get(key, 0.0) + (total["tokens"] if unit == "tokens" else total["seconds"])
+
+    if not quantities:
+        return {f"p{p}": 0.0 for p in PERCENTILES}
+
+    samples = np.array(list(quantities.values())) @ np.stack(
+        [rate_samples(*key, n=n)[1] for key in quantities]
+    )
+    return _quantiles(samples)
+
+
+def session_interval(entries, engine="time", attribution="whole", n=MONTE_CARLO_SAMPLES):
+    """
+    Intervalle {"p5", "p50", "p95"} (gCO2e) du total d'une session (entrées de save_session_entry).
+
+    Chaque entrée est comptée avec le moteur et l'attribution qui ont servi pour elle
+    (clés "engine" et "attribution"), `engine` et `attribution` sinon.
+    """
+    totals = []
+    for entry in entries:
+        # Réponse gardée en clair (anciennes entrées) ou rangée dans le blob store (response_hash)
+        if entry.get("cache_hit") or not (isinstance(entry.get("response"), str) or entry.get("response_hash")):
+            continue
+        totals.append({
+            "model": entry["model"],
+            "engine": entry.get("engine", engine),
+            "attribution": entry.get("attribution", attribution),
+            "seconds": entry.get("billable_seconds", entry["tdev_seconds"]),
+            "tokens": entry.get("tokens") or sum(call_tokens(entry.get("prompt"), entry.get("response"), entry)),
+        })
+    return totals_interval(totals, n)
+
+
+def result_interval(model_name, prompt, response, tdev, timings=None, usage=None, engine="time", cache_hit=False,
+                    attribution="whole"):
+    """call_interval à partir des mêmes arguments que compute_carbon."""
+    return call_interval(
+        model_name,
+        billable_seconds(tdev, timings),
+        sum(call_tokens(prompt, response, usage)),
+        engine=engine,
+        cache_hit=cache_hit,
+        attribution=attribution,
+    )
@@ -1,6 +1,27 @@
+import atexit
+import hashlib
 import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
 
+from .config import (
+    JSONL_FSYNC_EVERY,
+    JSONL_FSYNC_INTERVAL,
+    HISTORY_RETENTION_DAYS,
+    STORAGE_BACKEND,
+    STORAGE_PATH,
+    SESSION_LOG_PATH,
+    RUNS_LOG_PATH,
+    PROMPTS_LOG_PATH,
+    SKETCHES_PATH,
+)
+from .aggregates import SKETCH_METRICS, DDSketch, SessionAggregates, sketch_key
+
 def load_json(path: Path):
     try:
         # Spécifie l'encodage UTF-8 lors de la lecture
@@ -17,4 +38,760 @@ def load_json(path: Path):
 def save_json(path: Path, data): # Ajout de l'annotation de type pour clarifier
     # Spécifie l'encodage UTF-8 lors de l'écriture
     # Et utilise ensure_ascii=False pour éviter l'échappement des caractères non-ASCII
-    path.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding='utf-8')
\ No newline at end of file
+    path.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding='utf-8')
+
+
+@lru_cache(maxsize=None)
+def _file_digest(path, mtime_ns):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()[:12]
+
+
+def versioned_url(path, url=None):
+    """
+    URL `url` (par défaut `path`) suffixée de l'empreinte du fichier `path`, pour invalider le cache du navigateur.
+    Le fichier n'est relu que si sa date de modification change ; s'il est absent, l'URL est renvoyée sans suffixe.
+    """
+    path = Path(path)
+    url = str(path) if url is None else url
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        print(f"Fichier statique {path} introuvable.")
+        return url
+    return f"{url}?v={_file_digest(str(path), mtime_ns)}"
+
+
+def _decode_line(line, path):
+    try:
+        return json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        # Typiquement une dernière ligne tronquée par un arrêt brutal : on l'ignore
+        print(f"Warning: Failed to decode a JSONL line from {path}. Skipping it.")
+        return None
+
+
+class JsonlStore:
+    """
+    Journal append-only au format JSONL : un enregistrement JSON par ligne.
+
+    Ajouter une entrée coûte une écriture de ligne, quelle que soit la taille du fichier (au lieu de relire
+    et réécrire tout un tableau JSON). Chaque ajout est flushé, donc visible des lecteurs ; le fsync sur disque
+    est groupé : tous les fsync_every ajouts ou après fsync_interval secondes, et à la fermeture.
+
+    Lecture : itération en streaming (__iter__), dernières entrées en lisant le fichier depuis la fin (tail),
+    accès direct à la i-ème entrée via un index des offsets de début de ligne (__getitem__), construit au
+    premier besoin puis complété de façon incrémentale.
+    """
+
+    def __init__(self, path, fsync_every=JSONL_FSYNC_EVERY, fsync_interval=JSONL_FSYNC_INTERVAL):
+        self.path = Path(path)
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._file = None
+        self._pending = 0               # ajouts pas encore fsyncés
+        self._last_sync = time.monotonic()
+        self._offsets = []              # offset (octets) du début de chaque ligne complète
+        self._indexed_until = 0         # octets déjà parcourus par l'index
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    # -- Écriture ---------------------------------------------------------
+
+    def _open(self):
+        if self._file is None or self._file.closed:
+            self._file = open(self.path, "ab")
+            end = self._file.seek(0, os.SEEK_END)
+            if end:
+                # Dernière ligne tronquée (arrêt pendant une écriture) : on la termine pour ne pas y coller la suivante
+                with open(self.path, "rb") as f:
+                    f.seek(end - 1)
+                    if f.read(1) != b"\n":
+                        self._file.write(b"\n")
+        return self._file
+
+    def _sync(self, f):
+        os.fsync(f.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def append(self, record):
+        """Ajoute un enregistrement (dict sérialisable en JSON) en fin de fichier."""
+        return self.extend([record])
+
+    def extend(self, records):
+        """Ajoute plusieurs enregistrements en une seule écriture."""
+        records = list(records)
+        data = b"".join(
+            json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n" for record in records
+        )
+        if not data:
+            return
+        with self._lock:
+            f = self._open()
+            start = f.seek(0, os.SEEK_END)
+            f.write(data)
+            f.flush()
+            if self._indexed_until == start:
+                # L'index est à jour : on y ajoute les nouvelles lignes sans relire le fichier
+                position = start
+                for line in data.splitlines(keepends=True):
+                    self._offsets.append(position)
+                    position += len(line)
+                self._indexed_until = position
+            self._pending += len(records)
+            if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync(f)
+
+    def remove(self, predicate):
+        """Supprime les enregistrements pour lesquels predicate(record) est vrai (réécriture complète du fichier)."""
+        with self._lock:
+            # Lecture et réécriture sous le même verrou : aucun ajout concurrent n'est perdu
+            self._rewrite([record for record in self if not predicate(record)])
+
+    def rewrite(self, records):
+        """Remplace tout le contenu du journal (fichier temporaire puis renommage atomique)."""
+        with self._lock:
+            self._rewrite(records)
+
+    def _rewrite(self, records):
+        if self._file is not None and not self._file.closed:
+            self._file.close()
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+            self._sync(f)
+        os.replace(tmp, self.path)
+        self._offsets = []
+        self._indexed_until = 0
+
+    def flush(self):
+        """Force l'écriture sur disque des ajouts en attente."""
+        with self._lock:
+            if self._file is not None and not self._file.closed and self._pending:
+                self._sync(self._file)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None and not self._file.closed:
+                if self._pending:
+                    self._sync(self._file)
+                self._file.close()
+
+    def clear(self):
+        """Vide le journal."""
+        with self._lock:
+            if self._file is not None and not self._file.closed:
+                self._file.close()
+            with open(self.path, "wb") as f:
+                self._sync(f)
+            self._offsets = []
+            self._indexed_until = 0
+
+    # -- Lecture ----------------------------------------------------------
+
+    def __iter__(self):
+        """Parcourt les enregistrements du plus ancien au plus récent, sans charger tout le fichier."""
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # ligne en cours d'écriture
+                record = _decode_line(line, self.path)
+                if record is not None:
+                    yield record
+
+    def tail(self, n, block_size=64 * 1024):
+        """Les n derniers enregistrements (du plus ancien au plus récent), en lisant le fichier depuis la fin."""
+        if n <= 0:
+            return []
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return []
+        with f:
+            end = f.seek(0, os.SEEK_END)
+            position, data = end, b""
+            # On recule bloc par bloc jusqu'à avoir n lignes complètes (n + 1 sauts de ligne, ou le début)
+            while position > 0 and data.count(b"\n") <= n:
+                step = min(block_size, position)
+                position -= step
+                f.seek(position)
+                data = f.read(step) + data
+        lines = data.split(b"\n")
+        # Dernier élément : ligne en cours d'écriture (ou vide) ; premier : ligne partielle si on n'est pas au début
+        lines = lines[:-1] if position == 0 else lines[1:-1]
+        records = (_decode_line(line, self.path) for line in lines[-n:])
+        return [record for record in records if record is not None]
+
+    def _refresh_index(self):
+        """Complète l'index des offsets avec les lignes ajoutées depuis le dernier passage (autre process compris)."""
+        try:
+            size = self.path.stat().st_size
+        except FileNotFoundError:
+            size = 0
+        if size < self._indexed_until:
+            # Fichier vidé ou remplacé : on repart de zéro
+            self._offsets, self._indexed_until = [], 0
+        if size == self._indexed_until:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._indexed_until)
+            position = self._indexed_until
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self._offsets.append(position)
+                position += len(line)
+        self._indexed_until = position
+
+    def __len__(self):
+        with self._lock:
+            self._refresh_index()
+            return len(self._offsets)
+
+    def __getitem__(self, index):
+        """i-ème enregistrement (indices négatifs acceptés), lu directement à son offset."""
+        with self._lock:
+            self._refresh_index()
+            offset = self._offsets[index]
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return _decode_line(f.readline(), self.path)
+
+    def read_range(self, start, stop):
+        """Enregistrements d'indices [start, stop), lus d'un seul tenant à partir de l'offset de start."""
+        with self._lock:
+            self._refresh_index()
+            offsets = self._offsets[start:stop]
+        if not offsets:
+            return []
+        with open(self.path, "rb") as f:
+            f.seek(offsets[0])
+            lines = [f.readline() for _ in offsets]
+        records = (_decode_line(line, self.path) for line in lines)
+        return [record for record in records if record is not None]
+
+
+def prune_sessions(log, cutoff):
+    """
+    Supprime de `log` (JsonlStore) les enregistrements des sessions dont la dernière activité ("timestamp",
+    secondes epoch) est antérieure à cutoff ; un enregistrement sans date compte comme ancien.
+    Renvoie le nombre d'enregistrements supprimés.
+    """
+    last_seen = {}
+    for record in log:
+        session_id = record.get("session_id")
+        last_seen[session_id] = max(last_seen.get(session_id, 0), record.get("timestamp") or 0)
+    stale = {session_id for session_id, timestamp in last_seen.items() if timestamp < cutoff}
+    if not stale:
+        return 0
+    before = len(log)
+    log.remove(lambda record: record.get("session_id") in stale)
+    return before - len(log)
+
+
+# Registre process-wide : un seul JsonlStore (donc un seul descripteur et un seul verrou) par fichier
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_jsonl_store(path):
+    """Renvoie le JsonlStore partagé de `path`, en le créant au premier appel."""
+    key = str(Path(path).resolve())
+    store = _STORES.get(key)
+    if store is None:
+        with _STORES_LOCK:
+            store = _STORES.get(key)
+            if store is None:
+                store = JsonlStore(path)
+                _STORES[key] = store
+    return store
+
+
+# -----------------------------------------------------------------------------
+# Historique des appels LLM et des exécutions CodeCarbon
+#
+# Deux implémentations de la même interface, choisies par STORAGE_BACKEND (voir get_session_store) :
+#   - SqliteStore : base SQLite en WAL, requêtes indexées (statistiques, comparaison par modèle, pagination) ;
+#   - JsonlSessionStore : journaux JSONL, chaque requête est un parcours du fichier.
+# Les appels sont les entrées de save_session_entry (page PromptCarbon), les exécutions celles de la page CodeCarbon.
+# session_id=None : toutes les sessions.
+# -----------------------------------------------------------------------------
+
+# Colonnes des appels LLM extraites de l'entrée pour les requêtes ; l'entrée complète est gardée dans `data`
+_CALL_COLUMNS = (
+    "model", "timestamp", "carbon", "tdev_seconds", "billable_seconds", "tokens",
+    "completion_tokens", "engine", "attribution", "cache_hit",
+)
+_RUN_COLUMNS = (
+    "timestamp", "project_name", "run_mode", "duration_seconds", "repetitions", "returncode",
+    "emissions_kg", "energy_kwh",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT,
+    model TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    carbon REAL,
+    tdev_seconds REAL,
+    billable_seconds REAL,
+    tokens INTEGER,
+    completion_tokens INTEGER,
+    engine TEXT,
+    attribution TEXT,
+    cache_hit INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_calls_session_model_time ON llm_calls (session_id, model, timestamp);
+CREATE INDEX IF NOT EXISTS idx_llm_calls_session_time ON llm_calls (session_id, timestamp);
+CREATE TABLE IF NOT EXISTS codecarbon_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT,
+    timestamp REAL NOT NULL,
+    project_name TEXT,
+    run_mode TEXT,
+    duration_seconds REAL,
+    repetitions INTEGER,
+    returncode INTEGER,
+    emissions_kg REAL,
+    energy_kwh REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_codecarbon_runs_session_time ON codecarbon_runs (session_id, timestamp);
+CREATE TABLE IF NOT EXISTS sketches (
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    day TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (provider, model, day, metric)
+);
+"""
+
+# Requêtes en constantes : le texte SQL est identique d'un appel à l'autre, donc chaque connexion
+# réutilise la requête compilée de son cache (cached_statements) au lieu de la préparer à nouveau.
+_INSERT_CALL = (
+    f"INSERT INTO llm_calls (session_id, {', '.join(_CALL_COLUMNS)}, data) "
+    f"VALUES (?, {', '.join('?' for _ in _CALL_COLUMNS)}, ?)"
+)
+_INSERT_RUN = (
+    f"INSERT INTO codecarbon_runs (session_id, {', '.join(_RUN_COLUMNS)}, data) "
+    f"VALUES (?, {', '.join('?' for _ in _RUN_COLUMNS)}, ?)"
+)
+_CALL_STATS = (
+    "SELECT COUNT(*), COALESCE(SUM(carbon), 0), AVG(carbon), AVG(tdev_seconds) FROM llm_calls {where}"
+)
+_MODEL_STATS = (
+    "SELECT model, COUNT(*), AVG(carbon), SUM(carbon), AVG(tdev_seconds) FROM llm_calls {where} "
+    "GROUP BY model ORDER BY model"
+)
+_USAGE_TOTALS = (
+    "SELECT model, engine, attribution, SUM(COALESCE(billable_seconds, tdev_seconds)), SUM(tokens) "
+    "FROM llm_calls {where} GROUP BY model, engine, attribution"
+)
+_CALL_PAGE = "SELECT data FROM llm_calls {where} ORDER BY timestamp {order}, id {order} LIMIT ? OFFSET ?"
+_RUN_PAGE = "SELECT data FROM codecarbon_runs {where} ORDER BY timestamp {order}, id {order} LIMIT ? OFFSET ?"
+_SELECT_SKETCH = "SELECT data FROM sketches WHERE provider = ? AND model = ? AND day = ? AND metric = ?"
+_UPSERT_SKETCH = "INSERT OR REPLACE INTO sketches (provider, model, day, metric, data) VALUES (?, ?, ?, ?, ?)"
+_SKETCHES = "SELECT provider, model, day, data FROM sketches WHERE metric = ? AND day >= ?"
+
+
+def _where(session_id, *conditions):
+    """Clause WHERE (filtre de session optionnel) : un petit nombre de variantes, donc de requêtes préparées."""
+    clauses = (["session_id = ?"] if session_id is not None else []) + list(conditions)
+    return "WHERE " + " AND ".join(clauses) if clauses else ""
+
+
+def _call_values(entry, session_id):
+    values = [entry.get(column) for column in _CALL_COLUMNS]
+    values[_CALL_COLUMNS.index("timestamp")] = entry.get("timestamp") or time.time()
+    values[_CALL_COLUMNS.index("cache_hit")] = int(bool(entry.get("cache_hit")))
+    return (session_id, *values, json.dumps(entry, ensure_ascii=False))
+
+
+def _run_values(run, session_id):
+    values = [run.get(column) for column in _RUN_COLUMNS]
+    values[_RUN_COLUMNS.index("timestamp")] = run.get("timestamp") or time.time()
+    return (session_id, *values, json.dumps(run, ensure_ascii=False))
+
+
+class SqliteStore:
+    """
+    Historique dans une base SQLite : tables llm_calls et codecarbon_runs, indexées par
+    (session_id, model, timestamp) et (session_id, timestamp).
+
+    Mode WAL : les lecteurs ne bloquent pas l'écrivain (et inversement), ce qui convient aux threads
+    de Streamlit. Streamlit exécute chaque rerun dans un nouveau thread : les connexions ne sont donc pas
+    attachées aux threads mais empruntées à un petit pool (au plus pool_size ouvertes, réutilisées d'un rerun
+    à l'autre), busy_timeout pour les écritures simultanées.
+    Les statistiques de la sidebar, la comparaison par modèle et la pagination de l'historique sont
+    des requêtes SQL agrégées ou paginées, sans relire tout l'historique.
+    """
+
+    def __init__(self, path=STORAGE_PATH, busy_timeout=5.0, cached_statements=128, pool_size=4):
+        self.path = Path(path)
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self._idle = []  # connexions ouvertes et libres
+        self._slots = threading.BoundedSemaphore(pool_size)  # connexions empruntées + libres <= pool_size
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connection() as db:
+            # journal_mode est persistant : il suffit de le fixer une fois pour la base
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+
+    def _open(self):
+        db = sqlite3.connect(self.path, timeout=self.busy_timeout, cached_statements=self.cached_statements,
+                             check_same_thread=False)
+        # En WAL, synchronous=NORMAL reste cohérent après un arrêt brutal et évite un fsync par transaction
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    @contextmanager
+    def _connection(self):
+        """Connexion empruntée au pool pour la durée du bloc (attend qu'une se libère si pool_size sont prises)."""
+        with self._slots:
+            with self._lock:
+                db = self._idle.pop() if self._idle else None
+            if db is None:
+                db = self._open()
+            try:
+                yield db
+            finally:
+                with self._lock:
+                    self._idle.append(db)
+
+    def _query(self, sql, session_id, *conditions):
+        args = (session_id,) if session_id is not None else ()
+        with self._connection() as db:
+            return db.execute(sql.format(where=_where(session_id, *conditions)), args).fetchall()
+
+    def _page(self, sql, session_id, limit, offset, newest_first):
+        args = ((session_id,) if session_id is not None else ()) + (-1 if limit is None else limit, offset)
+        sql = sql.format(where=_where(session_id), order="DESC" if newest_first else "ASC")
+        with self._connection() as db:
+            return [json.loads(data) for (data,) in db.execute(sql, args)]
+
+    # -- Appels LLM -------------------------------------------------------
+
+    def add_call(self, entry, session_id=None):
+        """Enregistre l'appel et l'ajoute aux sketches de quantiles de son (provider, modèle, jour)."""
+        with self._connection() as db, db:
+            # BEGIN IMMEDIATE : le verrou d'écriture est pris avant de relire les sketches,
+            # deux écrivains ne peuvent pas partir du même état et perdre une mise à jour
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(_INSERT_CALL, _call_values(entry, session_id))
+            key = sketch_key(entry)
+            for metric in SKETCH_METRICS:
+                row = db.execute(_SELECT_SKETCH, (*key, metric)).fetchone()
+                sketch = DDSketch.from_dict(json.loads(row[0])) if row else DDSketch()
+                sketch.add(entry.get(metric))
+                db.execute(_UPSERT_SKETCH, (*key, metric, json.dumps(sketch.to_dict())))
+
+    def sketches(self, metric, since_day=""):
+        """[(provider, modèle, jour, DDSketch)] de `metric` depuis since_day (AAAA-MM-JJ), toutes sessions confondues."""
+        with self._connection() as db:
+            rows = db.execute(_SKETCHES, (metric, since_day)).fetchall()
+        return [(provider, model, day, DDSketch.from_dict(json.loads(data))) for provider, model, day, data in rows]
+
+    def count_calls(self, session_id=None):
+        return self._query(_CALL_STATS, session_id)[0][0]
+
+    def calls(self, session_id=None, limit=None, offset=0, newest_first=False):
+        """Entrées de la session, par ordre chronologique (ou antichronologique), une page à la fois."""
+        return self._page(_CALL_PAGE, session_id, limit, offset, newest_first)
+
+    def call_stats(self, session_id=None):
+        """{"calls", "carbon", "avg_carbon", "avg_tdev"} de la session."""
+        calls, carbon, avg_carbon, avg_tdev = self._query(_CALL_STATS, session_id)[0]
+        return {"calls": calls, "carbon": carbon, "avg_carbon": avg_carbon, "avg_tdev": avg_tdev}
+
+    def model_stats(self, session_id=None):
+        """Par modèle : nombre d'appels, émissions moyenne et totale, temps de réponse moyen."""
+        return [
+            {"model": model, "count": count, "carbon": avg_carbon, "carbon_total": carbon, "tdev_seconds": avg_tdev}
+            for model, count, avg_carbon, carbon, avg_tdev in self._query(_MODEL_STATS, session_id)
+        ]
+
+    def usage_totals(self, session_id=None):
+        """
+        Secondes facturées et tokens sommés par (modèle, moteur, attribution), réponses du cache exclues :
+        les quantités dont backend.uncertainty.totals_interval a besoin.
+        """
+        return [
+            {"model": model, "engine": engine, "attribution": attribution, "seconds": seconds or 0.0,
+             "tokens": tokens or 0}
+            for model, engine, attribution, seconds, tokens in self._query(_USAGE_TOTALS, session_id, "cache_hit = 0")
+        ]
+
+    def clear_calls(self, session_id=None):
+        with self._connection() as db, db:
+            if session_id is None:
+                db.execute("DELETE FROM llm_calls")
+            else:
+                db.execute("DELETE FROM llm_calls WHERE session_id = ?", (session_id,))
+
+    # -- Exécutions CodeCarbon --------------------------------------------
+
+    def add_run(self, run, session_id=None):
+        with self._connection() as db, db:
+            db.execute(_INSERT_RUN, _run_values(run, session_id))
+
+    def runs(self, session_id=None, limit=None, offset=0, newest_first=True):
+        return self._page(_RUN_PAGE, session_id, limit, offset, newest_first)
+
+    def prune(self, cutoff):
+        """Supprime appels et exécutions des sessions inactives depuis cutoff (epoch) ; renvoie le nombre de lignes."""
+        removed = 0
+        with self._connection() as db, db:
+            for table in ("llm_calls", "codecarbon_runs"):
+                removed += db.execute(
+                    # COALESCE : les lignes sans session (NULL) forment une session comme les autres
+                    f"DELETE FROM {table} WHERE COALESCE(session_id, '') IN "
+                    f"(SELECT COALESCE(session_id, '') FROM {table} GROUP BY session_id HAVING MAX(timestamp) < ?)",
+                    (cutoff,),
+                ).rowcount
+        return removed
+
+    def close(self):
+        with self._lock:
+            for db in self._idle:
+                db.close()
+            self._idle.clear()
+
+
+class JsonlSessionStore:
+    """
+    Même interface que SqliteStore, sur deux journaux JSONL (appels et exécutions).
+    La session est un champ "session_id" de chaque enregistrement ; les agrégats sont calculés en un parcours.
+    """
+
+    def __init__(self, calls_path=SESSION_LOG_PATH, runs_path=RUNS_LOG_PATH, sketches_path=SKETCHES_PATH):
+        self._calls = get_jsonl_store(calls_path)
+        self._runs = get_jsonl_store(runs_path)
+        # Sketches de quantiles, gardés en mémoire. Sur disque, un journal JSONL : chaque appel y ajoute ses valeurs
+        # ({"key", "value"}, une ligne par métrique, fsync groupés), et le journal est compacté au démarrage
+        # en un sketch par clé ({"key", "sketch"}). Une écriture ne coûte qu'une ligne, quel que soit l'historique.
+        self._sketches_log = get_jsonl_store(sketches_path)
+        self._sketches_lock = threading.Lock()
+        self._sketches = {}  # (provider, modèle, jour, métrique) -> DDSketch
+        deltas = 0
+        for row in self._sketches_log:
+            key = tuple(row["key"])
+            if "sketch" in row:
+                self._sketches.setdefault(key, DDSketch()).merge(DDSketch.from_dict(row["sketch"]))
+            else:
+                self._sketches.setdefault(key, DDSketch()).add(row["value"])
+                deltas += 1
+        if deltas:
+            self._sketches_log.rewrite(
+                [{"key": list(key), "sketch": sketch.to_dict()} for key, sketch in self._sketches.items()]
+            )
+
+    @staticmethod
+    def _select(log, session_id):
+        for record in log:
+            if session_id is None or record.get("session_id") == session_id:
+                yield record
+
+    @staticmethod
+    def _page(log, records, session_id, limit, offset, newest_first):
+        if session_id is None and not newest_first:
+            # Accès direct par l'index des offsets
+            return log.read_range(offset, None if limit is None else offset + limit)
+        records = list(records)
+        if newest_first:
+            records.reverse()
+        return records[offset:None if limit is None else offset + limit]
+
+    def add_call(self, entry, session_id=None):
+        self._calls.append({**entry, "session_id": session_id})
+        deltas = []
+        with self._sketches_lock:
+            for metric in SKETCH_METRICS:
+                key = (*sketch_key(entry), metric)
+                self._sketches.setdefault(key, DDSketch()).add(entry.get(metric))
+                if entry.get(metric) is not None:
+                    deltas.append({"key": list(key), "value": entry[metric]})
+        self._sketches_log.extend(deltas)
+
+    def sketches(self, metric, since_day=""):
+        with self._sketches_lock:
+            return [
+                (provider, model, day, sketch)
+                for (provider, model, day, sketch_metric), sketch in self._sketches.items()
+                if sketch_metric == metric and day >= since_day
+            ]
+
+    def count_calls(self, session_id=None):
+        if session_id is None:
+            return len(self._calls)
+        return sum(1 for _ in self._select(self._calls, session_id))
+
+    def calls(self, session_id=None, limit=None, offset=0, newest_first=False):
+        return self._page(self._calls, self._select(self._calls, session_id), session_id, limit, offset, newest_first)
+
+    def call_stats(self, session_id=None):
+        return SessionAggregates.from_entries(self._select(self._calls, session_id)).call_stats()
+
+    def model_stats(self, session_id=None):
+        return SessionAggregates.from_entries(self._select(self._calls, session_id)).model_stats()
+
+    def usage_totals(self, session_id=None):
+        return SessionAggregates.from_entries(self._select(self._calls, session_id)).usage_totals()
+
+    def clear_calls(self, session_id=None):
+        if session_id is None:
+            self._calls.clear()
+        else:
+            self._calls.remove(lambda record: record.get("session_id") == session_id)
+
+    def add_run(self, run, session_id=None):
+        self._runs.append({**run, "session_id": session_id})
+
+    def runs(self, session_id=None, limit=None, offset=0, newest_first=True):
+        return self._page(self._runs, self._select(self._runs, session_id), session_id, limit, offset, newest_first)
+
+    def prune(self, cutoff):
+        """Comme SqliteStore.prune : chaque journal est filtré et réécrit (JsonlStore.remove)."""
+        return prune_sessions(self._calls, cutoff) + prune_sessions(self._runs, cutoff)
+
+    def close(self):
+        self._calls.close()
+        self._runs.close()
+
+
+_SESSION_STORES = {}
+# Verrou distinct de _STORES_LOCK : JsonlSessionStore() appelle get_jsonl_store pendant sa création
+_SESSION_STORES_LOCK = threading.Lock()
+
+
+def get_session_store(backend=STORAGE_BACKEND):
+    """Historique partagé par tout le process : "sqlite" (défaut) ou "jsonl"."""
+    store = _SESSION_STORES.get(backend)
+    if store is None:
+        with _SESSION_STORES_LOCK:
+            store = _SESSION_STORES.get(backend)
+            if store is None:
+                if backend == "sqlite":
+                    store = SqliteStore()
+                elif backend == "jsonl":
+                    store = JsonlSessionStore()
+                else:
+                    raise ValueError(f"Storage backend {backend} not supported.")
+                _SESSION_STORES[backend] = store
+    return store
+
+
+class SessionHistory:
+    """
+    L'historique d'une seule session (un onglet de navigateur, identifié par son session_id Streamlit)
+    sur le store partagé.
+
+    Chaque session n'écrit que dans son espace (session_id) : les sessions ne s'effacent plus les unes les autres.
+    Les entrées de la session sont lues une seule fois dans le store (requête indexée par session), puis gardées
+    en mémoire et complétées à chaque écriture : un rerun ne relit pas l'historique, ni le sien ni celui des autres.
+    Les statistiques (SessionAggregates) sont mises à jour en O(1) à chaque appel et lues sans parcours.
+    Une instance est propre à une session Streamlit, dont les reruns s'exécutent un par un : pas de verrou.
+    """
+
+    def __init__(self, session_id, store=None):
+        self.session_id = session_id
+        self.store = store or get_session_store()
+        self._entries = None
+        self._aggregates = None
+        self.version = 0  # incrémenté à chaque écriture
+
+    def _cached(self):
+        if self._entries is None:
+            self._entries = self.store.calls(self.session_id)
+            self._aggregates = SessionAggregates.from_entries(self._entries)
+        return self._entries
+
+    @property
+    def data_version(self):
+        """Clé de version des données de la session, pour le cache des graphiques (backend.visualisation)."""
+        return self.session_id, self.version
+
+    @property
+    def aggregates(self):
+        self._cached()
+        return self._aggregates
+
+    def add_call(self, entry):
+        entries = self._cached()  # chargé avant l'écriture, pour ne pas compter l'entrée deux fois
+        self.store.add_call(entry, session_id=self.session_id)
+        entries.append(entry)
+        self._aggregates.add(entry)
+        self.version += 1
+
+    def clear_calls(self):
+        self.store.clear_calls(session_id=self.session_id)
+        self._entries = []
+        self._aggregates = SessionAggregates()
+        self.version += 1
+
+    def count_calls(self):
+        return len(self._cached())
+
+    def calls(self, limit=None, offset=0, newest_first=False):
+        entries = self._cached()
+        if not newest_first:
+            return entries[offset:None if limit is None else offset + limit]
+        # Page à l'envers : on ne copie que les entrées de la page
+        stop = len(entries) - offset
+        start = 0 if limit is None else max(stop - limit, 0)
+        return entries[start:max(stop, 0)][::-1]
+
+    def call_stats(self):
+        return self.aggregates.call_stats()
+
+    def model_stats(self):
+        return self.aggregates.model_stats()
+
+    def usage_totals(self):
+        return self.aggregates.usage_totals()
+
+    def add_run(self, run):
+        self.store.add_run(run, session_id=self.session_id)
+        self.version += 1
+
+    def runs(self, limit=None, offset=0):
+        return self.store.runs(session_id=self.session_id, limit=limit, offset=offset)
+
+
+def prune_history(days=HISTORY_RETENTION_DAYS, store=None, prompts_path=PROMPTS_LOG_PATH):
+    """
+    Purge les sessions sans activité depuis plus de `days` jours : appels et exécutions du store partagé,
+    et journal des prompts. Les sketches de quantiles, agrégés par jour, sont conservés.
+    Renvoie le nombre d'enregistrements supprimés (rien si days vaut 0).
+    """
+    if not days:
+        return 0
+    cutoff = time.time() - days * 24 * 3600
+    store = store or get_session_store()
+    removed = store.prune(cutoff) + prune_sessions(get_jsonl_store(prompts_path), cutoff)
+    if removed:
+        print(f"Rétention : {removed} enregistrements de sessions inactives depuis plus de {days:g} jours supprimés.")
+    return removed
+
+
+def close_stores():
+    """Ferme tous les journaux et bases ouverts, après un dernier fsync."""
+    with _STORES_LOCK:
+        for store in (*_STORES.values(), *_SESSION_STORES.values()):
+            try:
+                store.close()
+            except Exception as e:
+                print(f"Erreur lors de la fermeture de {getattr(store, 'path', store)} : {e}")
+
+
+atexit.register(close_stores)
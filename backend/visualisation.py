@@ -1,30 +1,155 @@
+import functools
+import threading
+from collections import OrderedDict
+
+import numpy as np
 import plotly.graph_objects as go
 import pandas as pd
-from pathlib import Path
-import json
 
+from .config import FIGURE_CACHE_ENTRIES, PLOT_WEBGL_THRESHOLD, PLOT_MAX_POINTS
+from .compute_LLM_footprint import tokens_per_second, carbon_per_1k_tokens
+from .aggregates import merge_sketches
+from .utils import get_session_store
 
-def load_session_data():
-    """Charge les données de session depuis session_data.json"""
-    session_file = Path("data/session_data.json")
-    
-    if not session_file.exists():
-        return []
-    
-    with open(session_file, 'r') as f:
-        return json.load(f)
+
+# Figures déjà construites, par (graphique, version des données, thème) : LRU de FIGURE_CACHE_ENTRIES figures.
+# Un rerun qui ne change pas les données de la session (widget sans rapport, sélection d'un provider...)
+# renvoie la figure en cache sans relire les données ni refaire les calculs pandas et la construction Plotly.
+_FIGURE_CACHE = OrderedDict()
+_FIGURE_CACHE_LOCK = threading.Lock()
+
+
+def versioned_figure(chart):
+    """
+    Ajoute au constructeur de graphique les arguments version et theme.
+    version : version des données (ex : SessionHistory.data_version), qui change à chaque écriture ;
+    None désactive le cache. theme : thème d'affichage, fait partie de la clé.
+    Les figures renvoyées sont partagées : ne pas les modifier.
+    """
+    def decorator(build):
+        @functools.wraps(build)
+        def wrapper(*args, version=None, theme="light", **kwargs):
+            if version is None:
+                return build(*args, **kwargs)
+
+            key = (chart, version, theme)
+            with _FIGURE_CACHE_LOCK:
+                fig = _FIGURE_CACHE.get(key)
+                if fig is not None:
+                    _FIGURE_CACHE.move_to_end(key)
+                    return fig
+
+            fig = build(*args, **kwargs)
+            with _FIGURE_CACHE_LOCK:
+                _FIGURE_CACHE[key] = fig
+                while len(_FIGURE_CACHE) > FIGURE_CACHE_ENTRIES:
+                    _FIGURE_CACHE.popitem(last=False)
+            return fig
+        return wrapper
+    return decorator
+
+
+def load_session_data(session_id=None):
+    """
+    Charge les appels d'une session (toutes si session_id est None) depuis l'historique partagé
+    (SQLite ou JSONL, voir get_session_store), sans verrou : les lecteurs ne bloquent pas les écritures.
+    """
+    return get_session_store().calls(session_id)
+
+
+def _session_entries(session_id, entries, history):
+    """Appels fournis, sinon ceux de `history` (SessionHistory), sinon relus dans le store."""
+    if entries is not None:
+        return entries
+    return history.calls() if history is not None else load_session_data(session_id)
+
+
+def load_model_quantiles(since_day="", store=None):
+    """
+    p50 / p90 / p99 des émissions et du temps de réponse par modèle, toutes sessions confondues, depuis since_day
+    (AAAA-MM-JJ) : fusion des sketches persistés par (provider, modèle, jour), sans relire l'historique brut.
+    """
+    store = store or get_session_store()
+    rows = {}
+    for metric, prefix in (("carbon", "carbon"), ("tdev_seconds", "tdev")):
+        by_model = {}
+        for _, model, _, sketch in store.sketches(metric, since_day):
+            by_model.setdefault(model, []).append(sketch)
+        for model, sketches in by_model.items():
+            merged = merge_sketches(sketches)
+            row = rows.setdefault(model, {"model": model, "count": merged.count})
+            row.update({f"{prefix}_{name}": value for name, value in merged.quantiles().items()})
+    return pd.DataFrame(sorted(rows.values(), key=lambda row: row["model"]))
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Indices des n_out points retenus par Largest-Triangle-Three-Buckets (premier et dernier points compris).
+
+    Les points intermédiaires sont répartis en n_out - 2 paquets ; dans chaque paquet, on garde le point qui forme
+    le plus grand triangle avec le point retenu au paquet précédent et la moyenne du paquet suivant.
+    La forme de la courbe (pics compris) est conservée bien mieux qu'avec un pas régulier.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def bucket_envelope(x, y, n_buckets):
+    """(x de début, minimum, maximum) de y sur n_buckets paquets consécutifs : l'enveloppe des points non retenus."""
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    starts = np.unique(np.linspace(0, len(y), n_buckets, endpoint=False).astype(int))
+    return x[starts], np.minimum.reduceat(y, starts), np.maximum.reduceat(y, starts)
 
 
-def create_model_comparison_chart():
+def downsample_series(x, y, max_points=PLOT_MAX_POINTS):
+    """
+    Prépare une série par appel pour l'affichage : au plus max_points points (LTTB) et, si la série a été réduite,
+    l'enveloppe min / max par paquet. Renvoie (indices retenus, enveloppe ou None).
+    La taille envoyée au navigateur reste bornée quelle que soit la longueur de l'historique.
+    """
+    if len(x) <= max_points:
+        return np.arange(len(x)), None
+    return lttb_indices(x, y, max_points), bucket_envelope(x, y, max_points)
+
+
+def scatter_trace(n_points):
+    """go.Scattergl (rendu WebGL) au-delà de PLOT_WEBGL_THRESHOLD points, go.Scatter (SVG) en dessous."""
+    return go.Scattergl if n_points > PLOT_WEBGL_THRESHOLD else go.Scatter
+
+
+@versioned_figure("model_comparison")
+def create_model_comparison_chart(session_id=None, model_stats=None, history=None):
     """
     Crée un graphique comparatif des modèles LLM basé sur les données de session.
     Compare l'émission carbone (gCO2) et le temps de réponse par modèle.
+    model_stats : agrégats par modèle déjà calculés (voir SessionAggregates.model_stats) ;
+    history : SessionHistory dont les agrégats ne sont lus que si la figure n'est pas en cache ;
+    sinon, ils sont demandés au store (GROUP BY sur l'index modèle).
     """
     
-    # Charger les données
-    session_data = load_session_data()
+    if model_stats is None:
+        model_stats = history.model_stats() if history is not None else get_session_store().model_stats(session_id)
+    model_stats = pd.DataFrame(model_stats)
     
-    if not session_data:
+    if model_stats.empty:
         # Retourner un graphique vide avec message
         fig = go.Figure()
         fig.add_annotation(
@@ -48,22 +173,6 @@ def create_model_comparison_chart():
         )
         return fig
     
-    # Convertir en DataFrame
-    df = pd.DataFrame(session_data)
-    
-    # Grouper par modèle et calculer les moyennes
-    model_stats = df.groupby('model').agg({
-        'carbon': 'mean',
-        'tdev_seconds': 'mean'
-    }).reset_index()
-    
-    # Compter le nombre d'appels par modèle
-    model_counts = df['model'].value_counts().reset_index()
-    model_counts.columns = ['model', 'count']
-    
-    # Fusionner
-    model_stats = model_stats.merge(model_counts, on='model')
-    
     # Palette de couleurs vert/olive
     colors = [
         'rgb(85,107,47)',   # DarkOliveGreen
@@ -76,6 +185,10 @@ def create_model_comparison_chart():
     # Assigner une couleur à chaque modèle
     model_colors = [colors[i % len(colors)] for i in range(len(model_stats))]
     
+    # Plage min – max et quantiles par modèle, quand les agrégats les fournissent
+    has_range = {'carbon_min', 'carbon_max'} <= set(model_stats.columns)
+    has_quantiles = {'carbon_p50', 'carbon_p90', 'carbon_p99'} <= set(model_stats.columns)
+    
     # Créer le graphique à double axe
     fig = go.Figure()
     
@@ -90,12 +203,30 @@ def create_model_comparison_chart():
         ),
         text=[f"{c:.3f} g<br>({n} appels)" for c, n in zip(model_stats['carbon'], model_stats['count'])],
         textposition='auto',
+        customdata=model_stats[['carbon_min', 'carbon_max']] if has_range else None,
         hovertemplate='<b>%{x}</b><br>' +
                       'Émissions: %{y:.4f} gCO₂e<br>' +
+                      ('Min – max: %{customdata[0]:.4f} – %{customdata[1]:.4f} gCO₂e<br>' if has_range else '') +
                       '<extra></extra>',
         yaxis='y1'
     ))
     
+    if has_quantiles:
+        # Queue de distribution des émissions (DDSketch par modèle) : p90 et p99 au-dessus de la moyenne
+        for quantile, symbol in (('p90', 'triangle-up'), ('p99', 'star')):
+            fig.add_trace(go.Scatter(
+                x=model_stats['model'],
+                y=model_stats[f'carbon_{quantile}'],
+                name=f'Émissions {quantile} (gCO₂e)',
+                mode='markers',
+                marker=dict(size=12, symbol=symbol, color='rgb(27,94,32)',
+                            line=dict(width=1, color='rgb(255,255,255)')),
+                hovertemplate='<b>%{x}</b><br>' +
+                              f'Émissions {quantile}: ' + '%{y:.4f} gCO₂e<br>' +
+                              '<extra></extra>',
+                yaxis='y1'
+            ))
+    
     # Ligne pour le temps de réponse
     fig.add_trace(go.Scatter(
         x=model_stats['model'],
@@ -173,11 +304,15 @@ def create_model_comparison_chart():
     return fig
 
 
-def create_session_timeline():
+@versioned_figure("session_timeline")
+def create_session_timeline(session_id=None, entries=None, history=None):
     """
     Crée un graphique temporel montrant l'évolution des émissions au fil de la session.
+    entries : appels de la session déjà en mémoire ; history : SessionHistory, dont les appels ne sont copiés
+    que si la figure n'est pas en cache ; sinon, ils sont relus dans le store.
+    Au-delà de PLOT_MAX_POINTS appels, la courbe est réduite par LTTB avec son enveloppe min / max.
     """
-    session_data = load_session_data()
+    session_data = _session_entries(session_id, entries, history)
     
     if not session_data:
         fig = go.Figure()
@@ -200,26 +335,42 @@ def create_session_timeline():
         )
         return fig
     
-    df = pd.DataFrame(session_data)
-    df['call_number'] = range(1, len(df) + 1)
+    call_number = np.arange(1, len(session_data) + 1)
+    carbon = np.array([entry['carbon'] for entry in session_data], dtype=float)
+    # Longs historiques (évaluations en lot) : LTTB côté serveur et rendu WebGL
+    kept, envelope = downsample_series(call_number, carbon)
+    Scatter = scatter_trace(len(session_data))
     
     fig = go.Figure()
     
+    if envelope is not None:
+        # Enveloppe min / max par paquet : les pics écartés par la réduction restent visibles
+        env_x, env_min, env_max = envelope
+        fig.add_trace(Scatter(
+            x=env_x, y=env_min, mode='lines', line=dict(width=0),
+            showlegend=False, hoverinfo='skip'
+        ))
+        fig.add_trace(Scatter(
+            x=env_x, y=env_max, mode='lines', line=dict(width=0),
+            fill='tonexty', fillcolor='rgba(107,142,35,0.2)',
+            name='Min – max', hoverinfo='skip'
+        ))
+    
     # Ligne pour les émissions
-    fig.add_trace(go.Scatter(
-        x=df['call_number'],
-        y=df['carbon'],
+    fig.add_trace(Scatter(
+        x=call_number[kept],
+        y=carbon[kept],
         mode='lines+markers',
         name='Émissions',
         marker=dict(
             size=8,
-            color=df['carbon'],
+            color=carbon[kept],
             colorscale='Greens',
             showscale=True,
             colorbar=dict(title="gCO₂e")
         ),
         line=dict(width=2),
-        text=df['model'],
+        text=[session_data[i]['model'] for i in kept],
         hovertemplate='<b>Appel %{x}</b><br>' +
                       'Modèle: %{text}<br>' +
                       'Émissions: %{y:.4f} gCO₂e<br>' +
@@ -252,3 +403,115 @@ def create_session_timeline():
     )
     
     return fig
+
+
+@versioned_figure("token_efficiency")
+def create_token_efficiency_chart(session_id=None, entries=None, history=None):
+    """
+    Compare les modèles rapportés aux tokens renvoyés par les providers :
+    débit de génération (tokens/s) et émissions pour 1000 tokens (gCO2e / 1k tokens).
+    Les réponses servies par le cache et les appels sans compteur de tokens sont ignorés.
+    entries / history : comme pour create_session_timeline.
+    """
+    rows = []
+    for entry in _session_entries(session_id, entries, history):
+        if entry.get("cache_hit") or not entry.get("completion_tokens"):
+            continue
+        rows.append({
+            "model": entry["model"],
+            "tokens_per_second": tokens_per_second(
+                entry["completion_tokens"], entry["tdev_seconds"], {"server": entry.get("server_seconds")}
+            ),
+            "carbon_per_1k": carbon_per_1k_tokens(
+                entry["carbon"], entry.get("prompt_tokens"), entry["completion_tokens"]
+            ),
+        })
+
+    if not rows:
+        fig = go.Figure()
+        fig.add_annotation(
+            text="Aucun compteur de tokens disponible",
+            xref="paper", yref="paper",
+            x=0.5, y=0.5, showarrow=False,
+            font=dict(size=16, color="#000000", family='Righteous')
+        )
+        fig.update_layout(
+            title=dict(
+                text="Efficacité par token",
+                font=dict(size=18, color='#000000', family='Righteous'),
+                x=0.5,
+                xanchor='center'
+            ),
+            paper_bgcolor='rgba(255,255,255,0.25)',
+            plot_bgcolor='rgba(0,0,0,0)',
+            height=400,
+            xaxis=dict(visible=False),
+            yaxis=dict(visible=False)
+        )
+        return fig
+
+    model_stats = pd.DataFrame(rows).groupby('model').mean().reset_index()
+
+    fig = go.Figure()
+
+    # Barres pour les émissions par 1000 tokens
+    fig.add_trace(go.Bar(
+        x=model_stats['model'],
+        y=model_stats['carbon_per_1k'],
+        name='gCO₂e / 1k tokens',
+        marker=dict(color='rgb(107,142,35)', line=dict(color='rgba(255,255,255,0.3)', width=1)),
+        hovertemplate='<b>%{x}</b><br>' +
+                      'Émissions: %{y:.4f} gCO₂e / 1k tokens<br>' +
+                      '<extra></extra>',
+        yaxis='y1'
+    ))
+
+    # Points pour le débit de génération
+    fig.add_trace(go.Scatter(
+        x=model_stats['model'],
+        y=model_stats['tokens_per_second'],
+        name='Débit (tokens/s)',
+        mode='markers',
+        marker=dict(size=18, color='rgb(0,0,0)', line=dict(width=4, color='rgb(255,255,255)')),
+        hovertemplate='<b>%{x}</b><br>' +
+                      'Débit: %{y:.1f} tokens/s<br>' +
+                      '<extra></extra>',
+        yaxis='y2'
+    ))
+
+    fig.update_layout(
+        title=dict(
+            text='Efficacité par token — Émissions vs Débit',
+            font=dict(size=20, color='#000000', family='Righteous'),
+            x=0.5,
+            xanchor='center'
+        ),
+        xaxis=dict(
+            title='Modèle LLM',
+            tickfont=dict(size=11, color='#000000'),
+            tickangle=-45
+        ),
+        yaxis=dict(
+            title='gCO₂e / 1k tokens',
+            side='left',
+            gridcolor='rgba(200,200,200,0.2)',
+            zeroline=False
+        ),
+        yaxis2=dict(
+            title='Tokens générés par seconde',
+            overlaying='y',
+            side='right',
+            showgrid=False,
+            zeroline=False
+        ),
+        legend=dict(x=0.5, y=-0.3, xanchor='center', yanchor='top', orientation='h',
+                    font=dict(size=12, color='#000000'), bgcolor='rgba(255,255,255,0.5)'),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        height=500,
+        margin=dict(l=80, r=120, t=80, b=120),
+        hovermode='x unified',
+        font=dict(color='#000000', family='Righteous')
+    )
+
+    return fig
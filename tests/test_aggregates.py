@@ -0,0 +1,14 @@
+from backend.aggregates import SessionAggregates
+
+
+def test_calls_without_carbon_are_counted():
+    aggregates = SessionAggregates.from_entries([
+        {"model": "gpt-4", "carbon": 0.2, "tdev_seconds": 1.0},
+        {"model": "gpt-4", "carbon": None, "tdev_seconds": 1.5},
+        {"model": "llama", "carbon": None, "tdev_seconds": None},
+    ])
+    stats = {row["model"]: row for row in aggregates.model_stats()}
+    assert stats["gpt-4"]["count"] == 2
+    assert stats["gpt-4"]["carbon"] == 0.2
+    assert stats["llama"]["count"] == 1
+    assert aggregates.call_stats()["calls"] == 3
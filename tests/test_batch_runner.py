@@ -0,0 +1,28 @@
+import json
+
+from backend.batch_runner import load_checkpoint
+
+
+def test_checkpoint_skips_malformed_and_partial_records(tmp_path, capsys):
+    path = tmp_path / "results.jsonl"
+    lines = [
+        json.dumps({"prompt_id": "0", "provider": "openai", "model": "gpt-4", "response": "ok"}),
+        "{pas du json",
+        json.dumps({"prompt_id": "1", "provider": "openai"}),
+        json.dumps(["0", "openai", "gpt-4"]),
+        json.dumps({"prompt_id": "2", "provider": "groq", "model": "llama", "error": "timeout"}),
+    ]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    assert load_checkpoint(path) == {("0", "openai", "gpt-4")}
+    assert load_checkpoint(path, retry_errors=False) == {("0", "openai", "gpt-4"), ("2", "groq", "llama")}
+    assert "ignoré" in capsys.readouterr().out
+
+
+def test_checkpoint_truncates_partial_last_line(tmp_path):
+    path = tmp_path / "results.jsonl"
+    record = json.dumps({"prompt_id": "0", "provider": "openai", "model": "gpt-4"})
+    path.write_text(record + '\n{"prompt_id": "1", "prov', encoding="utf-8")
+
+    assert load_checkpoint(path) == {("0", "openai", "gpt-4")}
+    assert path.read_text(encoding="utf-8") == record + "\n"
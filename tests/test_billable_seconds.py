@@ -0,0 +1,28 @@
+import pytest
+
+from backend.compute_LLM_footprint import billable_seconds
+
+
+def test_server_window_first():
+    assert billable_seconds(2.0, {"server": 0.5, "chunk_times": [0.6, 1.5]}) == 0.5
+
+
+def test_streamed_generation_window():
+    timings = {"server": None, "chunk_times": [0.4, 1.0, 1.4], "generation": 1.0}
+    assert billable_seconds(2.0, timings) == 1.0
+
+
+def test_single_chunk_without_server_timing():
+    # Pas la durée totale (connexion, TLS, téléchargement) : requête envoyée -> unique morceau
+    timings = {"server": None, "chunk_times": [0.9], "request_sent": 0.3, "generation": 0.0}
+    assert billable_seconds(2.0, timings) == pytest.approx(0.6)
+
+
+def test_single_chunk_without_network_trace():
+    timings = {"server": None, "chunk_times": [0.9], "request_sent": None, "connect": 0.1, "tls": 0.2}
+    assert billable_seconds(2.0, timings) == pytest.approx(0.6)
+
+
+def test_no_timings():
+    assert billable_seconds(2.0) == 2.0
+    assert billable_seconds(2.0, {"server": None, "chunk_times": []}) == 2.0
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.compute_LLM_footprint import compute_carbon, compute_carbon_batch
+
+
+def test_missing_cache_hit_column_is_not_a_hit():
+    # pd.DataFrame(entries) : NaN pour les entrées sans champ cache_hit
+    frame = pd.DataFrame([
+        {"model": "gpt-4", "tdev": 1.0, "cache_hit": False},
+        {"model": "gpt-4", "tdev": 1.0},
+        {"model": "gpt-4", "tdev": 1.0, "cache_hit": True},
+    ])
+    total = compute_carbon_batch(frame)["total"].to_numpy()
+    assert total[0] > 0
+    assert total[1] == pytest.approx(total[0])
+    assert total[2] == 0
+
+
+def test_cache_hit_nan_and_none_values():
+    total = compute_carbon_batch(
+        ["gpt-4"] * 4, tdev=[1.0] * 4, cache_hit=[np.nan, None, False, True],
+    )["total"].to_numpy()
+    assert total[0] == pytest.approx(total[2])
+    assert total[1] == pytest.approx(total[2])
+    assert total[3] == 0
+
+
+def test_without_cache_hit_column():
+    total = compute_carbon_batch(pd.DataFrame({"model": ["gpt-4"], "tdev": [1.0]}))["total"]
+    assert total.iloc[0] == pytest.approx(compute_carbon("gpt-4", "", "", 1.0))
+
+
+def test_carbon_intensity_override_without_profile_countries():
+    # Les pays des profils absents des intensités fournies retombent sur "default"
+    result = compute_carbon_batch(["gpt-4"], tdev=[1.0], carbon_intensity={"default": 0.3})
+    reference = compute_carbon_batch(["gpt-4"], tdev=[1.0], carbon_intensity={"default": 0.3, "us": 0.3})
+    assert result["total"].iloc[0] == pytest.approx(reference["total"].iloc[0])
+
+
+def test_timezone_aware_timestamps_keep_their_dtype():
+    timestamps = pd.Series(pd.date_range("2024-01-01", periods=3, freq="h", tz="UTC"), index=[10, 11, 12])
+    result = compute_carbon_batch(["gpt-4"] * 3, tdev=[1.0] * 3, timestamp=timestamps, carbon_intensity={"default": 0.3})
+    assert isinstance(result["timestamp"].dtype, pd.DatetimeTZDtype)
+    assert (result["timestamp"].to_numpy() == timestamps.to_numpy()).all()
@@ -0,0 +1,28 @@
+import pandas as pd
+import pytest
+
+from backend import grid_intensity
+from backend.config import CARBON_INTENSITY
+from backend.grid_intensity import SAMPLE_VERSION, build_sample_dataset, get_dataset, intensity_info, write_dataset
+
+
+def test_sample_is_not_latest(tmp_path):
+    build_sample_dataset(tmp_path)
+    assert get_dataset("latest", tmp_path) is None
+    assert get_dataset(SAMPLE_VERSION, tmp_path).version == SAMPLE_VERSION
+
+
+def test_latest_skips_sample_versions(tmp_path):
+    build_sample_dataset(tmp_path)
+    data = pd.DataFrame({"region": ["fr", "fr"], "timestamp": [0, 3600], "intensity": [0.02, 0.03]})
+    write_dataset(data, "2023", tmp_path)
+    # "2024-sample" est triée après "2023" mais n'est pas une mesure
+    assert get_dataset("latest", tmp_path).version == "2023"
+
+
+def test_static_intensity_without_dataset(tmp_path, monkeypatch):
+    monkeypatch.setattr(grid_intensity, "get_dataset", lambda: get_dataset("latest", tmp_path))
+    build_sample_dataset(tmp_path)
+    value, version = intensity_info("fr", pd.Timestamp("2024-01-01 19:00", tz="UTC"))
+    assert version is None
+    assert value == pytest.approx(CARBON_INTENSITY["fr"])
@@ -0,0 +1,28 @@
+import asyncio
+
+from backend import llm_async
+
+
+def test_cache_hit_does_not_wait_for_the_provider_semaphore(monkeypatch):
+    monkeypatch.setattr(llm_async, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(llm_async, "cached_result", lambda provider, prompt, model: "cached")
+
+    async def scenario():
+        semaphore = llm_async._get_semaphore("openai")
+        # Toutes les places du provider sont prises par des appels réels
+        for _ in range(semaphore._value):
+            await semaphore.acquire()
+        return await asyncio.wait_for(llm_async.call_llm_cached_async("openai", "q", "gpt-4"), timeout=1)
+
+    assert asyncio.run(scenario()) == "cached"
+
+
+def test_cache_miss_calls_under_the_semaphore_and_stores(monkeypatch):
+    stored = []
+    monkeypatch.setattr(llm_async, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(llm_async, "cached_result", lambda provider, prompt, model: None)
+    monkeypatch.setattr(llm_async, "call_llm", lambda provider, prompt, model: "live")
+    monkeypatch.setattr(llm_async, "store_result", lambda *args: stored.append(args))
+
+    assert asyncio.run(llm_async.call_llm_cached_async("OpenAI", "q", "gpt-4")) == "live"
+    assert stored == [("openai", "q", "gpt-4", "live")]
@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+from backend.utils import JsonlSessionStore, JsonlStore, SqliteStore, prune_history, prune_sessions
+
+DAY = 24 * 3600
+
+
+def _call(timestamp):
+    return {"model": "gpt-4", "provider": "openai", "carbon": 0.1, "tdev_seconds": 1.0, "timestamp": timestamp}
+
+
+@pytest.fixture(params=["sqlite", "jsonl"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        store = SqliteStore(tmp_path / "history.sqlite")
+    else:
+        store = JsonlSessionStore(tmp_path / "calls.jsonl", tmp_path / "runs.jsonl", tmp_path / "sketches.jsonl")
+    yield store
+    store.close()
+
+
+def test_prune_removes_whole_inactive_sessions(store):
+    now = time.time()
+    store.add_call(_call(now - 40 * DAY), session_id="old")
+    # Session commencée il y a longtemps mais encore active : gardée en entier
+    store.add_call(_call(now - 40 * DAY), session_id="active")
+    store.add_call(_call(now - DAY), session_id="active")
+    store.add_run({"timestamp": now - 40 * DAY, "project_name": "p"}, session_id="old")
+
+    assert store.prune(now - 30 * DAY) == 2
+    assert store.count_calls("old") == 0
+    assert store.count_calls("active") == 2
+    assert store.runs("old") == []
+
+
+def test_prune_history_includes_the_prompts_log(store, tmp_path):
+    now = time.time()
+    prompts = tmp_path / "prompts.jsonl"
+    log = JsonlStore(prompts)
+    log.extend([
+        {"prompt_hash": "a", "session_id": "old", "timestamp": now - 40 * DAY},
+        {"prompt_hash": "b", "session_id": "legacy"},  # sans date : considéré comme ancien
+        {"prompt_hash": "c", "session_id": "new", "timestamp": now},
+    ])
+    log.close()
+    store.add_call(_call(now - 40 * DAY), session_id="old")
+
+    assert prune_history(30, store=store, prompts_path=prompts) == 3
+    assert [record["prompt_hash"] for record in JsonlStore(prompts)] == ["c"]
+    assert prune_history(0, store=store, prompts_path=prompts) == 0
+
+
+def test_prune_sessions_without_stale_sessions(tmp_path):
+    log = JsonlStore(tmp_path / "log.jsonl")
+    log.append({"session_id": "s", "timestamp": time.time()})
+    assert prune_sessions(log, time.time() - DAY) == 0
+    assert len(log) == 1
@@ -0,0 +1,34 @@
+import threading
+
+from backend.utils import SqliteStore
+
+
+def test_connections_are_reused_across_threads(tmp_path):
+    # Un thread par rerun Streamlit : le nombre de connexions ouvertes ne doit pas croître avec eux
+    store = SqliteStore(tmp_path / "history.sqlite", pool_size=2)
+
+    def rerun(i):
+        store.add_call({"model": "gpt-4", "provider": "openai", "carbon": 0.1, "tdev_seconds": 1.0}, session_id="s")
+        store.call_stats("s")
+
+    for i in range(20):
+        thread = threading.Thread(target=rerun, args=(i,))
+        thread.start()
+        thread.join()
+
+    assert len(store._idle) <= 2
+    assert store.count_calls("s") == 20
+    store.close()
+
+
+def test_pool_is_bounded_under_concurrency(tmp_path):
+    store = SqliteStore(tmp_path / "history.sqlite", pool_size=3)
+    threads = [
+        threading.Thread(target=lambda: [store.count_calls() for _ in range(20)]) for _ in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(store._idle) <= 3
+    store.close()
@@ -0,0 +1,34 @@
+import pytest
+
+from backend import static_figures
+from backend.grid_intensity import build_sample_dataset, get_dataset
+from backend.static_figures import build_figures, carbon_intensity_map, load_figure
+
+
+@pytest.fixture
+def figures_root(tmp_path, monkeypatch):
+    """Figures précalculées dans tmp_path ; toute reconstruction ultérieure fait échouer le test."""
+    root = tmp_path / "figures"
+    build_figures(root)
+    monkeypatch.setattr(static_figures, "_FIGURES", {})
+
+    def rebuilt(*args):
+        raise AssertionError("figure reconstruite au lieu d'être lue")
+    monkeypatch.setitem(static_figures.STATIC_FIGURES, "carbon_intensity_map", rebuilt)
+    monkeypatch.setattr(static_figures, "_hourly_map", rebuilt)
+    return root
+
+
+def test_precomputed_map_without_hourly_dataset(figures_root, monkeypatch):
+    monkeypatch.setattr(static_figures, "get_dataset", lambda: None)
+    figure = carbon_intensity_map(figures_root)
+    assert figure is load_figure("carbon_intensity_map", figures_root)
+    assert figure.data
+
+
+def test_precomputed_map_with_only_the_sample(figures_root, tmp_path, monkeypatch):
+    # Le jeu d'exemple synthétique n'est pas "latest" : il ne remplace pas la carte précalculée
+    grid = tmp_path / "grid"
+    build_sample_dataset(grid)
+    monkeypatch.setattr(static_figures, "get_dataset", lambda: get_dataset("latest", grid))
+    assert carbon_intensity_map(figures_root) is load_figure("carbon_intensity_map", figures_root)
@@ -0,0 +1,20 @@
+from app.theme import minify_css, static_url
+
+
+def test_minify_strips_space_before_colon_in_declarations():
+    assert minify_css("p { color : red ; margin :0 }") == "p{color:red;margin:0}"
+    assert minify_css("@media (max-width: 600px) { .a { --gap :4px; } }") == "@media (max-width:600px){.a{--gap:4px}}"
+
+
+def test_minify_keeps_descendant_pseudo_class_selectors():
+    assert minify_css("a :hover { color: red }") == "a :hover{color:red}"
+    assert minify_css("@media print { div :first-child { margin: 0 } }") == "@media print{div :first-child{margin:0}}"
+
+
+def test_minify_keeps_strings():
+    assert minify_css('.x::after { content: " a  :  b " }') == '.x::after{content:" a  :  b "}'
+
+
+def test_static_url_is_versioned():
+    assert static_url("lightbulb.png").startswith("app/static/lightbulb.png?v=")
+    assert static_url("absent.png") == "app/static/absent.png"
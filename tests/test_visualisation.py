@@ -0,0 +1,30 @@
+from backend.visualisation import create_model_comparison_chart, create_session_timeline, create_token_efficiency_chart
+
+
+class CountingHistory:
+    """Historique factice qui compte les lectures."""
+
+    def __init__(self):
+        self.reads = 0
+        self.entries = [
+            {"model": "gpt-4", "carbon": 0.2, "tdev_seconds": 1.0, "timestamp": 1.7e9,
+             "prompt_tokens": 10, "completion_tokens": 20},
+        ]
+
+    def calls(self):
+        self.reads += 1
+        return list(self.entries)
+
+    def model_stats(self):
+        self.reads += 1
+        return [{"model": "gpt-4", "count": 1, "carbon": 0.2, "carbon_total": 0.2, "tdev_seconds": 1.0}]
+
+
+def test_cached_figures_do_not_read_the_history():
+    history = CountingHistory()
+    for chart in (create_model_comparison_chart, create_session_timeline, create_token_efficiency_chart):
+        first = chart(history=history, version=("test-lazy", 1))
+        reads = history.reads
+        assert chart(history=history, version=("test-lazy", 1)) is first
+        assert history.reads == reads
+    assert history.reads == 3